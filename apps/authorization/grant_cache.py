@@ -0,0 +1,65 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+import apps.logging.request_logger as bb2logging
+
+from .models import DataAccessGrant
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
+
+
+def is_enabled():
+    return settings.DATA_ACCESS_GRANT_CACHE_TTL > 0
+
+
+def cache_key(beneficiary_id, application_id):
+    return "data_access_grant:%s:%s" % (beneficiary_id, application_id)
+
+
+def grant_exists(beneficiary_id, application_id):
+    """
+    Whether the beneficiary has granted the application access, from the
+    cache when known. Both answers are kept for DATA_ACCESS_GRANT_CACHE_TTL
+    seconds.
+    """
+    key = cache_key(beneficiary_id, application_id)
+    if is_enabled():
+        try:
+            exists = cache.get(key)
+        except Exception:
+            logger.exception("Could not read the cached data access grant")
+            exists = None
+        if exists is not None:
+            return exists
+
+    exists = DataAccessGrant.objects.filter(
+        beneficiary_id=beneficiary_id,
+        application_id=application_id,
+    ).exists()
+    if is_enabled():
+        # Only fills the cache, a grant saved in the meantime was set there
+        try:
+            cache.add(key, exists, settings.DATA_ACCESS_GRANT_CACHE_TTL)
+        except Exception:
+            logger.exception("Could not cache the data access grant")
+    return exists
+
+
+def set_grant(beneficiary_id, application_id, exists=True):
+    if not is_enabled():
+        return
+    try:
+        cache.set(cache_key(beneficiary_id, application_id), exists, settings.DATA_ACCESS_GRANT_CACHE_TTL)
+    except Exception:
+        logger.exception("Could not cache the data access grant")
+
+
+def forget_grant(beneficiary_id, application_id):
+    if not is_enabled():
+        return
+    try:
+        cache.delete(cache_key(beneficiary_id, application_id))
+    except Exception:
+        logger.exception("Could not invalidate the cached data access grant")
@@ -2,7 +2,9 @@ from apps.dot_ext.signals import beneficiary_authorized_application
 from oauth2_provider.models import get_access_token_model, get_refresh_token_model
 from django.db.models.signals import (
     post_delete,
+    post_save,
 )
+from . import grant_cache
 from .models import DataAccessGrant, ArchivedDataAccessGrant
 
 AccessToken = get_access_token_model()
@@ -16,6 +18,7 @@ def app_authorized_record_grant(sender, request, user, application, **kwargs):
             beneficiary=user,
             application=application,
         )
+        grant_cache.set_grant(user.pk, application.pk)
 
 
 beneficiary_authorized_application.connect(app_authorized_record_grant)
@@ -40,5 +43,15 @@ def archive_removed_grant(sender, instance=None, **kwargs):
         beneficiary=instance.beneficiary)
 
 
+def cache_saved_grant(sender, instance=None, **kwargs):
+    grant_cache.set_grant(instance.beneficiary_id, instance.application_id)
+
+
+def forget_removed_grant(sender, instance=None, **kwargs):
+    grant_cache.forget_grant(instance.beneficiary_id, instance.application_id)
+
+
+post_save.connect(cache_saved_grant, sender='authorization.DataAccessGrant')
+post_delete.connect(forget_removed_grant, sender='authorization.DataAccessGrant')
 post_delete.connect(revoke_associated_tokens, sender='authorization.DataAccessGrant')
 post_delete.connect(archive_removed_grant, sender='authorization.DataAccessGrant')
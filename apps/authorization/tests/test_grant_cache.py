@@ -0,0 +1,36 @@
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from apps.test import BaseApiTest
+from apps.authorization.grant_cache import grant_exists
+from apps.authorization.models import DataAccessGrant
+
+
+@override_settings(DATA_ACCESS_GRANT_CACHE_TTL=60)
+class TestGrantCache(BaseApiTest):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = self._create_user('anna', '123456')
+        self.application = self._create_application('an app')
+
+    def test_cached(self):
+        with self.assertNumQueries(1):
+            self.assertFalse(grant_exists(self.user.pk, self.application.pk))
+            self.assertFalse(grant_exists(self.user.pk, self.application.pk))
+
+        grant = DataAccessGrant.objects.create(beneficiary=self.user, application=self.application)
+        with self.assertNumQueries(0):
+            self.assertTrue(grant_exists(self.user.pk, self.application.pk))
+
+        grant.delete()
+        with self.assertNumQueries(1):
+            self.assertFalse(grant_exists(self.user.pk, self.application.pk))
+
+    @override_settings(DATA_ACCESS_GRANT_CACHE_TTL=0)
+    def test_disabled(self):
+        DataAccessGrant.objects.create(beneficiary=self.user, application=self.application)
+        with self.assertNumQueries(2):
+            self.assertTrue(grant_exists(self.user.pk, self.application.pk))
+            self.assertTrue(grant_exists(self.user.pk, self.application.pk))
@@ -0,0 +1,154 @@
+import json
+import logging
+import re
+import threading
+import time
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+
+import apps.logging.request_logger as bb2logging
+
+from .models import ProtectedCapability
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
+
+# (scopes, method, path) results kept per index, paths hold resource ids
+MATCH_CACHE_SIZE = 4096
+
+# The protected resources are read from the database once for the processes
+# of a host, and kept in its host cache
+HOST_CACHE_ALIAS = 'host'
+CACHE_KEY = 'protected_capabilities'
+
+
+class RouteMatcher(object):
+    """
+    The protected resources of one method, over a set of scopes. A path
+    is allowed when it is one of them, or fully matches one of them as a
+    regular expression, checked at once with a single alternation when
+    the patterns can be joined (their group names may clash).
+    """
+
+    def __init__(self, paths):
+        self.literals = frozenset(paths)
+        self.patterns = []
+        for path in sorted(self.literals):
+            try:
+                self.patterns.append(re.compile(path))
+            except re.error:
+                logger.exception("Invalid protected resource: %s" % path)
+
+        self.pattern = None
+        if self.patterns:
+            try:
+                self.pattern = re.compile("|".join("(?:%s)" % p.pattern for p in self.patterns))
+            except re.error:
+                logger.warning("Protected resources matched one by one: %s" % sorted(self.literals))
+
+    def match(self, path):
+        if path in self.literals:
+            return True
+        if self.pattern is not None:
+            return self.pattern.fullmatch(path) is not None
+        return any(p.fullmatch(path) is not None for p in self.patterns)
+
+
+class ScopeIndex(object):
+    """
+    The protected resources of each ProtectedCapability, by scope slug
+    and HTTP method, with a RouteMatcher per scope set and method.
+    """
+
+    def __init__(self, capabilities):
+        # slug -> method -> paths
+        self.routes = {}
+        for slug, protected_resources in capabilities:
+            try:
+                resources = json.loads(protected_resources)
+            except ValueError:
+                logger.exception("Invalid protected resources of the %s capability" % slug)
+                continue
+            methods = self.routes.setdefault(slug, {})
+            for method, path in resources:
+                methods.setdefault(method, []).append(path)
+
+        self._matchers = {}
+        self.allows = lru_cache(maxsize=MATCH_CACHE_SIZE)(self._allows)
+
+    def matcher(self, scopes, method):
+        key = (scopes, method)
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            matcher = RouteMatcher(path for slug in scopes
+                                   for path in self.routes.get(slug, {}).get(method, ()))
+            self._matchers[key] = matcher
+        return matcher
+
+    def _allows(self, scopes, method, path):
+        """
+        Whether a token with scopes, a frozenset of slugs, may send a
+        method request for path.
+        """
+        return self.matcher(scopes, method).match(path)
+
+
+_index = None
+_built = 0
+_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[HOST_CACHE_ALIAS]
+
+
+def load_capabilities():
+    """
+    Return the (slug, protected_resources) of every ProtectedCapability,
+    from the host cache, where they are kept PROTECTED_CAPABILITY_INDEX_TTL
+    seconds.
+    """
+    capabilities = get_cache().get(CACHE_KEY)
+    if capabilities is None:
+        capabilities = list(ProtectedCapability.objects.values_list('slug', 'protected_resources'))
+        get_cache().set(CACHE_KEY, capabilities, settings.PROTECTED_CAPABILITY_INDEX_TTL)
+    return capabilities
+
+
+def get_index():
+    """
+    Return the ScopeIndex of this process. It is rebuilt after a
+    ProtectedCapability is saved or deleted in this process, and every
+    PROTECTED_CAPABILITY_INDEX_TTL seconds for changes made by others,
+    which are seen within twice that, see load_capabilities.
+    """
+    global _index, _built
+
+    index = _index
+    if index is not None and time.monotonic() - _built < settings.PROTECTED_CAPABILITY_INDEX_TTL:
+        return index
+
+    with _lock:
+        if _index is None or time.monotonic() - _built >= settings.PROTECTED_CAPABILITY_INDEX_TTL:
+            _index = ScopeIndex(load_capabilities())
+            _built = time.monotonic()
+        return _index
+
+
+def clear():
+    global _index
+
+    with _lock:
+        _index = None
+    get_cache().delete(CACHE_KEY)
+
+
+def capability_changed(sender, instance=None, **kwargs):
+    clear()
+
+
+post_save.connect(capability_changed, sender=ProtectedCapability)
+post_delete.connect(capability_changed, sender=ProtectedCapability)
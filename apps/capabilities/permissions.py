@@ -1,11 +1,8 @@
-import json
-import re
-
 from rest_framework import permissions, status
 from rest_framework.exceptions import APIException, ParseError
 from waffle import switch_is_active
 
-from .models import ProtectedCapability
+from .index import get_index
 
 
 class BBCapabilitiesPermissionTokenScopeMissingException(APIException):
@@ -15,6 +12,12 @@ class BBCapabilitiesPermissionTokenScopeMissingException(APIException):
 
 class TokenHasProtectedCapability(permissions.BasePermission):
 
+    def get_method(self, request):
+        """
+        The method the capabilities are checked for.
+        """
+        return request.method
+
     def has_permission(self, request, view):
         token = request.auth
         access_token_query_param = request.GET.get("access_token", None)
@@ -32,18 +35,7 @@ class TokenHasProtectedCapability(permissions.BasePermission):
             return True
 
         if hasattr(token, "scope"):  # OAuth 2
-            scopes = list(ProtectedCapability.objects.filter(
-                slug__in=token.scope.split()
-            ).values_list('protected_resources', flat=True).all())
-            for scope in scopes:
-                for method, path in json.loads(scope):
-                    if method != request.method:
-                        continue
-                    if path == request.path:
-                        return True
-                    if re.fullmatch(path, request.path) is not None:
-                        return True
-            return False
+            return get_index().allows(frozenset(token.scope.split()), self.get_method(request), request.path)
         else:
             # BB2-237: Replaces ASSERT with exception. We should never reach here.
             mesg = ("TokenHasScope requires the `oauth2_provider.rest_framework.OAuth2Authentication`"
@@ -1,10 +1,16 @@
 import json
+import os
+import tempfile
 
+from django.conf import settings
 from django.contrib.auth.models import Group
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from waffle.testutils import override_switch
 
 from apps.capabilities.permissions import BBCapabilitiesPermissionTokenScopeMissingException
+from hhs_oauth_server.shared_memory_cache import SharedMemoryCache
+
+from . import index
 from .models import ProtectedCapability
 from .permissions import TokenHasProtectedCapability
 
@@ -126,3 +132,95 @@ class TestTokenHasProtectedCapabilityScopesSwitchFalse(TestCase):
         perm = TokenHasProtectedCapability()
         # Note that this is allowed with the scopes switch False/Off
         self.assertTrue(perm.has_permission(request, None))
+
+
+@override_switch('require-scopes', active=True)
+class TestScopeIndex(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name="test")
+        self.capability = ProtectedCapability.objects.create(
+            title="read capability",
+            slug="read",
+            group=self.group,
+            protected_resources=json.dumps([["GET", "/v1/fhir/Patient[/]?.*$"], ["GET", "/v1/connect/userinfo"]]),
+        )
+        ProtectedCapability.objects.create(
+            title="write capability",
+            slug="write",
+            group=self.group,
+            protected_resources=json.dumps([["POST", "/v1/fhir/Patient[/]?.*$"]]),
+        )
+
+    def _allowed(self, scope, method, path):
+        request = SimpleRequest(scope)
+        request.method = method
+        request.path = path
+        return TokenHasProtectedCapability().has_permission(request, None)
+
+    def test_compiled(self):
+        self.assertTrue(self._allowed("read", "GET", "/v1/fhir/Patient/-20140000008325"))
+        self.assertTrue(self._allowed("read", "GET", "/v1/connect/userinfo"))
+        self.assertFalse(self._allowed("read", "POST", "/v1/fhir/Patient/-20140000008325"))
+        self.assertTrue(self._allowed("read write", "POST", "/v1/fhir/Patient/-20140000008325"))
+        self.assertFalse(self._allowed("read", "GET", "/v1/fhir/Coverage/"))
+
+        # The capabilities are loaded once
+        with self.assertNumQueries(0):
+            self.assertTrue(self._allowed("write read", "GET", "/v1/fhir/Patient/"))
+            self.assertFalse(self._allowed("write", "GET", "/v1/fhir/Patient/"))
+
+    def test_rebuilt_on_change(self):
+        self.assertTrue(self._allowed("read", "GET", "/v1/connect/userinfo"))
+
+        self.capability.protected_resources = json.dumps([["GET", "/v1/fhir/Patient[/]?.*$"]])
+        self.capability.save()
+        self.assertFalse(self._allowed("read", "GET", "/v1/connect/userinfo"))
+
+        self.capability.delete()
+        self.assertFalse(self._allowed("read", "GET", "/v1/fhir/Patient/"))
+
+    def test_invalid_resources(self):
+        ProtectedCapability.objects.create(
+            title="invalid capability",
+            slug="invalid",
+            group=self.group,
+            protected_resources=json.dumps([["GET", "/v1/fhir/[Patient"]]),
+        )
+        self.assertFalse(self._allowed("invalid", "GET", "/v1/fhir/Patient/"))
+        self.assertTrue(self._allowed("invalid read", "GET", "/v1/fhir/Patient/"))
+
+    def test_patterns_not_joined(self):
+        # The same group name twice can't be in one pattern
+        ProtectedCapability.objects.create(
+            title="named groups capability",
+            slug="named",
+            group=self.group,
+            protected_resources=json.dumps([["GET", "/v1/fhir/Patient/(?P<id>[0-9-]+)"],
+                                            ["GET", "/v1/fhir/Coverage/(?P<id>[a-z0-9-]+)"]]),
+        )
+        self.assertTrue(self._allowed("named", "GET", "/v1/fhir/Patient/-20140000008325"))
+        self.assertTrue(self._allowed("named", "GET", "/v1/fhir/Coverage/part-a-1"))
+        self.assertFalse(self._allowed("named", "GET", "/v1/fhir/Coverage/part-a-1/x"))
+        self.assertTrue(self._allowed("named read", "GET", "/v1/connect/userinfo"))
+
+    def test_shared_by_the_host(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'host-cache')
+        host = {'BACKEND': 'hhs_oauth_server.shared_memory_cache.SharedMemoryCache',
+                'LOCATION': path, 'OPTIONS': {'SIZE': 1024 * 1024}}
+        with override_settings(CACHES={**settings.CACHES, 'host': host}):
+            index.clear()
+            self.assertTrue(self._allowed("read", "GET", "/v1/connect/userinfo"))
+            other = SharedMemoryCache(path, {'OPTIONS': {'SIZE': 1024 * 1024}})
+            self.assertEqual(sorted(slug for slug, resources in other.get(index.CACHE_KEY)), ['read', 'write'])
+
+            # Another process of the host builds its index without a query
+            index._index = None
+            with self.assertNumQueries(0):
+                self.assertTrue(self._allowed("read", "GET", "/v1/connect/userinfo"))
+
+            self.capability.delete()
+            self.assertIsNone(other.get(index.CACHE_KEY))
+            self.assertFalse(self._allowed("read", "GET", "/v1/connect/userinfo"))
+        index.clear()
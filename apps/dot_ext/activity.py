@@ -0,0 +1,116 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from oauth2_provider.models import get_application_model
+
+import apps.logging.request_logger as bb2logging
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
+
+Application = get_application_model()
+
+# application pk -> latest last_active not written yet
+_pending = {}
+# client ids of the applications known to have a first_active
+_first_active = set()
+_lock = threading.Lock()
+_timer = None
+
+
+def record_activity(application):
+    """
+    Record an API call of application, for its first_active and
+    last_active metrics.
+
+    first_active is written right away, the first API call outreach email
+    relies on it. last_active is kept in memory and written every
+    APPLICATION_ACTIVITY_FLUSH_INTERVAL seconds by a background thread,
+    or right away when the interval is 0.
+    """
+    now = timezone.now()
+
+    application.last_active = now
+    if application.first_active is None and application.client_id not in _first_active:
+        _first_active.add(application.client_id)
+        application.first_active = now
+        # Only the first call of all the processes sets it
+        if Application.objects.filter(pk=application.pk, first_active__isnull=True).update(
+                first_active=now, last_active=now):
+            return
+
+    if not settings.APPLICATION_ACTIVITY_FLUSH_INTERVAL:
+        write_last_active({application.pk: now})
+        return
+
+    with _lock:
+        if _pending.get(application.pk, now) <= now:
+            _pending[application.pk] = now
+    start_timer()
+
+
+def write_last_active(last_active):
+    # Never moves last_active back, another process may have written a later one
+    for pk, value in last_active.items():
+        Application.objects.filter(
+            Q(last_active__isnull=True) | Q(last_active__lt=value), pk=pk,
+        ).update(last_active=value)
+
+
+def flush():
+    """
+    Write the last_active of the applications recorded since the last flush.
+    """
+    global _pending
+
+    with _lock:
+        pending, _pending = _pending, {}
+    if not pending:
+        return
+
+    try:
+        with transaction.atomic():
+            write_last_active(pending)
+    except Exception:
+        logger.exception("Could not write the application activity")
+        # Try again on the next flush
+        with _lock:
+            for pk, value in pending.items():
+                if _pending.get(pk, value) <= value:
+                    _pending[pk] = value
+
+
+def clear():
+    with _lock:
+        _pending.clear()
+        _first_active.clear()
+
+
+def start_timer():
+    global _timer
+
+    if _timer is not None and _timer.is_alive():
+        return
+    with _lock:
+        if _timer is None or not _timer.is_alive():
+            _timer = threading.Thread(target=run_timer, name='app-activity', daemon=True)
+            _timer.start()
+
+
+def run_timer():
+    while True:
+        interval = settings.APPLICATION_ACTIVITY_FLUSH_INTERVAL
+        if not interval:
+            flush()
+            return
+        time.sleep(interval)
+        flush()
+        close_old_connections()
+
+
+atexit.register(flush)
@@ -7,4 +7,4 @@ class dot_extConfig(AppConfig):
     verbose_name = 'Django OAuth Toolkit Extension'
 
     def ready(self):
-        from . import signals  # noqa
+        from . import signals, token_cache  # noqa
@@ -3,6 +3,8 @@ from django.core.exceptions import ObjectDoesNotExist
 from apps.pkce.oauth2_validators import PKCEValidatorMixin
 from oauthlib.oauth2.rfc6749.errors import InvalidGrantError
 
+from . import token_cache
+
 
 class OAuth2Validator(DotOAuth2Validator):
     def _extract_basic_auth(self, request):
@@ -27,6 +29,25 @@ class OAuth2Validator(DotOAuth2Validator):
 
         return auth_string
 
+    def validate_bearer_token(self, token, scopes, request):
+        """
+        This overrided method first looks for the token in the
+        validated token cache, see apps.dot_ext.token_cache.
+        """
+        access_token = token_cache.get_access_token(token) if token else None
+        if access_token is not None and access_token.is_valid(scopes):
+            request.client = access_token.application
+            request.user = access_token.user
+            request.scopes = scopes
+            # this is needed by django rest framework
+            request.access_token = access_token
+            return True
+
+        valid = super().validate_bearer_token(token, scopes, request)
+        if valid:
+            token_cache.set_access_token(request.access_token)
+        return valid
+
 
 class SingleAccessTokenValidator(
         PKCEValidatorMixin,
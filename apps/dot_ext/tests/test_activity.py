@@ -0,0 +1,90 @@
+from datetime import timedelta
+
+from django.test.utils import override_settings
+from django.utils import timezone
+from oauth2_provider.models import get_application_model
+from unittest.mock import patch
+
+from apps.test import BaseApiTest
+
+from .. import activity
+
+Application = get_application_model()
+
+
+@override_settings(APPLICATION_ACTIVITY_FLUSH_INTERVAL=60)
+class ActivityTrackerTest(BaseApiTest):
+
+    def setUp(self):
+        activity.clear()
+        self.addCleanup(activity.clear)
+        patcher = patch.object(activity, 'start_timer')
+        self.start_timer = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.application = self._create_application('test')
+
+    def test_first_active(self):
+        activity.record_activity(self.application)
+        application = Application.objects.get(pk=self.application.pk)
+        self.assertIsNotNone(application.first_active)
+        self.assertEqual(application.last_active, application.first_active)
+        self.assertFalse(self.start_timer.called)
+
+        # Even from an application loaded before
+        first_active = application.first_active
+        activity.record_activity(self.application)
+        application.refresh_from_db()
+        self.assertEqual(application.first_active, first_active)
+
+    def test_debounced(self):
+        first_active = timezone.now() - timedelta(days=1)
+        Application.objects.filter(pk=self.application.pk).update(first_active=first_active)
+        self.application.refresh_from_db()
+
+        activity.record_activity(self.application)
+        activity.record_activity(self.application)
+        self.assertTrue(self.start_timer.called)
+        last_active = self.application.last_active
+
+        # last_active is written on the next flush
+        application = Application.objects.get(pk=self.application.pk)
+        self.assertIsNone(application.last_active)
+        activity.flush()
+        application.refresh_from_db()
+        self.assertEqual(application.first_active, first_active)
+        self.assertEqual(application.last_active, last_active)
+
+        # Nothing left to write
+        with self.assertNumQueries(0):
+            activity.flush()
+
+    def test_flush_keeps_later_last_active(self):
+        later = timezone.now() + timedelta(minutes=5)
+        Application.objects.filter(pk=self.application.pk).update(first_active=later, last_active=later)
+        self.application.refresh_from_db()
+        activity.record_activity(self.application)
+        activity.flush()
+        self.application.refresh_from_db()
+        self.assertEqual(self.application.last_active, later)
+
+    def test_flush_error(self):
+        self.application.first_active = timezone.now()
+        activity.record_activity(self.application)
+        with patch.object(activity, 'write_last_active', side_effect=Exception):
+            activity.flush()
+        self.application.refresh_from_db()
+        self.assertIsNone(self.application.last_active)
+
+        # Written on the next one
+        activity.flush()
+        self.application.refresh_from_db()
+        self.assertIsNotNone(self.application.last_active)
+
+    @override_settings(APPLICATION_ACTIVITY_FLUSH_INTERVAL=0)
+    def test_write_through(self):
+        activity.record_activity(self.application)
+        activity.record_activity(self.application)
+        self.assertFalse(self.start_timer.called)
+        self.application.refresh_from_db()
+        self.assertIsNotNone(self.application.first_active)
+        self.assertIsNotNone(self.application.last_active)
@@ -0,0 +1,72 @@
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+
+from ..throttling import SlidingWindowCounter
+
+DAY = 86400
+
+
+class SlidingWindowCounterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = LocMemCache('throttle-test', {})
+        self.cache.clear()
+        self.counter = SlidingWindowCounter(self.cache)
+        self.start = 1000000.0
+
+    def hit(self, seconds, limit=10, duration=DAY):
+        return self.counter.hit('key', limit, duration, self.start + seconds)
+
+    def test_window(self):
+        window = self.hit(0)
+        self.assertTrue(window.allowed)
+        self.assertEqual(window.remaining, 9)
+        self.assertEqual(window.reset, DAY)
+
+        for i in range(9):
+            window = self.hit(100)
+        self.assertTrue(window.allowed)
+        self.assertEqual(window.remaining, 0)
+        self.assertEqual(window.reset, DAY - 100)
+
+        window = self.hit(200)
+        self.assertFalse(window.allowed)
+        self.assertEqual(window.remaining, 0)
+        self.assertEqual(window.wait, DAY - 200)
+
+        # Denied requests are not counted, the previous window slides out
+        window = self.hit(DAY + DAY / 2)
+        self.assertTrue(window.allowed)
+        self.assertEqual(window.remaining, 4)
+        self.assertEqual(window.reset, DAY / 2)
+
+        for i in range(4):
+            self.assertTrue(self.hit(DAY + DAY / 2).allowed)
+        self.assertFalse(self.hit(DAY + DAY / 2).allowed)
+
+        # Each tenth of the first window that slides out frees a request
+        self.assertTrue(self.hit(DAY + DAY / 2 + 1).allowed)
+        window = self.hit(DAY + DAY / 2 + 1)
+        self.assertFalse(window.allowed)
+        self.assertEqual(window.wait, DAY / 10 - 1)
+        self.assertFalse(self.hit(DAY + DAY / 2 + DAY / 10).allowed)
+        self.assertTrue(self.hit(DAY + DAY / 2 + DAY / 10 + 1).allowed)
+
+    def test_fixed_size(self):
+        for i in range(1000):
+            self.hit(i, limit=100000)
+        # The start of the windows and one count per window
+        self.assertEqual(len(self.cache._cache), 2)
+
+    def test_keys(self):
+        self.assertTrue(self.counter.hit('key', 1, DAY, self.start).allowed)
+        self.assertFalse(self.counter.hit('key', 1, DAY, self.start + 1).allowed)
+        self.assertTrue(self.counter.hit('other', 1, DAY, self.start + 1).allowed)
+
+    def test_idle(self):
+        self.hit(0, limit=1)
+        # Windows start again after the key was idle
+        self.cache.delete('key')
+        window = self.hit(3 * DAY, limit=1)
+        self.assertTrue(window.allowed)
+        self.assertEqual(window.reset, DAY)
@@ -0,0 +1,134 @@
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.db import connection
+from django.test.client import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from httmock import all_requests, HTTMock
+from oauth2_provider.models import get_access_token_model
+from unittest.mock import patch
+
+from apps.authorization.models import DataAccessGrant
+from apps.test import BaseApiTest
+
+from .. import token_cache
+
+AccessToken = get_access_token_model()
+
+PATIENT = {"resourceType": "Patient", "id": "-20140000008325"}
+
+
+@override_settings(ACCESS_TOKEN_CACHE_TTL=300)
+class TokenCacheTest(BaseApiTest):
+
+    def setUp(self):
+        self.read_capability = self._create_capability('Read', [])
+        self.write_capability = self._create_capability('Write', [])
+        self.client = Client()
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.token = self.create_token('John', 'Smith')
+        self.access_token = AccessToken.objects.get(token=self.token)
+
+    def _get(self):
+        @all_requests
+        def catchall(url, req):
+            return {'status_code': 200, 'content': PATIENT}
+
+        with HTTMock(catchall), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('bb_oauth_fhir_patient_read_or_update_or_delete', kwargs={'resource_id': PATIENT['id']}),
+                Authorization="Bearer %s" % (self.token))
+        token_queries = [query['sql'] for query in queries.captured_queries
+                         if query['sql'].startswith('SELECT') and ' FROM "oauth2_provider_accesstoken"' in query['sql']]
+        return response, token_queries
+
+    def test_cached(self):
+        response, token_queries = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(token_queries), 1)
+
+        response, token_queries = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(token_queries, [])
+
+        access_token = token_cache.get_access_token(self.token)
+        self.assertEqual(access_token.pk, self.access_token.pk)
+        self.assertEqual(access_token.application.client_id, self.access_token.application.client_id)
+        self.assertEqual(access_token.user.crosswalk.fhir_id, PATIENT['id'])
+        self.assertEqual(access_token.scope, self.access_token.scope)
+        # Only the fields read by the API calls are kept
+        self.assertIn('client_secret', access_token.application.get_deferred_fields())
+        self.assertNotIn('active', access_token.application.get_deferred_fields())
+        self.assertIn('password', access_token.user.get_deferred_fields())
+        self.assertIn('email', access_token.user.get_deferred_fields())
+        self.assertNotIn('username', access_token.user.get_deferred_fields())
+        self.assertIn('_user_mbi_hash', access_token.user.crosswalk.get_deferred_fields())
+
+        # Activity is recorded without writing back the cached application
+        application = access_token.application
+        application.refresh_from_db()
+        self.assertIsNotNone(application.last_active)
+        self.assertTrue(application.client_secret)
+
+    def test_token_deleted(self):
+        self._get()
+        self.access_token.delete()
+        self.assertIsNone(token_cache.get_access_token(self.token))
+        response, token_queries = self._get()
+        self.assertEqual(response.status_code, 401)
+
+    def test_grant_deleted(self):
+        self._get()
+        DataAccessGrant.objects.filter(beneficiary=self.access_token.user).delete()
+        response, token_queries = self._get()
+        self.assertEqual(response.status_code, 401)
+
+    def test_application_changed(self):
+        self._get()
+        application = self.access_token.application
+        application.active = False
+        application.save()
+        self.assertIsNone(token_cache.get_access_token(self.token))
+        response, token_queries = self._get()
+        self.assertEqual(response.status_code, 403)
+
+    def test_application_saved_unchanged(self):
+        self._get()
+        application = self.access_token.application
+        application.description = "Another description"
+        with CaptureQueriesContext(connection) as queries:
+            application.save()
+        self.assertFalse([query for query in queries.captured_queries
+                          if ' FROM "oauth2_provider_accesstoken"' in query['sql']])
+        self.assertIsNotNone(token_cache.get_access_token(self.token))
+
+        application.name = "Another name"
+        application.save(update_fields=['name'])
+        self.assertIsNone(token_cache.get_access_token(self.token))
+
+    def test_crosswalk_changed(self):
+        self._get()
+        self.access_token.user.crosswalk.save()
+        self.assertIsNone(token_cache.get_access_token(self.token))
+
+    def test_expires(self):
+        self.access_token.expires = timezone.now() + timedelta(seconds=30)
+        self.access_token.save()
+        with patch.object(token_cache, 'get_cache') as get_cache:
+            token_cache.set_access_token(self.access_token)
+            self.assertLessEqual(get_cache.return_value.add.call_args[0][2], 30)
+
+            get_cache.reset_mock()
+            self.access_token.expires = timezone.now() - timedelta(seconds=1)
+            token_cache.set_access_token(self.access_token)
+            self.assertFalse(get_cache.return_value.add.called)
+
+    @override_settings(ACCESS_TOKEN_CACHE_TTL=0)
+    def test_disabled(self):
+        self._get()
+        response, token_queries = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(token_queries), 1)
@@ -1,6 +1,14 @@
-from rest_framework.throttling import SimpleRateThrottle
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
 from django.utils.deprecation import MiddlewareMixin
+from rest_framework.throttling import SimpleRateThrottle
 
+import apps.logging.request_logger as bb2logging
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
 
 HEADERS = {
     'Remaining': 'X-RateLimit-Remaining',
@@ -8,6 +16,96 @@ HEADERS = {
     'Reset': 'X-RateLimit-Reset',
 }
 
+# Counters of this process, used when TOKEN_THROTTLE_CACHE is not set or
+# can't be reached
+_local_cache = LocMemCache('throttle', {'MAX_ENTRIES': 100000})
+
+
+class Window(object):
+    """
+    The state of a key's sliding window after a request.
+    """
+    __slots__ = ('allowed', 'remaining', 'reset', 'wait')
+
+    def __init__(self, allowed, remaining, reset, wait=None):
+        self.allowed = allowed
+        self.remaining = remaining
+        self.reset = reset
+        self.wait = wait
+
+
+class SlidingWindowCounter(object):
+    """
+    Sliding window rate limiter on two fixed windows.
+
+    A request counts against the current window. The sliding window is
+    that count plus the part of the previous window's count it still
+    covers, prorated. The windows of a key start at its first request,
+    and a key takes three small values in the cache whatever its rate.
+    Counts use cache increments, which are atomic on memcached and redis.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def hit(self, key, limit, duration, now):
+        timeout = 2 * duration
+        anchor = self._anchor(key, timeout, now)
+        # The anchor may come from a host whose clock is ahead
+        now = max(now, anchor)
+        number = int((now - anchor) // duration)
+        elapsed = now - (anchor + number * duration)
+        window_key = '%s:%d:%%d' % (key, int(anchor * 1000))
+
+        count = self._incr(window_key % number, key, timeout)
+        previous = self.cache.get(window_key % (number - 1), 0) if number else 0
+        carried = int(previous * (1 - elapsed / duration))
+
+        if carried + count <= limit:
+            return Window(True, limit - carried - count, duration - elapsed)
+
+        # Denied requests are not counted
+        self.cache.decr(window_key % number)
+        count -= 1
+        return Window(False, max(0, limit - carried - count), duration - elapsed,
+                      self._wait(limit, duration, elapsed, previous, count))
+
+    def _anchor(self, key, timeout, now):
+        anchor = self.cache.get(key)
+        if anchor is None:
+            if self.cache.add(key, now, timeout):
+                return now
+            anchor = self.cache.get(key, now)
+        return anchor
+
+    def _incr(self, window_key, key, timeout):
+        try:
+            return self.cache.incr(window_key)
+        except ValueError:
+            pass
+        if self.cache.add(window_key, 1, timeout):
+            # A new window, the key's windows go on
+            self.cache.touch(key, timeout)
+            return 1
+        return self.cache.incr(window_key)
+
+    @staticmethod
+    def _wait(limit, duration, elapsed, previous, count):
+        """
+        Seconds until the next request of a denied key is allowed.
+        """
+        if count < limit:
+            # Until enough of the previous window has slid out
+            free = limit - count
+            return max(0.0, duration * (1 - free / previous) - elapsed)
+        # Until the next window, and enough of this one has slid out
+        return duration - elapsed + duration * (1 - limit / count)
+
+
+def get_counter():
+    alias = settings.TOKEN_THROTTLE_CACHE
+    return SlidingWindowCounter(caches[alias] if alias else _local_cache)
+
 
 class TokenRateThrottle(SimpleRateThrottle):
     """
@@ -15,6 +113,9 @@ class TokenRateThrottle(SimpleRateThrottle):
     The token will be used as a unique cache key.
     For anonymous requests, the IP address of the request will
     be used.
+
+    Counted in a sliding window, see SlidingWindowCounter, kept in the
+    TOKEN_THROTTLE_CACHE cache or in this process.
     """
     scope = 'token'
 
@@ -30,22 +131,29 @@ class TokenRateThrottle(SimpleRateThrottle):
         }
 
     def allow_request(self, request, view):
-        # run this first to populate/update self.history, self.now, self.duration, self.num_requests
-        result = super(TokenRateThrottle, self).allow_request(request, view)
-        try:
-            request.META[HEADERS['Remaining']] = self.num_requests - len(self.history)
-            request.META[HEADERS['Limit']] = self.num_requests
-            if self.history:
-                remaining_duration = self.duration - (self.now - self.history[-1])
-            else:
-                remaining_duration = self.duration
-
-            request.META[HEADERS['Reset']] = remaining_duration
         # Allows for throttling to be turned off completely
-        except AttributeError:
-            pass
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        try:
+            self.window = get_counter().hit(self.key, self.num_requests, self.duration, self.now)
+        except Exception:
+            logger.exception("Could not reach the throttle cache, counting in this process")
+            self.window = SlidingWindowCounter(_local_cache).hit(self.key, self.num_requests,
+                                                                 self.duration, self.now)
+
+        request.META[HEADERS['Remaining']] = self.window.remaining
+        request.META[HEADERS['Limit']] = self.num_requests
+        request.META[HEADERS['Reset']] = self.window.reset
+        return self.window.allowed
 
-        return result
+    def wait(self):
+        return self.window.wait
 
 
 class ThrottleMiddleware(MiddlewareMixin):
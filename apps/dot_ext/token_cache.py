@@ -0,0 +1,185 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+from oauth2_provider.models import get_access_token_model, get_application_model
+
+from apps.fhir.bluebutton.models import Crosswalk
+
+import apps.logging.request_logger as bb2logging
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
+
+AccessToken = get_access_token_model()
+Application = get_application_model()
+User = get_user_model()
+
+
+def concrete_fields(model, names):
+    # In the model order, which Model.from_db expects
+    return tuple(f.attname for f in model._meta.concrete_fields if f.name in names)
+
+
+# Fields kept in a snapshot: those the token check, the permission classes,
+# the activity metrics and the audit log read. The others, and the token
+# itself, are deferred on the instances built from it.
+TOKEN_FIELDS = concrete_fields(AccessToken, ('id', 'user', 'application', 'expires', 'scope'))
+APPLICATION_FIELDS = concrete_fields(Application, ('id', 'client_id', 'user', 'name', 'active',
+                                                   'require_demographic_scopes', 'first_active'))
+USER_FIELDS = concrete_fields(User, ('id', 'is_active', 'username'))
+CROSSWALK_FIELDS = concrete_fields(Crosswalk, ('id', 'user', '_fhir_id', '_user_id_hash'))
+
+
+def is_enabled():
+    return settings.ACCESS_TOKEN_CACHE_TTL > 0
+
+
+def get_cache():
+    return caches[settings.ACCESS_TOKEN_CACHE_ALIAS]
+
+
+def cache_key(token):
+    return "access_token:%s" % hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def field_values(instance, fields):
+    return tuple(getattr(instance, name) for name in fields)
+
+
+def snapshot(access_token):
+    """
+    The validated access_token with its application, user and crosswalk,
+    as plain values.
+    """
+    user = access_token.user
+    crosswalk = getattr(user, 'crosswalk', None)
+    return {
+        'token': field_values(access_token, TOKEN_FIELDS),
+        'application': field_values(access_token.application, APPLICATION_FIELDS),
+        'user': field_values(user, USER_FIELDS),
+        'crosswalk': field_values(crosswalk, CROSSWALK_FIELDS) if crosswalk else None,
+    }
+
+
+def restore(token, values):
+    """
+    Build the AccessToken of a snapshot, with its application, user and
+    user crosswalk already loaded.
+    """
+    access_token = AccessToken.from_db(DEFAULT_DB_ALIAS, TOKEN_FIELDS, values['token'])
+    access_token.token = token
+    access_token.application = Application.from_db(DEFAULT_DB_ALIAS, APPLICATION_FIELDS, values['application'])
+    access_token.user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, values['user'])
+    if values['crosswalk'] is not None:
+        access_token.user.crosswalk = Crosswalk.from_db(DEFAULT_DB_ALIAS, CROSSWALK_FIELDS, values['crosswalk'])
+    return access_token
+
+
+def get_access_token(token):
+    """
+    Return the cached AccessToken for token, or None.
+
+    The caller still checks the token is valid for the scopes it needs, the
+    snapshot of a token that has since expired is not used.
+    """
+    if not is_enabled():
+        return None
+
+    key = cache_key(token)
+    try:
+        values = get_cache().get(key)
+        if values is None:
+            return None
+        return restore(token, values)
+    except Exception:
+        # e.g. a snapshot of an older version of the models
+        logger.exception("Could not read the cached access token")
+        invalidate_tokens([token])
+        return None
+
+
+def set_access_token(access_token):
+    """
+    Cache a validated access_token, until it expires or for
+    ACCESS_TOKEN_CACHE_TTL seconds, whichever comes first.
+    """
+    if not is_enabled() or access_token.expires is None:
+        return
+
+    timeout = min(settings.ACCESS_TOKEN_CACHE_TTL,
+                  int((access_token.expires - timezone.now()).total_seconds()))
+    if timeout <= 0:
+        return
+
+    try:
+        # A fill, a changed token is deleted from the cache
+        get_cache().add(cache_key(access_token.token), snapshot(access_token), timeout)
+    except Exception:
+        logger.exception("Could not cache the access token")
+
+
+def invalidate_tokens(tokens):
+    if not is_enabled():
+        return
+    keys = [cache_key(token) for token in tokens]
+    if not keys:
+        return
+    try:
+        get_cache().delete_many(keys)
+    except Exception:
+        logger.exception("Could not invalidate the cached access tokens")
+
+
+def invalidate_matching_tokens(**filters):
+    if is_enabled():
+        invalidate_tokens(AccessToken.objects.filter(**filters).values_list('token', flat=True))
+
+
+def token_changed(sender, instance=None, **kwargs):
+    invalidate_tokens([instance.token])
+
+
+def grant_changed(sender, instance=None, **kwargs):
+    invalidate_matching_tokens(user_id=instance.beneficiary_id,
+                               application_id=instance.application_id)
+
+
+def application_saving(sender, instance=None, update_fields=None, **kwargs):
+    """
+    Tell application_changed whether the save changes a field kept in the
+    snapshots, its tokens are only looked up then.
+    """
+    instance._token_cache_changed = True
+    if not is_enabled() or instance.pk is None:
+        return
+    if update_fields is not None:
+        instance._token_cache_changed = any(Application._meta.get_field(name).attname in APPLICATION_FIELDS
+                                            for name in update_fields)
+        return
+    stored = Application.objects.filter(pk=instance.pk).values_list(*APPLICATION_FIELDS).first()
+    instance._token_cache_changed = stored != field_values(instance, APPLICATION_FIELDS)
+
+
+def application_changed(sender, instance=None, **kwargs):
+    if getattr(instance, '_token_cache_changed', True):
+        invalidate_matching_tokens(application_id=instance.pk)
+
+
+def crosswalk_changed(sender, instance=None, **kwargs):
+    invalidate_matching_tokens(user_id=instance.user_id)
+
+
+post_save.connect(token_changed, sender=AccessToken)
+post_delete.connect(token_changed, sender=AccessToken)
+post_save.connect(grant_changed, sender='authorization.DataAccessGrant')
+post_delete.connect(grant_changed, sender='authorization.DataAccessGrant')
+pre_save.connect(application_saving, sender=Application)
+post_save.connect(application_changed, sender=Application)
+post_delete.connect(application_changed, sender=Application)
+post_save.connect(crosswalk_changed, sender=Crosswalk)
+post_delete.connect(crosswalk_changed, sender=Crosswalk)
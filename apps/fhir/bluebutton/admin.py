@@ -1,4 +1,4 @@
-from apps.fhir.bluebutton.models import ArchivedCrosswalk, Crosswalk
+from apps.fhir.bluebutton.models import ArchivedCrosswalk, Crosswalk, ExportJob
 from django.contrib import admin
 
 
@@ -23,3 +23,13 @@ class ArchivedCrosswalkAdmin(admin.ModelAdmin):
 
 
 admin.site.register(ArchivedCrosswalk, ArchivedCrosswalkAdmin)
+
+
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'status', 'application', 'beneficiary', 'resource_count', 'created_at', 'completed_at')
+    list_filter = ('status',)
+    search_fields = ('job_id', 'beneficiary__username', 'application__name')
+    raw_id_fields = ('beneficiary', 'application')
+
+
+admin.site.register(ExportJob, ExportJobAdmin)
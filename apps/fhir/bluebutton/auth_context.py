@@ -0,0 +1,53 @@
+from django.utils.functional import cached_property
+
+
+class AuthContext(object):
+    """
+    The access token of a request and what it leads to: the application,
+    its developer and the beneficiary's crosswalk.
+
+    Built once after authentication, see OAuth2ResourceOwner, and shared by
+    the permission classes, the headers sent to the backend and the audit
+    loggers, so each of them is loaded at most once per request.
+    """
+
+    def __init__(self, token, user):
+        self.token = token
+        self.user = user
+
+    @cached_property
+    def application(self):
+        return self.token.application
+
+    @cached_property
+    def developer(self):
+        return self.application.user
+
+    @cached_property
+    def crosswalk(self):
+        return getattr(self.user, 'crosswalk', None)
+
+    @cached_property
+    def scopes(self):
+        # AccessToken.scopes asks the scopes backend on each access
+        return self.token.scopes
+
+
+def get_auth_context(request):
+    """
+    Return the AuthContext of request, a Django or DRF request, or None.
+    """
+    return getattr(request, 'auth_context', None)
+
+
+def set_auth_context(request, token, user):
+    """
+    Keep an AuthContext for token on request, a DRF request. A context
+    already built for the same token, e.g. for the request of a batch the
+    entry requests are copied from, is reused.
+    """
+    context = get_auth_context(request._request)
+    if context is None or context.token.pk != token.pk:
+        context = AuthContext(token, user)
+        request._request.auth_context = context
+    return context
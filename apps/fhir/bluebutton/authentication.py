@@ -1,7 +1,10 @@
 from oauth2_provider.contrib.rest_framework import authentication
-from django.utils import timezone
 from rest_framework import exceptions
 
+from apps.dot_ext.activity import record_activity
+
+from .auth_context import set_auth_context
+
 
 class OAuth2ResourceOwner(authentication.OAuth2Authentication):
     def authenticate(self, request):
@@ -23,14 +26,10 @@ class OAuth2ResourceOwner(authentication.OAuth2Authentication):
             if not hasattr(user, "crosswalk"):
                 return None
             request.crosswalk = user.crosswalk
+            set_auth_context(request, access_token, user)
 
-            # Update Application activity metric datetime fields
-            access_token.application.last_active = timezone.now()
-            if access_token.application.first_active is None:
-                access_token.application.first_active = (
-                    access_token.application.last_active
-                )
-            access_token.application.save()
+            # Application activity metric datetime fields
+            record_activity(access_token.application)
 
             return user, access_token
         return None
@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+
+from django.db.models.signals import post_delete, post_save
+
+import apps.logging.request_logger as bb2logging
+
+from .utils import get_resourcerouter
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
+
+
+class ResponseCache(object):
+    """
+    In process LRU cache of backend FHIR server responses.
+
+    Entries hold the raw response body and are bounded by max_bytes, the
+    least recently used entries are dropped first. Each resource type has
+    its own TTL, a resource type without one is not cached.
+    """
+
+    def __init__(self, max_bytes, ttls):
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            content, expires = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return content
+
+    def set(self, key, content):
+        # key[1] is the resource type, see cache_key()
+        ttl = self.ttls.get(key[1])
+        if not ttl or len(content) > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (content, time.monotonic() + ttl)
+            self.size += len(content)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_patient(self, fhir_id):
+        with self._lock:
+            for key in [k for k in self._entries if k[2] == fhir_id]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        content, expires = self._entries.pop(key)
+        self.size -= len(content)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Return the response cache of this process, or None when it is disabled
+    by the FHIR_SERVER RESPONSE_CACHE setting.
+    """
+    global _cache
+
+    resource_router = get_resourcerouter()
+    if not resource_router.response_cache:
+        return None
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(resource_router.response_cache_max_bytes,
+                                       resource_router.response_cache_ttl)
+    return _cache
+
+
+def cache_key(request, resource_type, version, parameters, resource_id=None):
+    """
+    Key for a backend response.
+
+    The parameters are the validated query sent to the backend. The token
+    scopes are part of the key so apps holding different scopes never
+    share an entry.
+    """
+    params = []
+    for name, value in sorted(parameters.items()):
+        if isinstance(value, (list, tuple)):
+            value = tuple(sorted(str(v) for v in value))
+        params.append((name, value))
+
+    scope = getattr(request.auth, 'scope', '') or ''
+
+    return (version,
+            resource_type,
+            request.crosswalk.fhir_id,
+            resource_id,
+            tuple(sorted(scope.split())),
+            tuple(params))
+
+
+def get_content(key):
+    cache = get_cache()
+    if cache is None:
+        return None
+
+    content = cache.get(key)
+    if content is not None:
+        logger.debug("Response cache hit for %s" % (key[1],))
+    return content
+
+
+def set_content(key, content):
+    cache = get_cache()
+    if cache is not None:
+        cache.set(key, content)
+
+
+def invalidate_patient(fhir_id):
+    """
+    Drop every cached response for a beneficiary.
+    """
+    if _cache is not None:
+        _cache.invalidate_patient(fhir_id)
+
+
+def clear():
+    if _cache is not None:
+        _cache.clear()
+
+
+def crosswalk_changed(sender, instance=None, **kwargs):
+    invalidate_patient(instance.fhir_id)
+
+
+post_save.connect(crosswalk_changed, sender='bluebutton.Crosswalk')
+post_delete.connect(crosswalk_changed, sender='bluebutton.Crosswalk')
@@ -0,0 +1,212 @@
+import hashlib
+import logging
+import threading
+import time
+import uuid
+
+import requests
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import quote_etag
+from oauth2_provider.compat import urlparse
+
+import apps.logging.request_logger as bb2logging
+
+from apps.fhir.server import connection as backend_connection
+from hhs_oauth_server import json_codec
+
+from . import constants
+from .utils import get_resourcerouter
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
+
+# The statements are kept in the host cache, shared by the processes of a
+# host, by (v2, issuer) key. They don't expire, the timer replaces them.
+HOST_CACHE_ALIAS = 'host'
+CACHE_KEY = 'capability_statement:%s:%s'
+
+# The keys of the statements this process has served, and refreshes
+_keys = set()
+_lock = threading.Lock()
+_timer = None
+
+
+class Statement(object):
+    """
+    A finished CapabilityStatement, encoded, and the security block of
+    its issuer it was finished with.
+    """
+
+    def __init__(self, content, security):
+        self.content = content
+        self.security = security
+        self.etag = quote_etag(hashlib.sha256(content).hexdigest())
+
+
+def is_enabled():
+    return bool(get_resourcerouter().capability_statement_refresh)
+
+
+def metadata_url(v2=False):
+    resource_router = get_resourcerouter()
+    parsed_url = urlparse(resource_router.fhir_url)
+    if parsed_url.path is not None:
+        return '{}://{}/{}/fhir/metadata'.format(parsed_url.scheme, parsed_url.netloc, 'v2' if v2 else 'v1')
+    else:
+        # url with no path
+        return '{}/{}/fhir/metadata'.format(resource_router.fhir_url, 'v2' if v2 else 'v1')
+
+
+def get_cache():
+    return caches[HOST_CACHE_ALIAS]
+
+
+def cache_key(key):
+    v2, issuer = key
+    return CACHE_KEY % ('v2' if v2 else 'v1', hashlib.sha256(issuer.encode('utf-8')).hexdigest())
+
+
+def get_statement(key):
+    """
+    Return the cached statement of key, a (v2, issuer) tuple, or None.
+    """
+    if not is_enabled():
+        return None
+    statement = get_cache().get(cache_key(key))
+    if statement is not None and key not in _keys:
+        # Set by another process of the host
+        with _lock:
+            _keys.add(key)
+        start_timer()
+    return statement
+
+
+def set_statement(key, content, security):
+    """
+    Build the statement of key from content, the body of the backend
+    metadata response, and keep it when the cache is enabled.
+    """
+    statement = Statement(encode(finish(parse(content), security)), security)
+    if is_enabled():
+        get_cache().set(cache_key(key), statement, None)
+        with _lock:
+            _keys.add(key)
+        start_timer()
+    return statement
+
+
+def clear():
+    with _lock:
+        keys = list(_keys)
+        _keys.clear()
+    get_cache().delete_many([cache_key(key) for key in keys])
+
+
+def parse(content):
+    data = conformance_filter(json_codec.loads(content))
+    # Fix format values
+    data['format'] = ['application/json', 'application/fhir+json']
+    return data
+
+
+def finish(data, security):
+    # Append Security to ConformanceStatement, without changing data
+    rest = [{**data['rest'][0], 'security': security}] + data['rest'][1:]
+    return {**data, 'rest': rest}
+
+
+def encode(data):
+    return json_codec.dumps(data, ensure_ascii=False, separators=json_codec.COMPACT_SEPARATORS).encode('utf-8')
+
+
+def start_timer():
+    global _timer
+
+    with _lock:
+        if _timer is None or not _timer.is_alive():
+            _timer = threading.Thread(target=run_timer, name='bfd-metadata', daemon=True)
+            _timer.start()
+
+
+def run_timer():
+    while True:
+        interval = get_resourcerouter().capability_statement_refresh
+        if not interval:
+            return
+        time.sleep(interval)
+        refresh()
+
+
+def refresh():
+    """
+    Fetch the statements this process has served again. When the backend
+    is not available the cached statements are kept, and served stale.
+    """
+    with _lock:
+        keys = list(_keys)
+
+    for v2 in set(key[0] for key in keys):
+        try:
+            data = parse(fetch(v2))
+        except Exception:
+            logger.exception("Could not refresh the %s CapabilityStatement" % ('v2' if v2 else 'v1'))
+            continue
+
+        for key in keys:
+            current = get_cache().get(cache_key(key)) if key[0] == v2 else None
+            if current is not None:
+                statement = Statement(encode(finish(data, current.security)), current.security)
+                get_cache().set(cache_key(key), statement, None)
+
+
+def fetch(v2):
+    call_to = metadata_url(v2)
+    req = requests.Request('GET', call_to, params={'_format': 'json'}, headers={
+        'includeAddressFields': 'False',
+        'keep-alive': settings.REQUEST_EOB_KEEP_ALIVE,
+        'BlueButton-OriginalQueryId': str(uuid.uuid1()),
+        'BlueButton-BackendCall': call_to,
+    })
+    r = backend_connection.send(backend_connection.prepare_request(req), timeout=get_resourcerouter().wait_time)
+    r.raise_for_status()
+    return r.content
+
+
+def conformance_filter(text_block):
+    """ Filter FHIR Conformance Statement based on
+        supported ResourceTypes
+    """
+
+    resource_names = constants.ALLOWED_RESOURCE_TYPES
+    ct = 0
+    if text_block:
+        if 'rest' in text_block:
+            for k in text_block['rest']:
+                for i, v in k.items():
+                    if i == 'resource':
+                        supp_resources = get_supported_resources(v, resource_names)
+                        text_block['rest'][ct]['resource'] = supp_resources
+                ct += 1
+        else:
+            text_block = ""
+    else:
+        text_block = ""
+
+    return text_block
+
+
+def get_supported_resources(resources, resource_names):
+    """ Filter resources for resource type matches """
+
+    resource_list = []
+
+    # if resource 'type in resource_names add resource to resource_list
+    for item in resources:
+        for k, v in item.items():
+            if k == 'type':
+                if v in resource_names:
+                    item['interaction'] = [{"code": "read"}, {"code": "search-type"}]
+                    resource_list.append(item)
+
+    return resource_list
@@ -1,6 +1,5 @@
 from rest_framework.exceptions import NotFound, APIException
 from rest_framework import status
-from requests import Response
 from .models import Fhir_Response
 
 
@@ -14,7 +13,6 @@ def process_error_response(response: Fhir_Response) -> APIException:
     alerts at runtime
     """
     err: APIException = None
-    r: Response = response.backend_response
     if response.status_code >= 300:
         if response.status_code == 404:
             err = NotFound('The requested resource does not exist')
@@ -23,7 +21,7 @@ def process_error_response(response: Fhir_Response) -> APIException:
             err = UpstreamServerException(msg)
             if response.status_code == 500:
                 try:
-                    json = r.json()
+                    json = response.json()
                     if json is not None:
                         issues = json.get('issue')
                         issue = issues[0] if issues else None
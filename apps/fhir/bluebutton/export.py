@@ -0,0 +1,242 @@
+import json
+import logging
+import tempfile
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import get_storage_class
+from django.db import connection
+from django.utils import timezone
+from requests import Request
+from rest_framework.exceptions import APIException, NotFound
+
+import apps.logging.request_logger as bb2logging
+
+from apps.fhir.server import connection as backend_connection
+
+from .constants import MAX_PAGE_SIZE
+from .exceptions import UpstreamServerException
+from .models import ExportJob
+from .ownership import OwnershipVerifier
+from .signals import pre_fetch, post_fetch
+from .utils import get_resourcerouter
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
+
+EXPORT_RESOURCE_TYPE = 'ExplanationOfBenefit'
+
+
+def get_storage():
+    """
+    The storage of the output files, EXPORT_FILE_STORAGE. It is private,
+    the files are only served by the authenticated ExportFileView.
+    """
+    return get_storage_class(settings.EXPORT_FILE_STORAGE)(**settings.EXPORT_FILE_STORAGE_OPTIONS)
+
+
+def output_name(job, resource_type=EXPORT_RESOURCE_TYPE):
+    return '%s/%s.ndjson' % (job.job_id, resource_type)
+
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=get_resourcerouter().export_workers,
+                                               thread_name_prefix='bfd-export')
+    return _executor
+
+
+def start_job(job):
+    """
+    Run the job on the EXPORT_WORKERS threads of this process when the
+    FHIR_SERVER EXPORT_IN_PROCESS setting is on, otherwise it waits for the
+    run_export_jobs management command.
+    """
+    if get_resourcerouter().export_in_process:
+        get_executor().submit(run_job_in_thread, job.pk)
+
+
+def run_job_in_thread(pk):
+    try:
+        run_job(pk)
+    except Exception:
+        logger.exception("Export job %s could not be run" % pk)
+    finally:
+        # The thread got its own database connection
+        connection.close()
+
+
+def expired_before():
+    return timezone.now() - timedelta(seconds=get_resourcerouter().export_ttl)
+
+
+def live_jobs():
+    """
+    The jobs created less than EXPORT_TTL seconds ago, older ones are deleted.
+    """
+    return ExportJob.objects.filter(created_at__gte=expired_before())
+
+
+def get_active_job(beneficiary, application):
+    return ExportJob.objects.filter(beneficiary=beneficiary, application=application,
+                                    status__in=ExportJob.ACTIVE_STATUSES).order_by('-created_at').first()
+
+
+def fail_stale_jobs(jobs=None):
+    """
+    Fail the jobs queued or running for more than EXPORT_TIMEOUT seconds,
+    their worker was restarted or is stuck. Returns their count.
+    """
+    jobs = ExportJob.objects.all() if jobs is None else jobs
+    now = timezone.now()
+    return jobs.filter(
+        status__in=ExportJob.ACTIVE_STATUSES,
+        created_at__lt=now - timedelta(seconds=get_resourcerouter().export_timeout),
+    ).update(status=ExportJob.FAILED, error='The export job did not complete in time', completed_at=now)
+
+
+def delete_job(job):
+    storage = get_storage()
+    for item in job.get_output():
+        storage.delete(item['name'])
+    job.delete()
+
+
+def delete_expired_jobs(limit=100):
+    """
+    Delete up to limit jobs older than EXPORT_TTL, and their files.
+    """
+    expired = list(ExportJob.objects.filter(created_at__lt=expired_before()).order_by('created_at')[:limit])
+    for job in expired:
+        delete_job(job)
+    return len(expired)
+
+
+def run_job(pk):
+    """
+    Page through the backend for a queued job and store the NDJSON output.
+
+    Returns False when the job was not queued (already picked up elsewhere).
+    """
+    if ExportJob.objects.filter(pk=pk, status=ExportJob.QUEUED).update(status=ExportJob.RUNNING) != 1:
+        return False
+
+    job = ExportJob.objects.select_related('beneficiary__crosswalk').filter(pk=pk).first()
+    if job is None:
+        # Deleted in the meantime
+        return False
+
+    name = None
+    try:
+        with tempfile.TemporaryFile() as ndjson:
+            count = export_resources(job, ndjson)
+            ndjson.seek(0)
+            name = get_storage().save(output_name(job), File(ndjson))
+
+        result = {'output': json.dumps([{"type": EXPORT_RESOURCE_TYPE, "name": name, "count": count}]),
+                  'resource_count': count,
+                  'status': ExportJob.COMPLETED}
+    except APIException as e:
+        logger.info("Export job %s failed: %s" % (job.job_id, e))
+        result = {'error': str(e.detail), 'status': ExportJob.FAILED}
+    except Exception as e:
+        logger.exception("Export job %s failed" % job.job_id)
+        result = {'error': 'An error occurred while exporting: %s' % e.__class__.__name__,
+                  'status': ExportJob.FAILED}
+
+    # Unless failed as stale or deleted in the meantime
+    if not ExportJob.objects.filter(pk=pk, status=ExportJob.RUNNING).update(completed_at=timezone.now(), **result):
+        if name is not None:
+            get_storage().delete(name)
+    return True
+
+
+def export_resources(job, out):
+    """
+    Write every ExplanationOfBenefit of the job's beneficiary to out, one
+    resource per line, and return the count.
+
+    Pages are requested with the largest page size the search view allows,
+    with the BFD logging headers built for the kick-off request.
+    """
+    # imported here, the views import this module
+    from .views.search import SearchViewExplanationOfBenefit
+    from .views.generic import FhirDataView
+
+    fhir_id = job.beneficiary.crosswalk.fhir_id
+    api_ver = 'v2' if job.version == 2 else 'v1'
+
+    view = SearchViewExplanationOfBenefit(job.version)
+    url = view.build_url(get_resourcerouter(), EXPORT_RESOURCE_TYPE)
+    # Same backend query as SearchViewExplanationOfBenefit.build_parameters()
+    params = {**job.get_parameters(),
+              '_format': 'application/json+fhir',
+              'patient': fhir_id,
+              '_count': MAX_PAGE_SIZE}
+    headers = job.get_headers()
+    headers['BlueButton-BackendCall'] = url
+
+    # One pass over each page, the report covers the whole export
+    verifier = OwnershipVerifier(fhir_id, EXPORT_RESOURCE_TYPE, search=True)
+    count = 0
+    start_index = 0
+    while True:
+        params['startIndex'] = start_index
+        req = Request('GET', url, params=params, headers=headers)
+        prepped = backend_connection.prepare_request(req)
+        pre_fetch.send_robust(FhirDataView, request=req, auth_request=None, api_ver=api_ver)
+        r = backend_connection.send(prepped)
+        post_fetch.send_robust(FhirDataView, request=prepped, auth_request=None, response=r, api_ver=api_ver)
+
+        if r.status_code != 200:
+            raise UpstreamServerException('An error occurred contacting the upstream server: %s' % r.status_code)
+
+        bundle = r.json()
+        try:
+            owned = verifier.verify(bundle)
+        except NotFound:
+            owned = False
+        if not owned and verifier.report.status == 'not_owned':
+            raise UpstreamServerException('The upstream server returned a resource of another beneficiary')
+        if not owned:
+            raise UpstreamServerException('The upstream server returned a resource that could not be verified')
+
+        # The verifier has read the resource of every entry, and rejects the
+        # page on any it can't, so each resource written is the beneficiary's
+        entries = bundle.get('entry', [])
+        for resource in [entry['resource'] for entry in entries]:
+            out.write(json.dumps(resource, separators=(',', ':')).encode('utf-8'))
+            out.write(b'\n')
+        count += len(entries)
+
+        has_next = any(link.get('relation') == 'next' for link in bundle.get('link', []))
+        if not entries or not has_next:
+            logger.info("Export job %s ownership: %s" % (job.job_id, verifier.report.as_dict()))
+            return count
+        start_index += len(entries)
+
+
+def run_queued_jobs():
+    """
+    Run every queued job, for the run_export_jobs management command,
+    after failing the stale ones and deleting the expired ones.
+    """
+    fail_stale_jobs()
+    while delete_expired_jobs():
+        pass
+    ran = 0
+    for pk in ExportJob.objects.filter(status=ExportJob.QUEUED).order_by('created_at').values_list('pk', flat=True):
+        if run_job(pk):
+            ran += 1
+    return ran
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.fhir.bluebutton.export import run_queued_jobs
+
+
+class Command(BaseCommand):
+    help = "Run the queued ExplanationOfBenefit $export jobs"
+
+    def handle(self, *args, **options):
+        ran = run_queued_jobs()
+        self.stdout.write("Export jobs run: %s" % ran)
@@ -1,15 +1,18 @@
 import binascii
+import json
+import uuid
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import (CASCADE, Q)
 from django.utils.crypto import pbkdf2
-from requests import Response
+from oauth2_provider.settings import oauth2_settings
 from rest_framework import status
 from rest_framework.exceptions import APIException
 
 from apps.accounts.models import get_user_id_salt
+from hhs_oauth_server import json_codec
 
 
 class BBFhirBluebuttonModelException(APIException):
@@ -207,39 +210,97 @@ class ArchivedCrosswalk(models.Model):
         return acw
 
 
-class Fhir_Response(Response):
+class ExportJob(models.Model):
     """
-    Build a more consistent Response object
-    requests.Response can be missing fields if an error is encountered
-    The purpose of this object is to encapsulate request.Response
-    and make sure the items needed further upstream are present.
+    Bulk $export of a beneficiary's ExplanationOfBenefit history for an application.
 
+    Jobs are run by apps.fhir.bluebutton.export, the NDJSON output goes to the
+    private EXPORT_FILE_STORAGE (ExportStorage on AWS).
     """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    )
+    ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    beneficiary = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=CASCADE)
+    application = models.ForeignKey(oauth2_settings.APPLICATION_MODEL, on_delete=CASCADE)
+    version = models.PositiveSmallIntegerField(default=1)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    request_url = models.TextField(default='')
+    # JSON: search parameters, and the BFD logging headers built for the kick-off request
+    parameters = models.TextField(default='{}')
+    headers = models.TextField(default='{}')
+    # JSON list of {"type": ..., "name": ..., "count": ...}
+    output = models.TextField(default='[]')
+    error = models.TextField(default='', blank=True)
+    resource_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
 
-    def __init__(self, req_response=Response):
+    def __str__(self):
+        return '%s %s' % (self.job_id, self.status)
+
+    def get_parameters(self):
+        return json.loads(self.parameters)
+
+    def get_headers(self):
+        return json.loads(self.headers)
+
+    def get_output(self):
+        return json.loads(self.output)
+
+
+class Fhir_Response(object):
+    """
+    Envelope of a backend FHIR server response, so the items needed
+    further upstream are present even when the call failed.
+
+    Only holds the status, the headers and a reference to the body of the
+    requests.Response, the text and JSON are decoded on first use.
+    """
+
+    __slots__ = ('backend_response', 'status_code', 'headers', 'content', 'encoding',
+                 'call_url', 'crosswalk', '_text', '_json')
+
+    def __init__(self, req_response=None, call_url=None, crosswalk=None):
         self.backend_response = req_response
+        self.call_url = call_url
+        self.crosswalk = crosswalk
+        self._text = None
+        self._json = None
+
         if req_response is None:
-            req_response = Response
-
-        for k, v in req_response.__dict__.items():
-            self.__dict__[k] = v
-
-        extend_response = {"_response": req_response,
-                           "_text": "",
-                           "_json": "{}",
-                           "_xml": "</>",
-                           "_status_code": "",
-                           "_call_url": "",
-                           "_cx": Crosswalk,
-                           "_result": "",
-                           "_owner": "",
-                           "encoding": "utf-8",
-                           "_content": ""
-                           }
-
-        # Add extra fields to Response Object
-        for k, v in extend_response.items():
-            self.__dict__[k] = v
+            self.status_code = '000'
+            self.headers = {}
+            self.content = b''
+            self.encoding = 'utf-8'
+        else:
+            self.status_code = req_response.status_code
+            self.headers = req_response.headers
+            self.content = req_response.content
+            self.encoding = req_response.encoding or 'utf-8'
+
+    @property
+    def text(self):
+        if self._text is None:
+            if isinstance(self.content, bytes):
+                self._text = self.content.decode(self.encoding, 'replace')
+            else:
+                self._text = self.content
+        return self._text
+
+    def json(self):
+        if self._json is None:
+            self._json = json_codec.loads(self.content)
+        return self._json
 
 
 def check_crosswalks():
@@ -0,0 +1,133 @@
+import logging
+
+from rest_framework import exceptions
+
+import apps.logging.request_logger as bb2logging
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
+
+# Member holding the beneficiary reference, per resource type.
+# A Patient is the beneficiary's when its id is the patient id.
+REFERENCE_MEMBERS = {
+    'Coverage': 'beneficiary',
+    'ExplanationOfBenefit': 'patient',
+}
+
+
+class OwnershipReport(object):
+    """
+    What an OwnershipVerifier has checked, for the audit log.
+    """
+
+    def __init__(self):
+        self.status = 'owned'
+        self.bundles = 0
+        self.resources = 0
+        self.unreadable = 0
+        self.resource_types = {}
+
+    def add(self, resource_type):
+        self.resources += 1
+        self.resource_types[resource_type] = self.resource_types.get(resource_type, 0) + 1
+
+    def as_dict(self):
+        return {
+            "status": self.status,
+            "bundles": self.bundles,
+            "resources": self.resources,
+            "unreadable": self.unreadable,
+            "resource_types": dict(self.resource_types),
+        }
+
+
+class OwnershipVerifier(object):
+    """
+    Check that FHIR resources and Bundles belong to one beneficiary, in a
+    single pass over the Bundle entries.
+
+    A verifier can be fed one response, or each page of a paged search in
+    turn, its report covers all of them. verify() raises NotFound on a
+    resource of another beneficiary, or of a resource type other than
+    resource_type (or a Bundle, for a search), and returns False on one
+    it can't read. A Bundle with an entry it can't read is not owned
+    either: the entry is counted in the report, and NotFound is raised.
+    """
+
+    def __init__(self, patient_id, resource_type=None, search=False):
+        self.patient_id = patient_id
+        self.resource_type = resource_type
+        self.search = search
+        self.report = OwnershipReport()
+        self._patient_path = patient_id + '/'
+
+    def verify(self, obj):
+        try:
+            if self.resource_type and obj['resourceType'] != self.resource_type and not (
+                    self.search and obj['resourceType'] == 'Bundle'):
+                raise exceptions.NotFound()
+            self._verify(obj)
+        except exceptions.NotFound:
+            self.report.status = 'invalid' if self.report.unreadable else 'not_owned'
+            raise
+        except Exception:
+            logger.exception('An error occurred fetching beneficiary id')
+            self.report.status = 'invalid'
+            return False
+        return True
+
+    def _verify(self, obj):
+        resource_type = obj['resourceType']
+        if resource_type == 'Bundle':
+            self.report.bundles += 1
+            for entry in obj.get('entry', ()):
+                try:
+                    self._verify(entry['resource'])
+                except exceptions.NotFound:
+                    raise
+                except Exception:
+                    self.report.unreadable += 1
+                    raise exceptions.NotFound()
+            return
+
+        if resource_type == 'Patient':
+            owned = obj['id'] == self.patient_id
+        elif resource_type in REFERENCE_MEMBERS:
+            owned = self.is_patient_reference(obj[REFERENCE_MEMBERS[resource_type]]['reference'])
+        else:
+            owned = False
+
+        if not owned:
+            raise exceptions.NotFound()
+        self.report.add(resource_type)
+
+    def is_patient_reference(self, reference):
+        # Patient/<id>, the second segment of the reference is the id
+        resource_type, slash, path = reference.partition('/')
+        if not slash:
+            raise ValueError("Not a relative reference: %s" % reference)
+        return path == self.patient_id or path.startswith(self._patient_path)
+
+
+def verify_ownership(request, obj, search=False):
+    """
+    Verify obj, the response data of request, against the crosswalk of the
+    request, a Bundle is only accepted for a search. Runs once for all the
+    permission classes of a view, and keeps the report on the request for
+    the request audit log.
+    """
+    verification = getattr(request, '_ownership_verification', None)
+    if verification is None or verification[0] is not obj:
+        verifier = OwnershipVerifier(request.crosswalk.fhir_id, getattr(request, 'resource_type', None), search)
+        try:
+            result = verifier.verify(obj)
+        except exceptions.NotFound as e:
+            result = e
+        verification = (obj, result)
+        request._ownership_verification = verification
+        # Read by hhs_oauth_server.request_logging from the HttpRequest
+        getattr(request, '_request', request).ownership_report = verifier.report
+
+    result = verification[1]
+    if isinstance(result, exceptions.NotFound):
+        raise result
+    return result
@@ -4,6 +4,7 @@ from rest_framework import (permissions, exceptions)
 from django.contrib.auth import get_user_model
 from rest_framework.exceptions import PermissionDenied
 from .constants import ALLOWED_RESOURCE_TYPES
+from .ownership import verify_ownership
 from django.conf import settings
 
 import apps.logging.request_logger as bb2logging
@@ -35,29 +36,8 @@ class ReadCrosswalkPermission(HasCrosswalk):
         # Now check that the user has permission to access the data
         # Patient resources were taken care of above
         # Return 404 on error to avoid notifying unauthorized user the object exists
-
-        try:
-            if request.resource_type == 'Coverage':
-                reference = obj['beneficiary']['reference']
-                reference_id = reference.split('/')[1]
-                if reference_id != request.crosswalk.fhir_id:
-                    raise exceptions.NotFound()
-            elif request.resource_type == 'ExplanationOfBenefit':
-                reference = obj['patient']['reference']
-                reference_id = reference.split('/')[1]
-                if reference_id != request.crosswalk.fhir_id:
-                    raise exceptions.NotFound()
-            else:
-                reference_id = obj['id']
-                if reference_id != request.crosswalk.fhir_id:
-                    raise exceptions.NotFound()
-
-        except exceptions.NotFound:
-            raise
-        except Exception:
-            logger.exception('An error occurred fetching beneficiary id')
-            return False
-        return True
+        # Shares one verification with DataAccessGrantPermission
+        return verify_ownership(request, obj)
 
 
 class SearchCrosswalkPermission(HasCrosswalk):
@@ -0,0 +1,123 @@
+import logging
+import re
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+import apps.logging.request_logger as bb2logging
+
+from apps.fhir.server import connection as backend_connection
+
+from .cache import ResponseCache
+from .signals import pre_fetch, post_fetch
+from .utils import get_resourcerouter
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
+
+# Relation of a Bundle link to the next page
+NEXT_LINK = re.compile(rb'"relation"\s*:\s*"next"')
+
+_cache = None
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def is_enabled():
+    return bool(get_resourcerouter().prefetch)
+
+
+def get_cache():
+    """
+    Return the cache of prefetched pages of this process, or None when
+    prefetching is disabled by the FHIR_SERVER PREFETCH setting.
+
+    Keys are response cache keys (see apps.fhir.bluebutton.cache) with the
+    access token appended, so a page is only served to the token that
+    caused it to be fetched.
+    """
+    global _cache
+
+    if not is_enabled():
+        return None
+
+    if _cache is None:
+        resource_router = get_resourcerouter()
+        with _lock:
+            if _cache is None:
+                _cache = ResponseCache(resource_router.prefetch_max_bytes,
+                                       {"ExplanationOfBenefit": resource_router.prefetch_ttl})
+    return _cache
+
+
+def get_executor():
+    global _executor
+
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=get_resourcerouter().prefetch_workers,
+                                               thread_name_prefix='bfd-prefetch')
+    return _executor
+
+
+def token_key(request, key):
+    return key + (request.auth.pk,)
+
+
+def has_next_page(content):
+    return NEXT_LINK.search(content) is not None
+
+
+def get_content(request, key):
+    cache = get_cache()
+    if cache is None:
+        return None
+
+    content = cache.get(token_key(request, key))
+    if content is not None:
+        logger.debug("Serving prefetched page of %s" % (key[1],))
+    return content
+
+
+def schedule(request, key, req, api_ver):
+    """
+    Fetch the backend request req in the background and keep the response
+    for the next call of the same token with the response cache key key.
+
+    The request is prepared here, in the request thread.
+    """
+    cache = get_cache()
+    if cache is None:
+        return
+
+    key = token_key(request, key)
+    with _lock:
+        if key in _pending or cache.get(key) is not None:
+            return
+        _pending.add(key)
+
+    prepped = backend_connection.prepare_request(req)
+    try:
+        get_executor().submit(fetch, cache, key, req, prepped, api_ver)
+    except RuntimeError:
+        # The executor is shut down, the process is exiting
+        with _lock:
+            _pending.discard(key)
+
+
+def fetch(cache, key, req, prepped, api_ver):
+    # imported here, the views import this module
+    from .views.generic import FhirDataView
+
+    try:
+        pre_fetch.send_robust(FhirDataView, request=req, auth_request=None, api_ver=api_ver)
+        r = backend_connection.send(prepped)
+        post_fetch.send_robust(FhirDataView, request=prepped, auth_request=None, response=r, api_ver=api_ver)
+        if r.status_code == 200:
+            cache.set(key, r.content)
+    except Exception:
+        logger.exception("Could not prefetch %s" % prepped.url)
+    finally:
+        with _lock:
+            _pending.discard(key)
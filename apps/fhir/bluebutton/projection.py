@@ -0,0 +1,137 @@
+"""
+Server side _elements and _summary of FHIR reads and searches.
+
+The backend is always asked for full resources, the projection is applied
+to the decoded response after the object permission checks.
+"""
+from voluptuous import Any, Match
+
+# Query parameters handled here, not sent to the backend
+PARAMETERS = ('_elements', '_summary')
+
+# Regex to match a comma separated list of top level element names
+REGEX_ELEMENTS = r'^\s*[a-zA-Z][a-zA-Z0-9]*(\s*,\s*[a-zA-Z][a-zA-Z0-9]*)*\s*$'
+
+READ_SCHEMA = {
+    '_elements': Match(REGEX_ELEMENTS, msg="the _elements value is not valid"),
+    '_summary': Any('true', 'text', 'data', 'false', msg="the _summary value is not valid"),
+}
+
+SEARCH_SCHEMA = {
+    **READ_SCHEMA,
+    '_summary': Any('true', 'text', 'data', 'count', 'false', msg="the _summary value is not valid"),
+}
+
+# Always returned
+BASE_ELEMENTS = ('resourceType', 'id', 'meta')
+
+# Mandatory top level elements of each resource type, STU3 (v1) and R4 (v2)
+MANDATORY_ELEMENTS = {
+    'Patient': (),
+    'Coverage': ('status', 'beneficiary', 'payor'),
+    'ExplanationOfBenefit': ('status', 'type', 'use', 'patient', 'created', 'insurer', 'provider', 'outcome',
+                             'insurance'),
+}
+
+# Top level summary elements of each resource type, STU3 (v1) and R4 (v2)
+SUMMARY_ELEMENTS = {
+    'Patient': ('identifier', 'active', 'name', 'telecom', 'gender', 'birthDate', 'deceased', 'address',
+                'managingOrganization', 'link'),
+    'Coverage': ('identifier', 'status', 'type', 'policyHolder', 'subscriber', 'subscriberId', 'beneficiary',
+                 'dependent', 'relationship', 'period', 'payor', 'class', 'grouping', 'sequence', 'order',
+                 'network', 'contract'),
+    'ExplanationOfBenefit': ('identifier', 'status', 'type', 'use', 'patient', 'billablePeriod', 'created',
+                             'insurer', 'provider', 'outcome', 'insurance', 'total'),
+}
+
+# Tag of a resource missing some of its elements
+SUBSETTED_SYSTEMS = {
+    1: 'http://hl7.org/fhir/v3/ObservationValue',
+    2: 'http://terminology.hl7.org/CodeSystem/v3-ObservationValue',
+}
+
+
+def get_projection(parameters):
+    """
+    Remove the projection parameters from the backend query parameters and
+    return them, the ones without effect are left out.
+    """
+    projection = {}
+    for name in PARAMETERS:
+        value = parameters.pop(name, None)
+        if value is not None:
+            projection[name] = value
+    if projection.get('_summary') == 'false':
+        del projection['_summary']
+    if '_elements' in projection:
+        projection['_elements'] = tuple(sorted({e.strip() for e in projection['_elements'].split(',')}))
+        # _elements takes precedence, except to only count the matches of a search
+        if projection.get('_summary') != 'count':
+            projection.pop('_summary', None)
+    return projection
+
+
+def project(data, projection, version=1):
+    """
+    Apply a projection from get_projection to a resource, or to each
+    resource of a Bundle. Returns a new object, data is left as is.
+    """
+    if not projection:
+        return data
+
+    if data.get('resourceType') != 'Bundle':
+        return project_resource(data, projection, version)
+
+    if projection.get('_summary') == 'count':
+        return {key: value for key, value in data.items() if key != 'entry'}
+
+    bundle = dict(data)
+    if 'entry' in bundle:
+        bundle['entry'] = [{**entry, 'resource': project_resource(entry['resource'], projection, version)}
+                           if 'resource' in entry else entry
+                           for entry in bundle['entry']]
+    return bundle
+
+
+def project_resource(resource, projection, version=1):
+    resource_type = resource.get('resourceType')
+    summary = projection.get('_summary')
+
+    if '_elements' in projection:
+        keep = projection['_elements'] + MANDATORY_ELEMENTS.get(resource_type, ())
+    elif summary == 'true':
+        keep = SUMMARY_ELEMENTS.get(resource_type, ()) + MANDATORY_ELEMENTS.get(resource_type, ())
+    elif summary == 'text':
+        keep = ('text',) + MANDATORY_ELEMENTS.get(resource_type, ())
+    elif summary == 'data':
+        keep = None
+    else:
+        return resource
+
+    projected = {}
+    for key, value in resource.items():
+        if keep is None:
+            included = key not in ('text', '_text')
+        else:
+            included = key in BASE_ELEMENTS or is_kept(key, keep)
+        if included:
+            projected[key] = value
+
+    if len(projected) < len(resource):
+        meta = dict(projected.get('meta', {}))
+        meta['tag'] = meta.get('tag', []) + [{'system': SUBSETTED_SYSTEMS.get(version, SUBSETTED_SYSTEMS[1]),
+                                             'code': 'SUBSETTED'}]
+        projected['meta'] = meta
+    return projected
+
+
+def is_kept(key, elements):
+    # _birthDate holds the extensions of birthDate
+    name = key[1:] if key.startswith('_') else key
+    for element in elements:
+        if name == element:
+            return True
+        # Choice of type elements, like deceasedBoolean for deceased
+        if name.startswith(element) and name[len(element):len(element) + 1].isupper():
+            return True
+    return False
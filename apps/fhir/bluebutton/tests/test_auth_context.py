@@ -0,0 +1,65 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from httmock import all_requests, HTTMock
+
+from apps.test import BaseApiTest
+
+from ..auth_context import get_auth_context
+
+PATIENT = {"resourceType": "Patient", "id": "-20140000008325"}
+
+
+# Without the validated token cache, see apps.dot_ext.token_cache
+@override_settings(ACCESS_TOKEN_CACHE_TTL=0)
+class AuthContextTest(BaseApiTest):
+
+    def setUp(self):
+        self.read_capability = self._create_capability('Read', [])
+        self.write_capability = self._create_capability('Write', [])
+        self.client = Client()
+        self.access_token = self.create_token('John', 'Smith')
+        self.headers = []
+
+    def _get(self):
+        @all_requests
+        def catchall(url, req):
+            self.headers.append(req.headers)
+            return {'status_code': 200, 'content': PATIENT}
+
+        with HTTMock(catchall), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('bb_oauth_fhir_patient_read_or_update_or_delete', kwargs={'resource_id': PATIENT['id']}),
+                Authorization="Bearer %s" % (self.access_token))
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries.captured_queries]
+
+    def test_queries(self):
+        response, queries = self._get()
+
+        def count(table):
+            return len([sql for sql in queries if sql.startswith('SELECT') and ' FROM "%s"' % table in sql])
+
+        # Authentication, permissions, backend headers and the request log
+        # share one load of each
+        self.assertEqual(count('oauth2_provider_accesstoken'), 1)
+        # Joined to the token
+        self.assertEqual(count('dot_ext_application'), 0)
+        self.assertEqual(count('bluebutton_crosswalk'), 1)
+        self.assertEqual(count('authorization_dataaccessgrant'), 1)
+        # The developer, the beneficiary comes with the token
+        self.assertEqual(count('auth_user'), 1)
+        self.assertLessEqual(len(queries), 7)
+
+        headers = self.headers[0]
+        self.assertEqual(headers['BlueButton-BeneficiaryId'], 'patientId:%s' % PATIENT['id'])
+        self.assertEqual(headers['BlueButton-Application'], 'John_Smith_test')
+        self.assertTrue(headers['BlueButton-DeveloperId'])
+
+    def test_context(self):
+        response, queries = self._get()
+        context = get_auth_context(response.wsgi_request)
+        self.assertEqual(context.token.token, self.access_token)
+        self.assertEqual(context.crosswalk.fhir_id, PATIENT['id'])
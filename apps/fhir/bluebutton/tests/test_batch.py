@@ -0,0 +1,124 @@
+import threading
+
+from django.test.client import Client
+from django.urls import reverse
+from httmock import all_requests, HTTMock
+from unittest.mock import patch
+from waffle.testutils import override_switch
+
+from apps.fhir.server.settings import fhir_settings
+from apps.test import BaseApiTest
+
+PATIENT = {"resourceType": "Patient", "id": "-20140000008325"}
+
+COVERAGE = {"resourceType": "Bundle",
+            "entry": [{"resource": {"resourceType": "Coverage",
+                                    "id": "part-a--20140000008325",
+                                    "beneficiary": {"reference": "Patient/-20140000008325"}}}]}
+
+EOB = {"resourceType": "Bundle",
+       "entry": [{"resource": {"resourceType": "ExplanationOfBenefit",
+                               "id": "carrier-1",
+                               "item": [{"sequence": 1}],
+                               "patient": {"reference": "Patient/-20140000008325"}}}]}
+
+
+def batch(*urls, method='GET'):
+    return {"resourceType": "Bundle",
+            "type": "batch",
+            "entry": [{"request": {"method": method, "url": url}} for url in urls]}
+
+
+class BatchTest(BaseApiTest):
+
+    def setUp(self):
+        self.read_capability = self._create_capability('Read', [])
+        self.write_capability = self._create_capability('Write', [])
+        self.client = Client()
+        self.access_token = self.create_token('John', 'Smith')
+        self.calls = []
+
+    def _post(self, bundle):
+        @all_requests
+        def catchall(url, req):
+            self.calls.append((req.url, threading.current_thread().name))
+            if '/Patient/' in url.path:
+                content = {**PATIENT, "id": url.path.split('/Patient/')[1].strip('/') or PATIENT['id']}
+            elif '/Coverage/' in url.path:
+                content = COVERAGE
+            elif '/ExplanationOfBenefit/' in url.path:
+                content = EOB
+            else:
+                return {'status_code': 404, 'content': {}}
+            return {'status_code': 200, 'content': content}
+
+        with HTTMock(catchall):
+            return self.client.post(reverse('bb_oauth_fhir_batch'), bundle, content_type='application/json',
+                                    Authorization="Bearer %s" % (self.access_token))
+
+    def test_batch(self):
+        response = self._post(batch('Patient/-20140000008325',
+                                    'Coverage',
+                                    '/v1/fhir/ExplanationOfBenefit?_count=5&_elements=id'))
+        self.assertEqual(response.status_code, 200)
+        bundle = response.json()
+        self.assertEqual(bundle['type'], 'batch-response')
+        self.assertEqual([entry['response']['status'] for entry in bundle['entry']], ['200 OK'] * 3)
+        self.assertEqual(bundle['entry'][0]['resource'], PATIENT)
+        self.assertEqual(bundle['entry'][1]['resource'], COVERAGE)
+        self.assertNotIn('item', bundle['entry'][2]['resource']['entry'][0]['resource'])
+        self.assertTrue(bundle['entry'][0]['response']['etag'].startswith('"'))
+
+        # Sent from the pool, with the headers of a single read or search
+        self.assertEqual(len(self.calls), 3)
+        self.assertTrue(all(name.startswith('bfd-batch') for url, name in self.calls))
+        eob_url = [url for url, name in self.calls if 'ExplanationOfBenefit' in url][0]
+        self.assertIn('_count=5', eob_url)
+        self.assertNotIn('_elements', eob_url)
+
+    def test_entry_errors(self):
+        response = self._post(batch('Patient/-20140000000001',
+                                    'Observation',
+                                    'ExplanationOfBenefit?_count=5000',
+                                    '/v1/o/authorize/',
+                                    'ExplanationOfBenefit/$export',
+                                    'Patient/-20140000008325'))
+        self.assertEqual(response.status_code, 200)
+        statuses = [entry['response']['status'] for entry in response.json()['entry']]
+        self.assertEqual(statuses, ['404 Not Found', '404 Not Found', '400 Bad Request', '404 Not Found',
+                                    '404 Not Found', '200 OK'])
+        outcome = response.json()['entry'][2]['response']['outcome']
+        self.assertEqual(outcome['resourceType'], 'OperationOutcome')
+
+    @override_switch('require-scopes', active=True)
+    def test_entry_scopes(self):
+        # The token's capabilities have no protected resources
+        response = self._post(batch('Patient/-20140000008325', 'Coverage'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['response']['status'] for entry in response.json()['entry']],
+                         ['403 Forbidden'] * 2)
+        self.assertEqual(self.calls, [])
+
+    def test_invalid_bundle(self):
+        self.assertEqual(self._post(batch('Patient', method='POST')).status_code, 400)
+        self.assertEqual(self._post({"resourceType": "Bundle", "type": "transaction", "entry": []}).status_code, 400)
+        with patch.object(fhir_settings, 'batch_max_entries', 2):
+            self.assertEqual(self._post(batch('Patient', 'Coverage', 'ExplanationOfBenefit')).status_code, 400)
+        self.assertEqual(self.calls, [])
+
+    def test_backend_error(self):
+        @all_requests
+        def catchall(url, req):
+            return {'status_code': 502, 'content': {}}
+
+        with HTTMock(catchall):
+            response = self.client.post(reverse('bb_oauth_fhir_batch'), batch('Patient', 'Coverage'),
+                                        content_type='application/json',
+                                        Authorization="Bearer %s" % (self.access_token))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['response']['status'] for entry in response.json()['entry']],
+                         ['502 Bad Gateway'] * 2)
+
+    def test_not_authenticated(self):
+        response = self.client.post(reverse('bb_oauth_fhir_batch'), batch('Patient'), content_type='application/json')
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,92 @@
+import json
+
+from django.test import TestCase
+from django.test.client import Client
+from django.urls import reverse
+from httmock import all_requests, HTTMock
+from unittest.mock import patch
+
+from apps.test import BaseApiTest
+
+from ..cache import ResponseCache
+
+PATIENT = {"resourceType": "Patient", "id": "-20140000008325"}
+
+
+class TestResponseCache(TestCase):
+
+    def test_ttl_per_resource(self):
+        cache = ResponseCache(1024, {"Patient": 60})
+        patient_key = ('v1', 'Patient', '-1', None, (), ())
+        coverage_key = ('v1', 'Coverage', '-1', None, (), ())
+
+        cache.set(patient_key, b'{}')
+        cache.set(coverage_key, b'{}')
+        self.assertEqual(cache.get(patient_key), b'{}')
+        self.assertIsNone(cache.get(coverage_key))
+
+        with patch('apps.fhir.bluebutton.cache.time.monotonic', return_value=10 ** 9):
+            self.assertIsNone(cache.get(patient_key))
+        self.assertEqual(cache.size, 0)
+
+    def test_lru_memory_cap(self):
+        cache = ResponseCache(10, {"Patient": 60})
+        keys = [('v1', 'Patient', str(i), None, (), ()) for i in range(3)]
+
+        cache.set(keys[0], b'1234')
+        cache.set(keys[1], b'1234')
+        cache.get(keys[0])
+        cache.set(keys[2], b'1234')
+
+        self.assertEqual(cache.get(keys[0]), b'1234')
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual(cache.size, 8)
+
+        cache.set(keys[1], b'12345678901')
+        self.assertIsNone(cache.get(keys[1]))
+
+    def test_invalidate_patient(self):
+        cache = ResponseCache(1024, {"Patient": 60, "Coverage": 60})
+        cache.set(('v1', 'Patient', '-1', None, (), ()), b'{}')
+        cache.set(('v2', 'Coverage', '-1', None, (), ()), b'{}')
+        cache.set(('v1', 'Patient', '-2', None, (), ()), b'{}')
+
+        cache.invalidate_patient('-1')
+        self.assertEqual(len(cache), 1)
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+
+
+class TestCachedFetch(BaseApiTest):
+
+    def setUp(self):
+        self.read_capability = self._create_capability('Read', [])
+        self.write_capability = self._create_capability('Write', [])
+        self._create_capability('patient', [
+            ["GET", r"\/v1\/fhir\/Patient\/\-\d+"],
+            ["GET", "/v1/fhir/Patient"],
+        ])
+        self.client = Client()
+
+    def test_read_served_from_cache(self):
+        first_access_token = self.create_token('John', 'Smith')
+        calls = []
+
+        @all_requests
+        def catchall(url, req):
+            calls.append(req.url)
+            return {'status_code': 200, 'content': PATIENT}
+
+        url = reverse('bb_oauth_fhir_patient_read_or_update_or_delete',
+                      kwargs={'resource_id': '-20140000008325'})
+        with patch('apps.fhir.bluebutton.cache.get_cache',
+                   return_value=ResponseCache(1024, {"Patient": 60})):
+            with HTTMock(catchall):
+                for _ in range(3):
+                    response = self.client.get(url, Authorization="Bearer %s" % (first_access_token))
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(json.loads(response.content), PATIENT)
+
+        self.assertEqual(len(calls), 1)
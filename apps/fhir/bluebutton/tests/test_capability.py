@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.test.client import Client
+from django.urls import reverse
+from httmock import all_requests, HTTMock
+from unittest.mock import patch
+
+from apps.fhir.server.settings import fhir_settings
+from hhs_oauth_server.shared_memory_cache import SharedMemoryCache
+
+from .. import capability
+from .data_conformance import CONFORMANCE
+
+
+class CapabilityStatementTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.calls = []
+        capability.clear()
+        self.addCleanup(capability.clear)
+
+    def _mock(self, status_code=200, fhir_version="3.0.2"):
+        @all_requests
+        def catchall(url, req):
+            self.calls.append(req.url)
+            return {'status_code': status_code,
+                    'content': {**json.loads(CONFORMANCE), "fhirVersion": fhir_version}}
+        return HTTMock(catchall)
+
+    def _get(self, name='fhir_conformance_metadata', **headers):
+        with self._mock():
+            return self.client.get(reverse(name), **headers)
+
+    def test_cached(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        statement = response.json()
+        self.assertEqual([resource['type'] for resource in statement['rest'][0]['resource']],
+                         ['Coverage', 'ExplanationOfBenefit', 'Patient'])
+        self.assertIn('security', statement['rest'][0])
+        self.assertEqual(statement['format'], ['application/json', 'application/fhir+json'])
+        etag = response['ETag']
+
+        response = self._get()
+        self.assertEqual(response.json(), statement)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(self.calls), 1)
+
+        response = self._get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(self.calls), 1)
+
+        # v2 has its own statement
+        self._get('fhir_conformance_metadata_v2')
+        self.assertEqual(len(self.calls), 2)
+        self.assertIn('/v2/fhir/metadata', self.calls[1])
+
+    def test_refresh(self):
+        etag = self._get()['ETag']
+
+        # Served stale while the backend is not available
+        with self._mock(status_code=502):
+            capability.refresh()
+        response = self._get()
+        self.assertEqual(response['ETag'], etag)
+
+        with self._mock(fhir_version="3.0.3"):
+            capability.refresh()
+        response = self._get()
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['fhirVersion'], "3.0.3")
+        self.assertIn('security', response.json()['rest'][0])
+        self.assertEqual(len(self.calls), 3)
+
+    def test_backend_error(self):
+        with self._mock(status_code=502):
+            response = self.client.get(reverse('fhir_conformance_metadata'))
+        self.assertEqual(response.status_code, 502)
+
+        # Not cached
+        self.assertEqual(self._get().status_code, 200)
+
+    def test_disabled(self):
+        with patch.object(fhir_settings, 'capability_statement_refresh', 0):
+            self._get()
+            response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_shared_by_the_host(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'host-cache')
+        host = {'BACKEND': 'hhs_oauth_server.shared_memory_cache.SharedMemoryCache',
+                'LOCATION': path, 'OPTIONS': {'SIZE': 1024 * 1024}}
+        with override_settings(CACHES={**settings.CACHES, 'host': host}):
+            etag = self._get()['ETag']
+
+            # Another process of the host sees the statement
+            other = SharedMemoryCache(path, {'OPTIONS': {'SIZE': 1024 * 1024}})
+            key, = capability._keys
+            self.assertEqual(other.get(capability.cache_key(key)).etag, etag)
+
+            # And serves it without fetching it, then refreshes it
+            capability._keys.clear()
+            self.assertEqual(self._get()['ETag'], etag)
+            self.assertEqual(len(self.calls), 1)
+            self.assertEqual(capability._keys, {key})
+
+            capability.clear()
+            self.assertIsNone(other.get(capability.cache_key(key)))
@@ -0,0 +1,118 @@
+import json
+
+from django.test.client import Client
+from django.urls import reverse
+from httmock import all_requests, HTTMock
+from unittest.mock import patch
+
+import apps.logging.request_logger as logging
+
+from apps.fhir.server.settings import fhir_settings
+from apps.test import BaseApiTest
+
+COVERAGE = {"resourceType": "Coverage",
+            "id": "part-a-1",
+            "meta": {"lastUpdated": "2020-06-01T10:30:00.123-04:00"},
+            "beneficiary": {"reference": "Patient/-20140000008325"}}
+
+
+class TestConditionalRead(BaseApiTest):
+
+    def setUp(self):
+        self.read_capability = self._create_capability('Read', [])
+        self.write_capability = self._create_capability('Write', [])
+        self._create_capability('coverage', [
+            ["GET", r"\/v1\/fhir\/Coverage\/.+"],
+        ])
+        self.client = Client()
+        self.access_token = self.create_token('John', 'Smith')
+
+    def _read_coverage(self, content=COVERAGE, **headers):
+        @all_requests
+        def catchall(url, req):
+            return {'status_code': 200, 'content': content}
+
+        with HTTMock(catchall):
+            return self.client.get(
+                reverse('bb_oauth_fhir_coverage_read_or_update_or_delete',
+                        kwargs={'resource_id': 'coverage_id'}),
+                Authorization="Bearer %s" % (self.access_token), **headers)
+
+    def test_validators(self):
+        response = self._read_coverage()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertEqual(response['Last-Modified'], 'Mon, 01 Jun 2020 14:30:00 GMT')
+
+        # Same body, same ETag
+        self.assertEqual(self._read_coverage()['ETag'], response['ETag'])
+
+        changed = {**COVERAGE, "id": "part-a-2"}
+        self.assertNotEqual(self._read_coverage(changed)['ETag'], response['ETag'])
+
+    def test_etag_depends_on_media_type(self):
+        etag = self._read_coverage()['ETag']
+        response = self._read_coverage(HTTP_ACCEPT='application/fhir+json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_none_match(self):
+        etag = self._read_coverage()['ETag']
+
+        response = self._read_coverage(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        response = self._read_coverage(HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['id'], 'part-a-1')
+
+    def test_if_modified_since(self):
+        response = self._read_coverage(HTTP_IF_MODIFIED_SINCE='Mon, 01 Jun 2020 14:30:00 GMT')
+        self.assertEqual(response.status_code, 304)
+
+        response = self._read_coverage(HTTP_IF_MODIFIED_SINCE='Mon, 01 Jun 2020 14:29:59 GMT')
+        self.assertEqual(response.status_code, 200)
+
+        # If-None-Match takes precedence
+        response = self._read_coverage(HTTP_IF_MODIFIED_SINCE='Mon, 01 Jun 2020 14:30:00 GMT',
+                                       HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_no_last_updated(self):
+        content = {key: value for key, value in COVERAGE.items() if key != 'meta'}
+        response = self._read_coverage(content, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jun 2020 14:30:00 GMT')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_other_beneficiary_not_modified(self):
+        content = {**COVERAGE, "beneficiary": {"reference": "Patient/-20140000000001"}}
+        response = self._read_coverage(content, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
+    def test_streamed(self):
+        with patch.object(fhir_settings, 'stream_responses', True):
+            response = self._read_coverage()
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Last-Modified'], 'Mon, 01 Jun 2020 14:30:00 GMT')
+
+            response = self._read_coverage(HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+
+    def test_not_modified_audit_log(self):
+        self._redirect_loggers()
+        self.addCleanup(self._cleanup_logger)
+        etag = self._read_coverage()['ETag']
+
+        for stream in (False, True):
+            with patch.object(fhir_settings, 'stream_responses', stream):
+                response = self._read_coverage(HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+            log_content = self._collect_logs()[logging.AUDIT_HHS_AUTH_SERVER_REQ_LOGGER]
+            log_entry = json.loads(log_content.splitlines()[-1])
+            self.assertEqual(log_entry['response_code'], 304)
+            self.assertEqual(log_entry['fhir_resource_type'], 'Coverage')
+            self.assertEqual(log_entry['fhir_resource_id'], 'part-a-1')
+            self.assertIsNone(log_entry['fhir_bundle_type'])
@@ -0,0 +1,266 @@
+import json
+import os
+import tempfile
+
+from datetime import timedelta
+
+from django.test import override_settings
+from django.test.client import Client
+from django.urls import reverse
+from django.utils import timezone
+from httmock import all_requests, HTTMock
+from unittest.mock import patch
+
+from apps.test import BaseApiTest
+
+from ..export import delete_expired_jobs, run_job, run_queued_jobs
+from ..models import ExportJob
+
+
+def eob(eob_id, patient_id='-20140000008325'):
+    return {"resourceType": "ExplanationOfBenefit",
+            "id": eob_id,
+            "patient": {"reference": "Patient/" + patient_id}}
+
+
+def bundle(resources, has_next):
+    link = [{"relation": "self", "url": "self"}]
+    if has_next:
+        link.append({"relation": "next", "url": "next"})
+    return {"resourceType": "Bundle",
+            "total": 3,
+            "link": link,
+            "entry": [{"resource": resource} for resource in resources]}
+
+
+class ExportTest(BaseApiTest):
+
+    def setUp(self):
+        self.read_capability = self._create_capability('Read', [])
+        self.write_capability = self._create_capability('Write', [])
+        self._create_capability('eob', [
+            ["GET", r"\/v1\/fhir\/ExplanationOfBenefit\/.+"],
+            ["GET", "/v1/fhir/ExplanationOfBenefit"],
+        ])
+        self.client = Client()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+        self.export_root = export_root.name
+        settings_override = override_settings(MEDIA_ROOT=media_root.name,
+                                              EXPORT_FILE_STORAGE_OPTIONS={'location': export_root.name})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _kick_off(self, access_token, **params):
+        with patch('apps.fhir.bluebutton.views.export.start_job') as start_job:
+            response = self.client.get(reverse('bb_oauth_fhir_eob_export'), params,
+                                       Authorization="Bearer %s" % (access_token))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(start_job.call_count, 1)
+        return response, start_job.call_args[0][0]
+
+    def test_export(self):
+        access_token = self.create_token('John', 'Smith')
+        response, job = self._kick_off(access_token, _since='2020-01-01')
+        self.assertEqual(json.loads(job.parameters), {'_lastUpdated': ['ge2020-01-01']})
+
+        status_url = response['Content-Location']
+        response = self.client.get(status_url, Authorization="Bearer %s" % (access_token))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['X-Progress'], 'queued')
+
+        calls = []
+
+        @all_requests
+        def catchall(url, req):
+            calls.append(req)
+            if 'startIndex=0' in req.url:
+                return {'status_code': 200, 'content': bundle([eob('carrier-1'), eob('carrier-2')], True)}
+            return {'status_code': 200, 'content': bundle([eob('pde-1')], False)}
+
+        with HTTMock(catchall):
+            self.assertTrue(run_job(job.pk))
+
+        self.assertEqual(len(calls), 2)
+        self.assertIn('startIndex=2', calls[1].url)
+        self.assertIn('_count=50', calls[1].url)
+        self.assertIn('_lastUpdated=ge2020-01-01', calls[1].url)
+        self.assertEqual(calls[0].headers['BlueButton-BeneficiaryId'], 'patientId:-20140000008325')
+
+        # Already run
+        self.assertFalse(run_job(job.pk))
+
+        response = self.client.get(status_url, Authorization="Bearer %s" % (access_token))
+        self.assertEqual(response.status_code, 200)
+        manifest = response.json()
+        self.assertTrue(manifest['requiresAccessToken'])
+        self.assertEqual(len(manifest['output']), 1)
+        self.assertEqual(manifest['output'][0]['type'], 'ExplanationOfBenefit')
+        self.assertEqual(manifest['output'][0]['count'], 3)
+
+        response = self.client.get(manifest['output'][0]['url'], Authorization="Bearer %s" % (access_token))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/fhir+ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], ['carrier-1', 'carrier-2', 'pde-1'])
+
+        # Written to the private export storage, never under MEDIA_ROOT
+        self.assertTrue(os.path.exists(os.path.join(self.export_root, str(job.job_id), 'ExplanationOfBenefit.ndjson')))
+        self.assertEqual(os.listdir(self.media_root), [])
+
+    def _run(self, job):
+        @all_requests
+        def catchall(url, req):
+            return {'status_code': 200, 'content': bundle([eob('carrier-1')], False)}
+
+        with HTTMock(catchall):
+            self.assertTrue(run_job(job.pk))
+        job.refresh_from_db()
+        return os.path.join(self.export_root, job.get_output()[0]['name'])
+
+    def test_export_active_job(self):
+        access_token = self.create_token('John', 'Smith')
+        response, job = self._kick_off(access_token)
+
+        # The active job is returned
+        with patch('apps.fhir.bluebutton.views.export.start_job') as start_job:
+            again = self.client.get(reverse('bb_oauth_fhir_eob_export'),
+                                    Authorization="Bearer %s" % (access_token))
+        self.assertEqual(again.status_code, 202)
+        self.assertEqual(again['Content-Location'], response['Content-Location'])
+        self.assertFalse(start_job.called)
+        self.assertEqual(ExportJob.objects.count(), 1)
+
+        self._run(job)
+        response, other = self._kick_off(access_token)
+        self.assertNotEqual(other.pk, job.pk)
+
+    def test_export_stale_job(self):
+        access_token = self.create_token('John', 'Smith')
+        response, job = self._kick_off(access_token)
+        ExportJob.objects.filter(pk=job.pk).update(status=ExportJob.RUNNING,
+                                                   created_at=timezone.now() - timedelta(hours=2))
+
+        response = self.client.get(response['Content-Location'], Authorization="Bearer %s" % (access_token))
+        self.assertEqual(response.status_code, 500)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.FAILED)
+
+    def test_export_delete(self):
+        access_token = self.create_token('John', 'Smith')
+        response, job = self._kick_off(access_token)
+        path = self._run(job)
+        self.assertTrue(os.path.exists(path))
+
+        status_url = response['Content-Location']
+        response = self.client.delete(status_url, Authorization="Bearer %s" % (access_token))
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ExportJob.objects.exists())
+
+        response = self.client.get(status_url, Authorization="Bearer %s" % (access_token))
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_expired(self):
+        access_token = self.create_token('John', 'Smith')
+        response, job = self._kick_off(access_token)
+        path = self._run(job)
+        ExportJob.objects.filter(pk=job.pk).update(created_at=timezone.now() - timedelta(days=2))
+
+        response = self.client.get(response['Content-Location'], Authorization="Bearer %s" % (access_token))
+        self.assertEqual(response.status_code, 404)
+
+        self.assertEqual(delete_expired_jobs(), 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_export_failed_while_running(self):
+        access_token = self.create_token('John', 'Smith')
+        response, job = self._kick_off(access_token)
+
+        @all_requests
+        def catchall(url, req):
+            # Failed as stale by another process
+            ExportJob.objects.filter(pk=job.pk).update(status=ExportJob.FAILED)
+            return {'status_code': 200, 'content': bundle([eob('carrier-1')], False)}
+
+        with HTTMock(catchall):
+            self.assertTrue(run_job(job.pk))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.FAILED)
+        self.assertEqual(os.listdir(self.export_root), [str(job.job_id)])
+        self.assertEqual(os.listdir(os.path.join(self.export_root, str(job.job_id))), [])
+
+    def test_run_queued_jobs(self):
+        access_token = self.create_token('John', 'Smith')
+        response, stale = self._kick_off(access_token)
+        ExportJob.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timedelta(hours=2))
+        response, job = self._kick_off(access_token)
+
+        @all_requests
+        def catchall(url, req):
+            return {'status_code': 200, 'content': bundle([eob('carrier-1')], False)}
+
+        with HTTMock(catchall):
+            self.assertEqual(run_queued_jobs(), 1)
+        stale.refresh_from_db()
+        job.refresh_from_db()
+        self.assertEqual(stale.status, ExportJob.FAILED)
+        self.assertEqual(job.status, ExportJob.COMPLETED)
+
+    def test_export_other_beneficiary(self):
+        access_token = self.create_token('John', 'Smith')
+        response, job = self._kick_off(access_token)
+
+        @all_requests
+        def catchall(url, req):
+            return {'status_code': 200, 'content': bundle([eob('carrier-1', '-20140000000001')], False)}
+
+        with HTTMock(catchall):
+            run_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.FAILED)
+        self.assertEqual(job.get_output(), [])
+
+        response = self.client.get(response['Content-Location'], Authorization="Bearer %s" % (access_token))
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()['resourceType'], 'OperationOutcome')
+
+    def test_export_unreadable_entry(self):
+        access_token = self.create_token('John', 'Smith')
+        response, job = self._kick_off(access_token)
+
+        for entries in [[{"resource": eob('carrier-1')}, {"fullUrl": "carrier-2"}],
+                        [{"resource": eob('carrier-1')}, {"resource": {"resourceType": "ExplanationOfBenefit",
+                                                                       "id": "carrier-2"}}]]:
+            ExportJob.objects.filter(pk=job.pk).update(status=ExportJob.QUEUED)
+
+            @all_requests
+            def catchall(url, req):
+                return {'status_code': 200, 'content': {**bundle([], False), "entry": entries}}
+
+            with HTTMock(catchall):
+                run_job(job.pk)
+
+            job.refresh_from_db()
+            self.assertEqual(job.status, ExportJob.FAILED)
+            self.assertEqual(job.error, 'The upstream server returned a resource that could not be verified')
+            self.assertEqual(job.get_output(), [])
+
+    def test_export_invalid_type(self):
+        access_token = self.create_token('John', 'Smith')
+        response = self.client.get(reverse('bb_oauth_fhir_eob_export'), {'_type': 'Patient'},
+                                   Authorization="Bearer %s" % (access_token))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_export_job_not_found(self):
+        access_token = self.create_token('John', 'Smith')
+        response = self.client.get(
+            reverse('bb_oauth_fhir_eob_export_status', kwargs={'job_id': '00000000-0000-0000-0000-000000000000'}),
+            Authorization="Bearer %s" % (access_token))
+        self.assertEqual(response.status_code, 404)
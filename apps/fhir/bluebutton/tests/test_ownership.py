@@ -0,0 +1,99 @@
+from django.test import RequestFactory, TestCase
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from unittest.mock import Mock
+
+from ..ownership import OwnershipVerifier, verify_ownership
+
+PATIENT_ID = '-20140000008325'
+
+
+def eob(patient_id=PATIENT_ID):
+    return {"resourceType": "ExplanationOfBenefit", "id": "carrier-1",
+            "patient": {"reference": "Patient/%s" % patient_id}}
+
+
+def bundle(*resources):
+    return {"resourceType": "Bundle", "entry": [{"resource": resource} for resource in resources]}
+
+
+class OwnershipVerifierTest(TestCase):
+
+    def test_owned(self):
+        verifier = OwnershipVerifier(PATIENT_ID)
+        self.assertTrue(verifier.verify(bundle(eob(), eob())))
+        self.assertTrue(verifier.verify({"resourceType": "Patient", "id": PATIENT_ID}))
+        self.assertTrue(verifier.verify({"resourceType": "Coverage",
+                                         "beneficiary": {"reference": "Patient/%s/_history/1" % PATIENT_ID}}))
+        self.assertEqual(verifier.report.as_dict(), {
+            "status": "owned",
+            "bundles": 1,
+            "resources": 4,
+            "unreadable": 0,
+            "resource_types": {"ExplanationOfBenefit": 2, "Patient": 1, "Coverage": 1},
+        })
+
+    def test_not_owned(self):
+        verifier = OwnershipVerifier(PATIENT_ID)
+        with self.assertRaises(NotFound):
+            verifier.verify(bundle(eob(), eob('-201400000083250'), eob()))
+        self.assertEqual(verifier.report.status, 'not_owned')
+        self.assertEqual(verifier.report.resources, 1)
+
+        with self.assertRaises(NotFound):
+            OwnershipVerifier(PATIENT_ID).verify({"resourceType": "Observation", "id": PATIENT_ID})
+        with self.assertRaises(NotFound):
+            OwnershipVerifier(PATIENT_ID, 'ExplanationOfBenefit').verify({"resourceType": "Patient",
+                                                                          "id": PATIENT_ID})
+
+    def test_invalid(self):
+        verifier = OwnershipVerifier(PATIENT_ID)
+        self.assertFalse(verifier.verify({"resourceType": "Coverage"}))
+        self.assertEqual(verifier.report.status, 'invalid')
+
+        # An entry that can't be read rejects the whole Bundle
+        for entry in [{"resourceType": "Coverage"},
+                      {"resourceType": "ExplanationOfBenefit", "patient": {"reference": PATIENT_ID}},
+                      {"resourceType": "ExplanationOfBenefit", "patient": {"identifier": {"value": PATIENT_ID}}}]:
+            verifier = OwnershipVerifier(PATIENT_ID)
+            with self.assertRaises(NotFound):
+                verifier.verify(bundle(eob(), entry, eob()))
+            self.assertEqual(verifier.report.status, 'invalid')
+            self.assertEqual(verifier.report.unreadable, 1)
+            self.assertEqual(verifier.report.resources, 1)
+        with self.assertRaises(NotFound):
+            OwnershipVerifier(PATIENT_ID).verify({"resourceType": "Bundle", "entry": [{"fullUrl": "carrier-1"}]})
+        self.assertFalse(OwnershipVerifier(PATIENT_ID).verify({"resourceType": "ExplanationOfBenefit",
+                                                               "patient": {"reference": PATIENT_ID}}))
+
+    def test_verify_ownership(self):
+        request = Request(RequestFactory().get('/v1/fhir/ExplanationOfBenefit/'))
+        request.crosswalk = Mock(fhir_id=PATIENT_ID)
+        request.resource_type = 'ExplanationOfBenefit'
+
+        data = bundle(eob())
+        self.assertTrue(verify_ownership(request, data, search=True))
+        report = request._request.ownership_report
+        self.assertEqual(report.resources, 1)
+
+        # Verified once per response
+        self.assertTrue(verify_ownership(request, data, search=True))
+        self.assertIs(request._request.ownership_report, report)
+
+        data = bundle(eob('-201400000083250'))
+        for i in range(2):
+            with self.assertRaises(NotFound):
+                verify_ownership(request, data, search=True)
+
+    def test_bundle_only_for_search(self):
+        verifier = OwnershipVerifier(PATIENT_ID, 'ExplanationOfBenefit')
+        self.assertTrue(verifier.verify(eob()))
+        with self.assertRaises(NotFound):
+            verifier.verify(bundle(eob()))
+        self.assertTrue(OwnershipVerifier(PATIENT_ID, 'ExplanationOfBenefit', search=True).verify(bundle(eob())))
+
+        request = Request(RequestFactory().get('/v1/fhir/ExplanationOfBenefit/carrier-1'))
+        request.crosswalk = Mock(fhir_id=PATIENT_ID)
+        request.resource_type = 'ExplanationOfBenefit'
+        with self.assertRaises(NotFound):
+            verify_ownership(request, bundle(eob()))
@@ -0,0 +1,86 @@
+import json
+
+from django.test.client import Client
+from django.urls import reverse
+from httmock import all_requests, HTTMock
+from unittest.mock import patch
+
+from apps.fhir.server.settings import fhir_settings
+from apps.test import BaseApiTest
+
+from .. import prefetch
+
+
+class SynchronousExecutor(object):
+
+    def submit(self, fn, *args, **kwargs):
+        fn(*args, **kwargs)
+
+
+def bundle(start_index, has_next):
+    link = [{"relation": "self", "url": "self"}]
+    if has_next:
+        link.append({"relation": "next", "url": "next"})
+    return {"resourceType": "Bundle",
+            "id": "page-%s" % start_index,
+            "link": link,
+            "entry": []}
+
+
+class PrefetchTest(BaseApiTest):
+
+    def setUp(self):
+        self.read_capability = self._create_capability('Read', [])
+        self.write_capability = self._create_capability('Write', [])
+        self._create_capability('eob', [
+            ["GET", "/v1/fhir/ExplanationOfBenefit"],
+        ])
+        self.client = Client()
+
+        prefetch._cache = None
+        self.addCleanup(setattr, prefetch, '_cache', None)
+        for patcher in (patch.object(fhir_settings, 'prefetch', True),
+                        patch('apps.fhir.bluebutton.prefetch.get_executor', return_value=SynchronousExecutor())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_next_page_is_prefetched(self):
+        access_token = self.create_token('John', 'Smith')
+        calls = []
+
+        @all_requests
+        def catchall(url, req):
+            calls.append(req.url)
+            start_index = 10 if 'startIndex=10' in req.url else 0
+            return {'status_code': 200, 'content': bundle(start_index, start_index == 0)}
+
+        with HTTMock(catchall):
+            for start_index in (0, 10):
+                response = self.client.get(reverse('bb_oauth_fhir_eob_search'),
+                                           {'startIndex': start_index},
+                                           Authorization="Bearer %s" % (access_token))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(json.loads(response.content)['id'], 'page-%s' % start_index)
+
+        # The second page was requested once, in the background
+        self.assertEqual(len(calls), 2)
+        self.assertIn('startIndex=10', calls[1])
+
+    def test_not_served_to_other_token(self):
+        access_token = self.create_token('John', 'Smith')
+        calls = []
+
+        @all_requests
+        def catchall(url, req):
+            calls.append(req.url)
+            return {'status_code': 200, 'content': bundle(0, True)}
+
+        with HTTMock(catchall):
+            self.client.get(reverse('bb_oauth_fhir_eob_search'), Authorization="Bearer %s" % (access_token))
+            self.assertEqual(len(calls), 2)
+
+            other_access_token = self._get_access_token('John', '123456', self._create_application('other'))
+            self.client.get(reverse('bb_oauth_fhir_eob_search'), {'startIndex': 10},
+                            Authorization="Bearer %s" % (other_access_token))
+
+        self.assertEqual(len(calls), 4)
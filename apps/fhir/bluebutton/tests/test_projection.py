@@ -0,0 +1,135 @@
+from django.test import TestCase
+from django.test.client import Client
+from django.urls import reverse
+from httmock import all_requests, HTTMock
+from unittest.mock import patch
+
+from apps.fhir.server.settings import fhir_settings
+from apps.test import BaseApiTest
+
+from ..projection import get_projection, project
+
+EOB = {"resourceType": "ExplanationOfBenefit",
+       "id": "carrier-1",
+       "meta": {"lastUpdated": "2020-06-01T10:30:00.123-04:00"},
+       "text": {"status": "generated"},
+       "identifier": [{"value": "1"}],
+       "status": "active",
+       "type": {"coding": [{"code": "71"}]},
+       "billablePeriod": {"start": "1999-10-27"},
+       "_billablePeriod": {"extension": []},
+       "patient": {"reference": "Patient/-20140000008325"},
+       "item": [{"sequence": 1}]}
+
+BUNDLE = {"resourceType": "Bundle",
+          "total": 1,
+          "link": [{"relation": "self", "url": "self"}],
+          "entry": [{"resource": EOB}]}
+
+
+class ProjectionTest(TestCase):
+
+    def test_get_projection(self):
+        parameters = {'_count': 10, '_elements': 'type, identifier,type', '_summary': 'true'}
+        self.assertEqual(get_projection(parameters), {'_elements': ('identifier', 'type')})
+        self.assertEqual(parameters, {'_count': 10})
+
+        self.assertEqual(get_projection({'_summary': 'false'}), {})
+        self.assertEqual(get_projection({'_summary': 'count', '_elements': 'id'}),
+                         {'_summary': 'count', '_elements': ('id',)})
+
+    def test_elements(self):
+        resource = project(EOB, {'_elements': ('identifier', 'billablePeriod')}, version=2)
+        self.assertEqual(list(resource), ['resourceType', 'id', 'meta', 'identifier', 'status', 'type',
+                                          'billablePeriod', '_billablePeriod', 'patient'])
+        self.assertEqual(resource['meta']['tag'], [{
+            'system': 'http://terminology.hl7.org/CodeSystem/v3-ObservationValue', 'code': 'SUBSETTED'}])
+        # Not changed
+        self.assertNotIn('tag', EOB['meta'])
+
+    def test_choice_of_type(self):
+        patient = {"resourceType": "Patient", "id": "1", "deceasedBoolean": False, "gender": "male"}
+        self.assertEqual(project(patient, {'_elements': ('deceased',)}),
+                         {"resourceType": "Patient", "id": "1", "deceasedBoolean": False,
+                          "meta": {"tag": [{"system": "http://hl7.org/fhir/v3/ObservationValue",
+                                            "code": "SUBSETTED"}]}})
+
+    def test_summary(self):
+        self.assertNotIn('item', project(EOB, {'_summary': 'true'}))
+        self.assertNotIn('text', project(EOB, {'_summary': 'true'}))
+        self.assertIn('billablePeriod', project(EOB, {'_summary': 'true'}))
+
+        resource = project(EOB, {'_summary': 'data'})
+        self.assertNotIn('text', resource)
+        self.assertIn('item', resource)
+
+        resource = project(EOB, {'_summary': 'text'})
+        self.assertIn('text', resource)
+        self.assertNotIn('item', resource)
+
+        self.assertIs(project(EOB, {}), EOB)
+
+    def test_bundle(self):
+        bundle = project(BUNDLE, {'_elements': ('identifier',)})
+        self.assertEqual(bundle['total'], 1)
+        self.assertNotIn('item', bundle['entry'][0]['resource'])
+
+        self.assertEqual(project(BUNDLE, {'_summary': 'count'}),
+                         {"resourceType": "Bundle", "total": 1, "link": [{"relation": "self", "url": "self"}]})
+
+
+class ProjectionViewTest(BaseApiTest):
+
+    def setUp(self):
+        self.read_capability = self._create_capability('Read', [])
+        self.write_capability = self._create_capability('Write', [])
+        self._create_capability('eob', [
+            ["GET", r"\/v1\/fhir\/ExplanationOfBenefit\/.+"],
+            ["GET", "/v1/fhir/ExplanationOfBenefit"],
+        ])
+        self.client = Client()
+        self.access_token = self.create_token('John', 'Smith')
+        self.calls = []
+
+    def _get(self, url, params, content):
+        @all_requests
+        def catchall(url, req):
+            self.calls.append(req.url)
+            return {'status_code': 200, 'content': content}
+
+        with HTTMock(catchall):
+            return self.client.get(url, params, Authorization="Bearer %s" % (self.access_token))
+
+    def test_search(self):
+        response = self._get(reverse('bb_oauth_fhir_eob_search'), {'_elements': 'identifier,type'}, BUNDLE)
+        self.assertEqual(response.status_code, 200)
+        resource = response.json()['entry'][0]['resource']
+        self.assertIn('identifier', resource)
+        self.assertNotIn('item', resource)
+        self.assertNotIn('_elements', self.calls[0])
+
+        response = self._get(reverse('bb_oauth_fhir_eob_search'), {'_summary': 'count'}, BUNDLE)
+        self.assertEqual(response.json()['total'], 1)
+        self.assertNotIn('entry', response.json())
+
+    def test_read(self):
+        url = reverse('bb_oauth_fhir_eob_read_or_update_or_delete', kwargs={'resource_id': 'carrier-1'})
+        response = self._get(url, {'_summary': 'true'}, EOB)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('item', response.json())
+        etag = response['ETag']
+
+        # Whole resource, streamed or not
+        response = self._get(url, {}, EOB)
+        self.assertIn('item', response.json())
+        self.assertNotEqual(response['ETag'], etag)
+
+        with patch.object(fhir_settings, 'stream_responses', True):
+            response = self._get(url, {'_summary': 'true'}, EOB)
+        self.assertNotIn('item', response.json())
+
+    def test_invalid(self):
+        url = reverse('bb_oauth_fhir_eob_read_or_update_or_delete', kwargs={'resource_id': 'carrier-1'})
+        self.assertEqual(self._get(url, {'_summary': 'count'}, EOB).status_code, 400)
+        self.assertEqual(self._get(url, {'_elements': 'item.sequence'}, EOB).status_code, 400)
+        self.assertEqual(self.calls, [])
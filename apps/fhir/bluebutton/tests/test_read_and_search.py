@@ -12,6 +12,7 @@ from urllib.parse import unquote
 from unittest.mock import patch
 from waffle.testutils import override_switch, override_flag
 
+from apps.fhir.server import connection as backend_connection
 from apps.test import BaseApiTest
 from apps.mymedicare_cb.tests.responses import patient_response
 from apps.fhir.bluebutton.views.home import (conformance_filter)
@@ -26,7 +27,7 @@ def get_expected_read_request(ver):
             'url': 'https://fhir.backend.bluebutton.hhsdevcloud.us/{}/fhir/Patient/-20140000008325/?_format=json'.format(ver),
             'headers': {
                 # 'User-Agent': 'python-requests/2.20.0',
-                'Accept-Encoding': 'gzip, deflate',
+                'Accept-Encoding': backend_connection.ACCEPT_ENCODING,
                 'Accept': '*/*',
                 'Connection': 'keep-alive',
                 'BlueButton-OriginalQueryCounter': '1',
@@ -46,7 +47,7 @@ def get_expected_request(ver):
                     "{}/fhir/Patient/?_format=application%2Fjson%2Bfhir&_id=-20140000008325".format(ver)),
             'headers': {
                 # 'User-Agent': 'python-requests/2.20.0',
-                'Accept-Encoding': 'gzip, deflate',
+                'Accept-Encoding': backend_connection.ACCEPT_ENCODING,
                 'Accept': '*/*',
                 'Connection': 'keep-alive',
                 'BlueButton-OriginalQueryCounter': '1',
@@ -70,11 +71,11 @@ class ConformanceReadRequestTest(TestCase):
         self.factory = RequestFactory()
         self.client = Client()
 
-    @patch('apps.fhir.bluebutton.utils.requests')
-    def test_fhir_bluebutton_read_conformance_testcase(self, mock_requests):
+    @patch('apps.fhir.server.connection.get_session')
+    def test_fhir_bluebutton_read_conformance_testcase(self, mock_session):
         """ Checking Conformance
 
-            The @patch replaces the call to requests with mock_requests
+            The @patch replaces the backend session with mock_session
 
         """
 
@@ -82,18 +83,18 @@ class ConformanceReadRequestTest(TestCase):
         request = self.factory.get(call_to)
 
         # Now we can setup the responses we want to the call
-        mock_requests.get.return_value.status_code = 200
-        mock_requests.get.return_value.content = CONFORMANCE
+        mock_session.return_value.send.return_value.status_code = 200
+        mock_session.return_value.send.return_value.content = CONFORMANCE
 
-        # Make the call to request_call which uses requests.get
-        # patch will intercept the call to requests.get and
+        # Make the call to request_call which uses the backend session
+        # patch will intercept the call to session.send and
         # return the pre-defined values
         result = apps.fhir.bluebutton.utils.request_call(request,
                                                          call_to,
                                                          crosswalk=None)
 
         # Test for a match
-        self.assertEqual(result._response.content, CONFORMANCE)
+        self.assertEqual(result.content, CONFORMANCE)
 
     def test_fhir_conformance_filter(self):
         """ Check filtering of Conformance Statement """
@@ -674,6 +675,34 @@ class BackendConnectionTest(BaseApiTest):
 
             self.assertEqual(response.status_code, 200)
 
+    def test_read_eob_bundle_request(self):
+        # A Bundle of the beneficiary's resources is not a read response
+        first_access_token = self.create_token('John', 'Smith')
+
+        @all_requests
+        def catchall(url, req):
+            return {
+                'status_code': 200,
+                'content': {
+                    'resourceType': 'Bundle',
+                    'entry': [{
+                        'resource': {
+                            'resourceType': 'ExplanationOfBenefit',
+                            'patient': {
+                                'reference': 'stuff/-20140000008325',
+                            },
+                        },
+                    }],
+                },
+            }
+
+        with HTTMock(catchall):
+            response = self.client.get(
+                reverse('bb_oauth_fhir_eob_read_or_update_or_delete', kwargs={'resource_id': 'eob_id'}),
+                Authorization="Bearer %s" % (first_access_token))
+
+            self.assertEqual(response.status_code, 404)
+
     def test_read_coverage_request(self):
         self._read_coverage_request(False)
 
@@ -0,0 +1,85 @@
+import json
+
+from django.test.client import Client
+from django.urls import reverse
+from httmock import all_requests, HTTMock
+from unittest.mock import patch
+
+import apps.logging.request_logger as logging
+
+from apps.fhir.server.settings import fhir_settings
+from apps.test import BaseApiTest
+
+
+class TestStreamedFetch(BaseApiTest):
+
+    def setUp(self):
+        self.read_capability = self._create_capability('Read', [])
+        self.write_capability = self._create_capability('Write', [])
+        self._create_capability('coverage', [
+            ["GET", r"\/v1\/fhir\/Coverage\/.+"],
+        ])
+        self.client = Client()
+
+    def _read_coverage(self, content):
+        first_access_token = self.create_token('John', 'Smith')
+
+        @all_requests
+        def catchall(url, req):
+            return {'status_code': 200, 'content': content}
+
+        with patch.object(fhir_settings, 'stream_responses', True):
+            with HTTMock(catchall):
+                return self.client.get(
+                    reverse('bb_oauth_fhir_coverage_read_or_update_or_delete',
+                            kwargs={'resource_id': 'coverage_id'}),
+                    Authorization="Bearer %s" % (first_access_token))
+
+    def test_body_is_forwarded(self):
+        content = b'{"resourceType": "Coverage", "id": "part-a-1",\n "beneficiary": {"reference": "Patient/-20140000008325"}}'
+        response = self._read_coverage(content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.content, content)
+
+    def test_other_beneficiary_not_found(self):
+        response = self._read_coverage(b'{"resourceType": "Coverage", "id": "part-a-1",'
+                                       b' "beneficiary": {"reference": "Patient/-20140000000001"}}')
+        self.assertEqual(response.status_code, 404)
+
+    def test_audit_log(self):
+        self._redirect_loggers()
+        self.addCleanup(self._cleanup_logger)
+        response = self._read_coverage(b'{"resourceType": "Coverage", "id": "part-a-1", "status": "active",'
+                                       b' "beneficiary": {"reference": "Patient/-20140000008325"}}')
+        self.assertEqual(response.status_code, 200)
+
+        log_content = self._collect_logs()[logging.AUDIT_HHS_AUTH_SERVER_REQ_LOGGER]
+        log_entry = json.loads(log_content.splitlines()[-1])
+        self.assertEqual(log_entry['fhir_resource_type'], 'Coverage')
+        self.assertEqual(log_entry['fhir_resource_id'], 'part-a-1')
+        self.assertEqual(log_entry['fhir_attribute_count'], 4)
+        self.assertIsNone(log_entry['fhir_bundle_type'])
+        self.assertIsNone(log_entry['fhir_entry_count'])
+        self.assertIsNone(log_entry['fhir_total'])
+
+    def test_unreadable_entry_not_found(self):
+        first_access_token = self.create_token('John', 'Smith')
+        content = json.dumps({"resourceType": "Bundle", "entry": [
+            {"resource": {"resourceType": "Coverage", "id": "part-a-1",
+                          "beneficiary": {"reference": "Patient/-20140000008325"}}},
+            {"resource": {"resourceType": "Coverage", "id": "part-b-1",
+                          "beneficiary": {"identifier": {"value": "-20140000000001"}}}},
+        ]}).encode()
+
+        @all_requests
+        def catchall(url, req):
+            return {'status_code': 200, 'content': content}
+
+        for stream in [True, False]:
+            with patch.object(fhir_settings, 'stream_responses', stream), HTTMock(catchall):
+                response = self.client.get(reverse('bb_oauth_fhir_coverage_search'),
+                                           Authorization="Bearer %s" % (first_access_token))
+            self.assertEqual(response.status_code, 404)
+            self.assertNotIn(b'part-a-1', response.content)
@@ -1,4 +1,5 @@
 import os
+import requests
 import uuid
 from django.conf import settings
 from django.contrib.auth.models import User
@@ -17,6 +18,8 @@ from apps.fhir.bluebutton.utils import (
     crosswalk_patient_id,
     get_resourcerouter,
     build_oauth_resource,
+    parse_ownership,
+    build_fhir_response,
 )
 
 ENCODED = settings.ENCODING
@@ -316,3 +319,57 @@ class Security_Metadata_test(BaseApiTest):
         # print(result[16:33])
 
         self.assertEqual(result[16:33], expected)
+
+
+class ParseOwnershipTestCase(TestCase):
+
+    def test_parse_ownership(self):
+        content = (b'{"resourceType":"Bundle","id":"b1","total":1,"link":[{"relation":"self","url":"x"}],'
+                   b'"entry":[{"fullUrl":"y","resource":{"resourceType":"ExplanationOfBenefit","id":"carrier-1",'
+                   b'"patient":{"reference":"Patient/-20140000008325"},"item":[{"sequence":1}]}}]}')
+
+        self.assertEqual(parse_ownership(content), {
+            "resourceType": "Bundle",
+            "id": "b1",
+            "entry": [{"resource": {"resourceType": "ExplanationOfBenefit",
+                                    "id": "carrier-1",
+                                    "patient": {"reference": "Patient/-20140000008325"}}}]})
+
+    def test_parse_ownership_summary(self):
+        content = (b'{"resourceType":"Bundle","id":"b1","type":"searchset","total":3,'
+                   b'"link":[{"relation":"self","url":"x"}],'
+                   b'"entry":[{"resource":{"resourceType":"ExplanationOfBenefit","id":"carrier-1","type":{"text":"x"},'
+                   b'"patient":{"reference":"Patient/-20140000008325"}}}]}')
+
+        summary = {}
+        self.assertEqual(parse_ownership(content, summary)['id'], 'b1')
+        self.assertEqual(summary, {
+            "fhir_bundle_type": "searchset",
+            "fhir_resource_id": "b1",
+            "fhir_resource_type": "Bundle",
+            "fhir_attribute_count": 6,
+            "fhir_entry_count": 1,
+            "fhir_total": 3,
+        })
+
+
+class BuildFhirResponseTestCase(TestCase):
+
+    def test_response(self):
+        r = requests.Response()
+        r.status_code = 200
+        r.encoding = 'utf-8'
+        r._content = '{"resourceType":"Patient","name":"Zoë"}'.encode('utf-8')
+
+        response = build_fhir_response(None, 'https://bfd/v1/fhir/Patient/1', None, r=r)
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(response.content, r._content)
+        self.assertEqual(response.text, '{"resourceType":"Patient","name":"Zoë"}')
+        self.assertEqual(response.json()['name'], 'Zoë')
+        self.assertFalse(hasattr(response, '__dict__'))
+
+    def test_exception(self):
+        response = build_fhir_response(None, 'https://bfd/v1/fhir/Patient/1', None,
+                                       e=requests.exceptions.Timeout())
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(response.json()['text'], "The gateway has timed out")
@@ -1,12 +1,32 @@
 from django.conf.urls import url
 from django.contrib import admin
 
+from apps.fhir.bluebutton.views.batch import BatchView
+from apps.fhir.bluebutton.views.export import ExportFileView, ExportStatusView, ExportView
 from apps.fhir.bluebutton.views.read import ReadViewCoverage, ReadViewExplanationOfBenefit, ReadViewPatient
 from apps.fhir.bluebutton.views.search import SearchViewCoverage, SearchViewExplanationOfBenefit, SearchViewPatient
 
 admin.autodiscover()
 
 urlpatterns = [
+    # Batch Bundle, POST to the FHIR base URL
+    url(r'^$',
+        BatchView.as_view(),
+        name='bb_oauth_fhir_batch'),
+
+    # EOB $export, before the EOB ReadView which would match it
+    url(r'^ExplanationOfBenefit/\$export/(?P<job_id>[0-9a-f-]+)/(?P<resource_type>[A-Za-z]+)\.ndjson$',
+        ExportFileView.as_view(),
+        name='bb_oauth_fhir_eob_export_file'),
+
+    url(r'^ExplanationOfBenefit/\$export/(?P<job_id>[0-9a-f-]+)$',
+        ExportStatusView.as_view(),
+        name='bb_oauth_fhir_eob_export_status'),
+
+    url(r'^ExplanationOfBenefit/\$export$',
+        ExportView.as_view(),
+        name='bb_oauth_fhir_eob_export'),
+
     # Patient ReadView
     url(r'Patient/(?P<resource_id>[^/]+)',
         ReadViewPatient.as_view(),
@@ -1,4 +1,5 @@
 import os
+import json
 import logging
 
 import apps.logging.request_logger as bb2logging
@@ -13,11 +14,13 @@ from pytz import timezone
 
 from django.conf import settings
 from django.contrib import messages
+from django.utils.dateparse import parse_datetime
 from apps.fhir.server.settings import fhir_settings
 
 from oauth2_provider.models import AccessToken
 
 from apps.wellknown.views import (base_issuer, build_endpoint_info)
+from .auth_context import AuthContext, get_auth_context
 from .models import Crosswalk, Fhir_Response
 
 logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
@@ -143,7 +146,8 @@ def generate_info_headers(request):
 
     # Return resource_owner or user
     user = get_user_from_request(request)
-    crosswalk = get_crosswalk(user)
+    context = get_auth_context(request)
+    crosswalk = context.crosswalk if context else get_crosswalk(user)
     if crosswalk:
         # we need to send the HicnHash or the fhir_id
         # TODO: Can the hicnHash case ever be reached? Should refactor this!
@@ -160,12 +164,15 @@ def generate_info_headers(request):
         # result['BlueButton-User'] = str(user)
         result['BlueButton-Application'] = ""
         result['BlueButton-ApplicationId'] = ""
-        if AccessToken.objects.filter(token=get_access_token_from_request(request)).exists():
-            at = AccessToken.objects.get(token=get_access_token_from_request(request))
-            result['BlueButton-Application'] = str(at.application.name)
-            result['BlueButton-ApplicationId'] = str(at.application.id)
-            result['BlueButton-DeveloperId'] = str(at.application.user.id)
-            # result['BlueButton-Developer'] = str(at.application.user)
+        if context is None:
+            at = AccessToken.objects.select_related('application__user').filter(
+                token=get_access_token_from_request(request)).first()
+            context = AuthContext(at, user) if at is not None else None
+        if context is not None:
+            result['BlueButton-Application'] = str(context.application.name)
+            result['BlueButton-ApplicationId'] = str(context.application.id)
+            result['BlueButton-DeveloperId'] = str(context.developer.id)
+            # result['BlueButton-Developer'] = str(context.developer)
         else:
             result['BlueButton-Application'] = ""
             result['BlueButton-ApplicationId'] = ""
@@ -209,30 +216,16 @@ def request_call(request, call_url, crosswalk=None, timeout=None, get_parameters
     crosswalk = Crosswalk record. The crosswalk is keyed off Request.user
     timeout allows a timeout in seconds to be set.
 
-    FhirServer is joined to Crosswalk.
-    FhirServerAuth and FhirServerVerify receive crosswalk and lookup
-       values in the linked fhir_server model.
+    The call is sent over the pooled backend session in
+    apps.fhir.server.connection, which applies FhirServerAuth and
+    FhirServerVerify once per process.
 
     """
 
-    logger_perf = bb2logging.getLogger(bb2logging.PERFORMANCE_LOGGER, request)
-
-    # Updated to receive crosswalk (Crosswalk entry for user)
-    # call FhirServer_Auth(crosswalk) to get authentication
-    auth_state = FhirServerAuth(crosswalk)
+    # imported here, apps.fhir.server.connection depends on this module
+    from apps.fhir.server import connection as backend_connection
 
-    verify_state = FhirServerVerify(crosswalk)
-    if auth_state['client_auth']:
-        # cert puts cert and key file together
-        # (cert_file_path, key_file_path)
-        # Cert_file_path and key_file_ath are fully defined paths to
-        # files on the appserver.
-        logger.debug('Cert:%s , Key:%s' % (auth_state['cert_file'],
-                                           auth_state['key_file']))
-
-        cert = (auth_state['cert_file'], auth_state['key_file'])
-    else:
-        cert = ()
+    logger_perf = bb2logging.getLogger(bb2logging.PERFORMANCE_LOGGER, request)
 
     header_info = generate_info_headers(request)
 
@@ -246,19 +239,8 @@ def request_call(request, call_url, crosswalk=None, timeout=None, get_parameters
     logger_perf.info(header_detail)
 
     try:
-        if timeout:
-            r = requests.get(call_url,
-                             cert=cert,
-                             params=get_parameters,
-                             timeout=timeout,
-                             headers=header_info,
-                             verify=verify_state)
-        else:
-            r = requests.get(call_url,
-                             cert=cert,
-                             params=get_parameters,
-                             headers=header_info,
-                             verify=verify_state)
+        req = requests.Request('GET', call_url, params=get_parameters, headers=header_info)
+        r = backend_connection.send(backend_connection.prepare_request(req), timeout=timeout)
 
         logger.debug("Request.get:%s" % call_url)
         logger.debug("Status of Request:%s" % r.status_code)
@@ -441,6 +423,75 @@ def get_resourcerouter(crosswalk=None):
     return fhir_settings
 
 
+# Members of a resource or Bundle the object permission checks look at,
+# and its meta.lastUpdated for the Last-Modified header
+OWNERSHIP_KEYS = ('resourceType', 'id', 'reference', 'beneficiary', 'patient', 'entry', 'resource',
+                  'meta', 'lastUpdated')
+
+
+def parse_ownership(content, summary=None):
+    """
+    Parse a backend response body keeping only the members the object
+    permission checks need: resourceType, id and the beneficiary/patient
+    references, for the resource or each Bundle entry, and meta.lastUpdated.
+
+    Every other member is dropped as soon as its object is decoded so the
+    full resource tree is never held in memory. When summary is a dict, the
+    get_fhir_summary() of the whole top level object is added to it.
+    """
+    if summary is None:
+        return json.loads(content, object_pairs_hook=_ownership_pairs)
+
+    # The top level object is decoded last
+    last_pairs = []
+
+    def ownership_pairs(pairs):
+        last_pairs[:] = pairs
+        return _ownership_pairs(pairs)
+
+    data = json.loads(content, object_pairs_hook=ownership_pairs)
+    if isinstance(data, dict):
+        summary.update(get_fhir_summary(dict(last_pairs)))
+    return data
+
+
+def _ownership_pairs(pairs):
+    return {key: value for key, value in pairs if key in OWNERSHIP_KEYS}
+
+
+def get_fhir_summary(data):
+    """
+    The members of a FHIR resource or Bundle logged for a request by
+    hhs_oauth_server.request_logging.
+    """
+    return {
+        "fhir_bundle_type": data.get("type", None),
+        "fhir_resource_id": data.get("id", None),
+        "fhir_resource_type": data.get("resourceType", None),
+        "fhir_attribute_count": len(data),
+        "fhir_entry_count": len(data["entry"]) if data.get("entry", False) else None,
+        "fhir_total": data.get("total", None),
+    }
+
+
+def get_last_updated(data):
+    """
+    Return meta.lastUpdated of a resource or Bundle as a POSIX timestamp,
+    or None if it is missing or not a valid instant.
+    """
+    meta = data.get('meta') if isinstance(data, dict) else None
+    value = meta.get('lastUpdated') if isinstance(meta, dict) else None
+    if not isinstance(value, str):
+        return None
+    try:
+        last_updated = parse_datetime(value)
+    except ValueError:
+        return None
+    if last_updated is None or last_updated.tzinfo is None:
+        return None
+    return int(last_updated.timestamp())
+
+
 def handle_http_error(e):
     """ Handle http error from request_call
 
@@ -462,85 +513,19 @@ def build_fhir_response(request, call_url, crosswalk, r=None, e=None):
     :return:
     """
 
-    if r is None:
-        r_dir = []
-    else:
-        r_dir = dir(r)
-
-    if e is None:
-        e_dir = []
-    else:
-        e_dir = dir(e)
-
-    fhir_response = Fhir_Response(r)
-
-    fhir_response.call_url = call_url
-    fhir_response.crosswalk = crosswalk
-
-    if len(r_dir) > 0:
-        if 'status_code' in r_dir:
-            fhir_response._status_code = r.status_code
-        else:
-            fhir_response._status_code = '000'
-
-        if 'text' in r_dir:
-            fhir_response._text = r.text
-        else:
-            fhir_response._text = "No Text returned"
-
-        if 'json' in r_dir:
-            fhir_response._json = r.json
-        else:
-            fhir_response._json = {}
-
-        if 'user' in request:
-            fhir_response._owner = request.user + ":"
-        else:
-            fhir_response._owner = ":"
-
-        if 'resource_owner' in request:
-            fhir_response._owner = request.resource_owner
-        else:
-            fhir_response._owner += ""
+    fhir_response = Fhir_Response(r, call_url=call_url, crosswalk=crosswalk)
 
-    elif len(e_dir) > 0:
+    if r is None and e is not None:
         fhir_response.status_code = 504
-        fhir_response._status_code = fhir_response.status_code
         fhir_response._json = {"errors": ["The gateway has timed out",
                                           "Failed to reach FHIR Database."],
                                "code": fhir_response.status_code,
                                "status_code": fhir_response.status_code,
                                "text": "The gateway has timed out"}
-        fhir_response._text = fhir_response._json
-        fhir_response._content = fhir_response._json
-    else:
-        fhir_response.status_code = '000'
-        fhir_response._status_code = '000'
-        fhir_response._text = "No Text returned"
-        fhir_response._json = {}
-
-        if 'user' in request:
-            fhir_response._owner = request.user + ":"
-        else:
-            fhir_response._owner = ":"
-        if 'resource_owner' in request:
-            fhir_response._owner += request.resource_owner
-        else:
-            fhir_response._owner += ""
+        fhir_response.content = json.dumps(fhir_response._json).encode('utf-8')
 
     if e:
-        logger.debug("\ne_response:START\n")
-        e_dir = dir(e)
-        for k in e_dir:
-            if k == "characters_written":
-                pass
-            elif k == 'arg':
-                for i in e.arg:
-                    logger.debug("arg:%s" % i)
-            else:
-                logger.debug("%s:%s" % (k, e.__getattribute__(k)))
-
-        logger.debug("\ne_response:END\n")
+        logger.debug("Backend call to %s failed: %r" % (call_url, e))
 
     return fhir_response
 
@@ -549,41 +534,15 @@ def get_response_text(fhir_response=None):
     """
     fhir_response: Fhir_Response class returned from request call
     Receive the fhir_response and get the text element
-    text is in response.text or response._text
 
     :param fhir_response:
     :return:
     """
 
-    text_in = ""
-
     if not fhir_response:
         return ""
 
-    try:
-        text_in = fhir_response.text
-        if len(text_in) > 0:
-            return text_in
-    except Exception:
-        pass
-
-    try:
-        text_in = fhir_response._response.text
-        if len(text_in) > 0:
-            return text_in
-    except Exception:
-        pass
-
-    try:
-        text_in = fhir_response._text
-        if len(text_in) > 0:
-            return text_in
-
-    except Exception:
-        logger.debug("Nothing in ._text")
-        logger.debug("giving up...")
-        text_in = ""
-        return text_in
+    return fhir_response.text
 
 
 def build_oauth_resource(request, v2=False, format_type="json"):
@@ -669,15 +628,15 @@ def get_patient_by_id(id, request):
     a helper adapted to just get patient given an id out of band of auth flow
     or noraml data flow, use by tools such as BB2-Tools admin viewers
     '''
-    auth_settings = FhirServerAuth(None)
-    certs = (auth_settings['cert_file'], auth_settings['key_file'])
+    # imported here, apps.fhir.server.connection depends on this module
+    from apps.fhir.server import connection as backend_connection
+
     headers = generate_info_headers(request)
     headers['BlueButton-Application'] = "BB2-Tools"
     headers['includeIdentifiers'] = "true"
     url = "{}Patient/{}?_format={}".format(get_resourcerouter().fhir_url, id, settings.FHIR_PARAM_FORMAT)
-    s = requests.Session()
     req = requests.Request('GET', url, headers=headers)
-    prepped = req.prepare()
-    response = s.send(prepped, cert=certs, verify=False)
+    prepped = backend_connection.prepare_request(req)
+    response = backend_connection.send(prepped)
     response.raise_for_status()
     return response.json()
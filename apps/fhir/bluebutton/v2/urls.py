@@ -1,12 +1,32 @@
 from django.conf.urls import url
 from django.contrib import admin
 
+from apps.fhir.bluebutton.views.batch import BatchView
+from apps.fhir.bluebutton.views.export import ExportFileView, ExportStatusView, ExportView
 from apps.fhir.bluebutton.views.read import ReadViewCoverage, ReadViewExplanationOfBenefit, ReadViewPatient
 from apps.fhir.bluebutton.views.search import SearchViewCoverage, SearchViewExplanationOfBenefit, SearchViewPatient
 
 admin.autodiscover()
 
 urlpatterns = [
+    # Batch Bundle, POST to the FHIR base URL
+    url(r'^$',
+        BatchView.as_view(version=2),
+        name='bb_oauth_fhir_batch_v2'),
+
+    # EOB $export, before the EOB ReadView which would match it
+    url(r'^ExplanationOfBenefit/\$export/(?P<job_id>[0-9a-f-]+)/(?P<resource_type>[A-Za-z]+)\.ndjson$',
+        ExportFileView.as_view(version=2),
+        name='bb_oauth_fhir_eob_export_file_v2'),
+
+    url(r'^ExplanationOfBenefit/\$export/(?P<job_id>[0-9a-f-]+)$',
+        ExportStatusView.as_view(version=2),
+        name='bb_oauth_fhir_eob_export_status_v2'),
+
+    url(r'^ExplanationOfBenefit/\$export$',
+        ExportView.as_view(version=2),
+        name='bb_oauth_fhir_eob_export_v2'),
+
     # Patient ReadView
     url(r'Patient/(?P<resource_id>[^/]+)',
         ReadViewPatient.as_view(version=2),
@@ -0,0 +1,241 @@
+import copy
+import http
+import logging
+import threading
+import voluptuous
+import waffle
+
+import apps.logging.request_logger as bb2logging
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.http import QueryDict
+from django.urls import Resolver404, resolve, reverse
+from rest_framework import (exceptions, permissions)
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from voluptuous import All, Length, Required
+
+from apps.authorization.permissions import DataAccessGrantPermission
+from apps.dot_ext.throttling import HEADERS as THROTTLE_HEADERS
+from apps.fhir.parsers import FHIRParser, JSONParser
+from apps.fhir.renderers import FHIRRenderer, JSONRenderer
+from hhs_oauth_server import json_codec
+
+from .. import cache as response_cache, projection
+from ..authentication import OAuth2ResourceOwner
+from ..permissions import (HasCrosswalk, ApplicationActivePermission)
+from ..utils import get_resourcerouter
+from .read import ReadView
+from .search import SearchView
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=get_resourcerouter().batch_workers,
+                                               thread_name_prefix='bfd-batch')
+    return _executor
+
+
+class BatchEntry(object):
+    """
+    One read or search entry of a batch Bundle, and its sub-request.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.view = None
+        self.request = None
+        self.args = ()
+        self.kwargs = {}
+        self.target_url = None
+        self.get_parameters = None
+        self.cache_key = None
+        self.content = None
+        self.req = None
+        self.prepped = None
+        self.future = None
+        self.result = None
+
+
+class BatchView(APIView):
+    """
+    FHIR batch interaction: a Bundle of read and search entries, answered
+    with a batch-response Bundle.
+
+    Each entry goes through the authentication, permissions and throttle of
+    its ReadView or SearchView in the request thread, then the backend calls
+    of all the entries are sent in parallel on a bounded thread pool.
+    """
+    version = None
+    parser_classes = [JSONParser, FHIRParser]
+    renderer_classes = [JSONRenderer, FHIRRenderer]
+    # Each entry counts against the token rate limit instead
+    throttle_classes = []
+    authentication_classes = [OAuth2ResourceOwner]
+    permission_classes = [
+        permissions.IsAuthenticated,
+        ApplicationActivePermission,
+        HasCrosswalk,
+        DataAccessGrantPermission,
+    ]
+
+    def __init__(self, version=1):
+        self.version = version
+        super().__init__()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # TODO: waffle flag enforced, to be removed after v2 GA
+        if self.version == 2 and (not waffle.flag_is_active(request, 'bfd_v2_flag')):
+            raise exceptions.NotFound("bfd_v2_flag not active.")
+
+    def get_urls(self, data):
+        schema = voluptuous.Schema({
+            Required('resourceType'): 'Bundle',
+            Required('type'): 'batch',
+            Required('entry'): All([{
+                Required('request'): {
+                    Required('method'): 'GET',
+                    Required('url'): str,
+                },
+            }], Length(max=get_resourcerouter().batch_max_entries)),
+        }, extra=voluptuous.ALLOW_EXTRA)
+        try:
+            bundle = schema(data)
+        except voluptuous.error.Invalid as e:
+            raise exceptions.ParseError(detail="The batch Bundle is not valid: %s" % e)
+        return [entry['request']['url'] for entry in bundle['entry']]
+
+    def post(self, request, *args, **kwargs):
+        entries = [BatchEntry(url) for url in self.get_urls(request.data)]
+
+        # Loaded here, the audit loggers of the backend calls read it
+        request.session.keys()
+
+        # Everything touching the database runs in this thread
+        for entry in entries:
+            try:
+                self.prepare_entry(request, entry)
+            except Exception as e:
+                entry.result = self.error_entry(entry.view or self, e)
+            if entry.request is not None:
+                # For the rate limit headers of ThrottleMiddleware
+                request.META.update({key: value for key, value in entry.request.META.items()
+                                     if key in THROTTLE_HEADERS.values()})
+
+        executor = get_executor()
+        for entry in entries:
+            if entry.prepped is not None:
+                entry.future = executor.submit(entry.view.send_backend_call, entry.request, entry.req, entry.prepped)
+
+        for entry in entries:
+            if entry.result is None:
+                try:
+                    entry.result = self.complete_entry(entry)
+                except Exception as e:
+                    entry.result = self.error_entry(entry.view, e)
+
+        return Response({
+            "resourceType": "Bundle",
+            "type": "batch-response",
+            "entry": [entry.result for entry in entries],
+        })
+
+    def prepare_entry(self, request, entry):
+        base_path = reverse('bb_oauth_fhir_batch_v2' if self.version == 2 else 'bb_oauth_fhir_batch')
+        url = urlsplit(entry.url)
+        path = url.path if url.path.startswith('/') else base_path + url.path
+
+        try:
+            match = resolve(path)
+        except Resolver404:
+            match = None
+        view_class = getattr(match.func, 'view_class', None) if match else None
+        if (not path.startswith(base_path) or view_class is None
+                or not issubclass(view_class, (ReadView, SearchView))):
+            raise exceptions.NotFound('Only reads and searches of %s are supported in a batch' % base_path)
+
+        entry.view = view_class(**match.func.view_initkwargs)
+        entry.args, entry.kwargs = match.args, match.kwargs
+        entry.request = self.build_entry_request(request, entry.view, path, url.query, entry.args, entry.kwargs)
+
+        # The view pipeline: authentication, permissions and throttle
+        entry.view.initial(entry.request, *entry.args, **entry.kwargs)
+
+        entry.target_url, entry.get_parameters, entry.cache_key, entry.content = entry.view.prepare_fetch(
+            entry.request, entry.view.resource_type, *entry.args, **entry.kwargs)
+        if entry.content is None:
+            entry.req, entry.prepped = entry.view.prepare_backend_call(entry.request, entry.target_url,
+                                                                       entry.get_parameters)
+
+    def build_entry_request(self, request, view, path, query, args, kwargs):
+        """
+        Build the request of an entry from this one, as a GET of path with
+        the query string query, and set it up on view as dispatch() does.
+        """
+        entry_request = copy.copy(request._request)
+        entry_request.method = 'GET'
+        entry_request.path = entry_request.path_info = path
+        entry_request.META = {**request._request.META,
+                              'REQUEST_METHOD': 'GET',
+                              'PATH_INFO': path,
+                              'QUERY_STRING': query}
+        entry_request.GET = QueryDict(query)
+        entry_request.POST = QueryDict()
+
+        view.args = args
+        view.kwargs = kwargs
+        view.request = view.initialize_request(entry_request, *args, **kwargs)
+        view.headers = view.default_response_headers
+        return view.request
+
+    def complete_entry(self, entry):
+        view, request = entry.view, entry.request
+
+        content = entry.content
+        if content is None:
+            content = view.read_backend_response(request, entry.target_url, entry.future.result())
+            response_cache.set_content(entry.cache_key, content)
+
+        view.after_fetch(request, view.resource_type, entry.target_url, entry.get_parameters, content)
+
+        data = json_codec.loads(content)
+        view.check_object_permissions(request, data)
+
+        return {
+            "resource": projection.project(data, request.projection, view.version),
+            "response": {
+                "status": "200 OK",
+                "etag": view.get_etag(request, content),
+            },
+        }
+
+    def error_entry(self, view, exc):
+        try:
+            response = view.handle_exception(exc)
+            status_code = response.status_code
+            detail = response.data.get('detail', str(exc)) if isinstance(response.data, dict) else str(exc)
+        except Exception:
+            logger.exception("Batch entry failed")
+            status_code, detail = 500, 'A server error occurred'
+
+        return {
+            "response": {
+                "status": "%s %s" % (status_code, http.HTTPStatus(status_code).phrase),
+                "outcome": {
+                    "resourceType": "OperationOutcome",
+                    "issue": [{"severity": "error", "code": "processing", "diagnostics": str(detail)}],
+                },
+            },
+        }
@@ -0,0 +1,197 @@
+import json
+import logging
+import voluptuous
+import waffle
+
+import apps.logging.request_logger as bb2logging
+
+from django.db import transaction
+from django.http import FileResponse
+from django.urls import reverse
+from rest_framework import (exceptions, permissions, status)
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from voluptuous import Match
+
+from apps.authorization.permissions import DataAccessGrantPermission
+from apps.capabilities.permissions import TokenHasProtectedCapability
+from apps.dot_ext.throttling import TokenRateThrottle
+from apps.fhir.parsers import FHIRParser, JSONParser
+from apps.fhir.renderers import FHIRRenderer, JSONRenderer
+from apps.fhir.server import connection as backend_connection
+
+from ..authentication import OAuth2ResourceOwner
+from ..export import (EXPORT_RESOURCE_TYPE, delete_expired_jobs, delete_job, fail_stale_jobs,
+                      get_active_job, get_storage, live_jobs, start_job)
+from ..models import ExportJob
+from ..permissions import (HasCrosswalk, ApplicationActivePermission)
+from .search import SearchViewExplanationOfBenefit
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
+
+
+class ExportJobCapability(TokenHasProtectedCapability):
+    """
+    Deleting a job needs the capability to read it.
+    """
+
+    def get_method(self, request):
+        return 'GET' if request.method == 'DELETE' else request.method
+
+
+class ExportBaseView(APIView):
+    version = None
+    parser_classes = [JSONParser, FHIRParser]
+    renderer_classes = [JSONRenderer, FHIRRenderer]
+    throttle_classes = [TokenRateThrottle]
+    authentication_classes = [OAuth2ResourceOwner]
+    # The $export paths are under ExplanationOfBenefit/ so the EOB scope covers them
+    permission_classes = [
+        permissions.IsAuthenticated,
+        ApplicationActivePermission,
+        HasCrosswalk,
+        DataAccessGrantPermission,
+        ExportJobCapability,
+    ]
+
+    def __init__(self, version=1):
+        self.version = version
+        super().__init__()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # TODO: waffle flag enforced, to be removed after v2 GA
+        if self.version == 2 and (not waffle.flag_is_active(request, 'bfd_v2_flag')):
+            raise exceptions.NotFound("bfd_v2_flag not active.")
+
+    def url_name(self, name):
+        return name + '_v2' if self.version == 2 else name
+
+    def get_job(self, request, job_id):
+        # Only the application and beneficiary that started a job can see it
+        try:
+            job = live_jobs().get(job_id=job_id,
+                                  beneficiary=request.user,
+                                  application=request.auth.application)
+        except (ExportJob.DoesNotExist, ValueError):
+            raise exceptions.NotFound('The requested export job does not exist')
+
+        if job.status in ExportJob.ACTIVE_STATUSES and fail_stale_jobs(ExportJob.objects.filter(pk=job.pk)):
+            job.refresh_from_db()
+        return job
+
+
+class ExportView(ExportBaseView):
+    """
+    Kick-off of an asynchronous export of the beneficiary's ExplanationOfBenefit history.
+
+    Responds 202 with the job status URL in Content-Location, the URL of the
+    active job of the beneficiary and application when there is one.
+    """
+
+    # Regex to match a FHIR instant, or a date
+    REGEX_SINCE_VALUE = r'^\d{4}-\d{2}-\d{2}(T\d{2}:\d{2}:\d{2}(\.\d+)?(Z|[+-]\d{2}:\d{2}))?$'
+
+    QUERY_SCHEMA = {
+        '_type': Match(r'^{}$'.format(EXPORT_RESOURCE_TYPE), msg="only ExplanationOfBenefit can be exported"),
+        '_since': Match(REGEX_SINCE_VALUE, msg="the _since value is not valid"),
+        'type': SearchViewExplanationOfBenefit.QUERY_SCHEMA['type'],
+    }
+
+    def build_parameters(self, request):
+        schema = voluptuous.Schema(self.QUERY_SCHEMA, extra=voluptuous.REMOVE_EXTRA)
+        try:
+            params = schema(request.query_params.dict())
+        except voluptuous.error.Invalid as e:
+            raise exceptions.ParseError(detail=e.msg)
+
+        # Translated to the backend search parameters
+        parameters = {}
+        if '_since' in params:
+            parameters['_lastUpdated'] = ['ge' + params['_since']]
+        if 'type' in params:
+            parameters['type'] = params['type']
+        return parameters
+
+    def get(self, request, *args, **kwargs):
+        parameters = self.build_parameters(request)
+
+        delete_expired_jobs()
+        fail_stale_jobs()
+
+        with transaction.atomic():
+            # One active job per beneficiary and application, kick-offs
+            # wait on the beneficiary row
+            type(request.user).objects.select_for_update().get(pk=request.user.pk)
+            job = get_active_job(request.user, request.auth.application)
+            created = job is None
+            if created:
+                # The BFD logging headers are built from this request, the job runs without it
+                job = ExportJob.objects.create(beneficiary=request.user,
+                                               application=request.auth.application,
+                                               version=self.version,
+                                               request_url=request.build_absolute_uri(),
+                                               parameters=json.dumps(parameters),
+                                               headers=json.dumps(backend_connection.headers(request)))
+        if created:
+            start_job(job)
+            logger.debug("Export job %s queued" % job.job_id)
+
+        status_url = request.build_absolute_uri(
+            reverse(self.url_name('bb_oauth_fhir_eob_export_status'), kwargs={'job_id': job.job_id}))
+        return Response(status=status.HTTP_202_ACCEPTED, headers={'Content-Location': status_url})
+
+
+class ExportStatusView(ExportBaseView):
+    """
+    Status of an export job: 202 while it runs, then the manifest of its output files.
+
+    DELETE deletes the job and its files.
+    """
+
+    def delete(self, request, job_id, *args, **kwargs):
+        delete_job(self.get_job(request, job_id))
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = self.get_job(request, job_id)
+
+        if job.status in (ExportJob.QUEUED, ExportJob.RUNNING):
+            return Response(status=status.HTTP_202_ACCEPTED,
+                            headers={'X-Progress': job.status, 'Retry-After': '10'})
+
+        if job.status == ExportJob.FAILED:
+            return Response({
+                "resourceType": "OperationOutcome",
+                "issue": [{"severity": "error", "code": "exception", "diagnostics": job.error}],
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        output = []
+        for item in job.get_output():
+            url = reverse(self.url_name('bb_oauth_fhir_eob_export_file'),
+                          kwargs={'job_id': job.job_id, 'resource_type': item['type']})
+            output.append({"type": item['type'], "url": request.build_absolute_uri(url), "count": item['count']})
+
+        return Response({
+            "transactionTime": job.created_at.isoformat(),
+            "request": job.request_url,
+            "requiresAccessToken": True,
+            "output": output,
+            "error": [],
+        })
+
+
+class ExportFileView(ExportBaseView):
+    """
+    Download of an NDJSON output file of a completed export job.
+    """
+
+    def get(self, request, job_id, resource_type, *args, **kwargs):
+        job = self.get_job(request, job_id)
+
+        for item in job.get_output() if job.status == ExportJob.COMPLETED else []:
+            if item['type'] == resource_type:
+                return FileResponse(get_storage().open(item['name'], 'rb'),
+                                    content_type='application/fhir+ndjson')
+
+        raise exceptions.NotFound('The requested export file does not exist')
@@ -1,22 +1,26 @@
+import hashlib
 import voluptuous
 import waffle
 import logging
 
 import apps.logging.request_logger as bb2logging
 
-from requests import Session, Request
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from requests import Request
 from rest_framework import (exceptions, permissions)
-from rest_framework.parsers import JSONParser
-from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from apps.authorization.permissions import DataAccessGrantPermission
 from apps.dot_ext.throttling import TokenRateThrottle
-from apps.fhir.parsers import FHIRParser
-from apps.fhir.renderers import FHIRRenderer
+from apps.fhir.parsers import FHIRParser, JSONParser
+from apps.fhir.renderers import FHIRRenderer, JSONRenderer
 from apps.fhir.server import connection as backend_connection
+from hhs_oauth_server import json_codec
 
+from .. import cache as response_cache, prefetch, projection
 from ..authentication import OAuth2ResourceOwner
 from ..exceptions import process_error_response
 from ..permissions import (HasCrosswalk, ResourcePermission, ApplicationActivePermission)
@@ -25,8 +29,10 @@ from ..signals import (
     post_fetch
 )
 from ..utils import (build_fhir_response,
-                     FhirServerVerify,
-                     get_resourcerouter)
+                     get_fhir_summary,
+                     get_last_updated,
+                     get_resourcerouter,
+                     parse_ownership)
 
 logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
 
@@ -45,6 +51,12 @@ class FhirDataView(APIView):
         ResourcePermission,
         DataAccessGrantPermission]
 
+    # Fetch the next page of a search in the background when PREFETCH is on
+    prefetch_next_page = False
+
+    # Responds with a Bundle of resources, not a single resource
+    search = False
+
     def __init__(self, version=1):
         self.version = version
         super().__init__()
@@ -93,12 +105,69 @@ class FhirDataView(APIView):
         super(FhirDataView, self).initial(request, *args, **kwargs)
 
     def get(self, request, resource_type, *args, **kwargs):
+        content = self.fetch_content(request, resource_type, *args, **kwargs)
+
+        # With STREAM_RESPONSES the backend body is forwarded as is, without
+        # decoding it into Python objects and rendering it again. Ownership is
+        # still checked, on the reduced tree from parse_ownership.
+        # A projection (_elements, _summary) needs the whole tree.
+        stream = get_resourcerouter(request.crosswalk).stream_responses and not request.projection
+        summary = {}
+        out_data = parse_ownership(content, summary) if stream else json_codec.loads(content)
+
+        # Before any validator is sent, so a 304 can't reveal someone else's data
+        self.check_object_permissions(request, out_data)
 
-        out_data = self.fetch_data(request, resource_type, *args, **kwargs)
+        # Read by hhs_oauth_server.request_logging from the HttpRequest, for
+        # the streamed and 304 responses which are not a DRF Response
+        if not stream and isinstance(out_data, dict):
+            summary = get_fhir_summary(out_data)
+        request._request.fhir_summary = summary
 
-        return Response(out_data)
+        etag = self.get_etag(request, content)
+        last_modified = get_last_updated(out_data)
 
-    def fetch_data(self, request, resource_type, *args, **kwargs):
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            if stream:
+                response = HttpResponse(content, content_type=request.accepted_renderer.media_type)
+            else:
+                response = Response(projection.project(out_data, request.projection, self.version))
+
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_etag(self, request, content):
+        """
+        Strong ETag of the response: the same backend body is always rendered
+        to the same bytes for a media type and projection.
+        """
+        digest = hashlib.sha256(content)
+        digest.update(request.accepted_renderer.media_type.encode())
+        digest.update(repr(sorted(request.projection.items())).encode())
+        return quote_etag(digest.hexdigest())
+
+    def fetch_content(self, request, resource_type, *args, **kwargs):
+        """
+        Return the body of the backend response as bytes.
+        """
+        target_url, get_parameters, cache_key, content = self.prepare_fetch(request, resource_type,
+                                                                            *args, **kwargs)
+        if content is None:
+            content = self.call_backend(request, target_url, get_parameters)
+            response_cache.set_content(cache_key, content)
+
+        self.after_fetch(request, resource_type, target_url, get_parameters, content)
+
+        return content
+
+    def prepare_fetch(self, request, resource_type, *args, **kwargs):
+        """
+        Return the backend URL, query parameters and response cache key of
+        the request, and the cached or prefetched response body, if any.
+        """
         resource_router = get_resourcerouter(request.crosswalk)
         # BB2-291 v2 switch enforced here, entry of all fhir resources queries
         # TODO: waffle flag enforced, to be removed after v2 GA
@@ -129,27 +198,73 @@ class FhirDataView(APIView):
         except voluptuous.error.Invalid as e:
             raise exceptions.ParseError(detail=e.msg)
 
+        # Applied to the response in get(), BFD always returns whole resources
+        request.projection = projection.get_projection(get_parameters)
+
         logger.debug('Here is the URL to send, %s now add '
                      'GET parameters %s' % (target_url, get_parameters))
 
+        # The permission classes have already run, a cached response still
+        # goes through the object permission check of the caller.
+        cache_key = response_cache.cache_key(request, resource_type, self.version,
+                                             get_parameters, kwargs.get('resource_id'))
+        content = response_cache.get_content(cache_key)
+        if content is None:
+            content = prefetch.get_content(request, cache_key)
+
+        return target_url, get_parameters, cache_key, content
+
+    def after_fetch(self, request, resource_type, target_url, get_parameters, content):
+        if self.prefetch_next_page and prefetch.is_enabled() and prefetch.has_next_page(content):
+            self.prefetch_next(request, resource_type, target_url, get_parameters)
+
+    def build_request(self, request, target_url, get_parameters):
+        return Request('GET',
+                       target_url,
+                       data=get_parameters,
+                       params=get_parameters,
+                       headers=backend_connection.headers(request, url=target_url))
+
+    def prefetch_next(self, request, resource_type, target_url, get_parameters):
+        """
+        Fetch the page after this one in the background, for the token's next call.
+        """
+        page_size = get_parameters.get('_count')
+        if not page_size:
+            return
+
+        next_parameters = {**get_parameters, 'startIndex': get_parameters.get('startIndex', 0) + page_size}
+        cache_key = response_cache.cache_key(request, resource_type, self.version, next_parameters)
+        prefetch.schedule(request, cache_key,
+                          self.build_request(request, target_url, next_parameters),
+                          'v2' if self.version == 2 else 'v1')
+
+    def call_backend(self, request, target_url, get_parameters):
+        req, prepped = self.prepare_backend_call(request, target_url, get_parameters)
+        r = self.send_backend_call(request, req, prepped)
+        return self.read_backend_response(request, target_url, r)
+
+    def prepare_backend_call(self, request, target_url, get_parameters):
         # Now make the call to the backend API
-        req = Request('GET',
-                      target_url,
-                      data=get_parameters,
-                      params=get_parameters,
-                      headers=backend_connection.headers(request, url=target_url))
-        s = Session()
-        prepped = s.prepare_request(req)
+        req = self.build_request(request, target_url, get_parameters)
+        return req, backend_connection.prepare_request(req)
+
+    def send_backend_call(self, request, req, prepped):
+        """
+        Send the prepared backend request. Makes no database queries, so it
+        can run outside of the request thread (see views.batch).
+        """
+        resource_router = get_resourcerouter(request.crosswalk)
+
         # Send signal
         pre_fetch.send_robust(FhirDataView, request=req, auth_request=request, api_ver='v2' if self.version == 2 else 'v1')
-        r = s.send(
-            prepped,
-            cert=backend_connection.certs(crosswalk=request.crosswalk),
-            timeout=resource_router.wait_time,
-            verify=FhirServerVerify(crosswalk=request.crosswalk))
+        r = backend_connection.send(prepped, timeout=resource_router.wait_time)
         # Send signal
         post_fetch.send_robust(FhirDataView, request=prepped, auth_request=request,
                                response=r, api_ver='v2' if self.version == 2 else 'v1')
+        return r
+
+    def read_backend_response(self, request, target_url, r):
         response = build_fhir_response(request._request, target_url, request.crosswalk, r=r, e=None)
 
         # BB2-128
@@ -160,8 +275,4 @@ class FhirDataView(APIView):
 
         self.validate_response(response)
 
-        out_data = r.json()
-
-        self.check_object_permissions(request, out_data)
-
-        return out_data
+        return r.content
@@ -1,17 +1,15 @@
-import json
 import logging
 
-from collections import OrderedDict
 from urllib.parse import urlencode
-from django.http import JsonResponse
 from django.shortcuts import HttpResponse
-from oauth2_provider.compat import urlparse
-from apps.fhir.bluebutton import constants
+from django.utils.cache import get_conditional_response
+from apps.fhir.bluebutton import capability
+from apps.fhir.bluebutton.capability import (conformance_filter,  # NOQA
+                                             get_supported_resources)
 from apps.fhir.bluebutton.utils import (request_call,
                                         prepend_q,
-                                        get_resourcerouter,
-                                        get_response_text,
                                         build_oauth_resource)
+from apps.wellknown.views import base_issuer
 
 import apps.logging.request_logger as bb2logging
 
@@ -27,86 +25,40 @@ def fhir_conformance(request, via_oauth=False, v2=False, *args):
 
     BaseStu3 = "CapabilityStatement"
 
+    The finished statement is kept per process and refreshed in the
+    background, see apps.fhir.bluebutton.capability.
+
     :param request:
     :param via_oauth:
     :param args:
     :param kwargs:
     :return:
     """
-    crosswalk = None
-    resource_router = get_resourcerouter()
-    parsed_url = urlparse(resource_router.fhir_url)
-    call_to = None
-    if parsed_url.path is not None:
-        call_to = '{}://{}/{}/fhir/metadata'.format(parsed_url.scheme, parsed_url.netloc, 'v2' if v2 else 'v1')
-    else:
-        # url with no path
-        call_to = '{}/{}/fhir/metadata'.format(resource_router.fhir_url, 'v2' if v2 else 'v1')
-
-    pass_params = {'_format': 'json'}
-
-    encoded_params = urlencode(pass_params)
-    pass_params = prepend_q(encoded_params)
-
-    r = request_call(request, call_to + pass_params, crosswalk)
+    key = (v2, base_issuer(request))
+    statement = capability.get_statement(key)
 
-    text_out = ''
+    if statement is None:
+        crosswalk = None
+        call_to = capability.metadata_url(v2)
 
-    if r.status_code >= 300:
-        logger.debug("We have an error code to deal with: %s" % r.status_code)
-        return HttpResponse(json.dumps(r._content),
-                            status=r.status_code,
-                            content_type='application/json')
+        pass_params = {'_format': 'json'}
 
-    text_in = get_response_text(fhir_response=r)
+        encoded_params = urlencode(pass_params)
+        pass_params = prepend_q(encoded_params)
 
-    text_out = json.loads(text_in, object_pairs_hook=OrderedDict)
+        r = request_call(request, call_to + pass_params, crosswalk)
 
-    od = conformance_filter(text_out)
+        if r.status_code >= 300:
+            logger.debug("We have an error code to deal with: %s" % r.status_code)
+            return HttpResponse(r.content,
+                                status=r.status_code,
+                                content_type='application/json')
 
-    # Append Security to ConformanceStatement
-    security_endpoint = build_oauth_resource(request, v2, format_type="json")
-    od['rest'][0]['security'] = security_endpoint
-    # Fix format values
-    od['format'] = ['application/json', 'application/fhir+json']
-
-    return JsonResponse(od)
-
-
-def conformance_filter(text_block):
-    """ Filter FHIR Conformance Statement based on
-        supported ResourceTypes
-    """
+        statement = capability.set_statement(key, r.content,
+                                             build_oauth_resource(request, v2, format_type="json"))
 
-    resource_names = constants.ALLOWED_RESOURCE_TYPES
-    ct = 0
-    if text_block:
-        if 'rest' in text_block:
-            for k in text_block['rest']:
-                for i, v in k.items():
-                    if i == 'resource':
-                        supp_resources = get_supported_resources(v, resource_names)
-                        text_block['rest'][ct]['resource'] = supp_resources
-                ct += 1
-        else:
-            text_block = ""
-    else:
-        text_block = ""
-
-    return text_block
-
-
-def get_supported_resources(resources, resource_names):
-    """ Filter resources for resource type matches """
-
-    resource_list = []
-
-    # if resource 'type in resource_names add resource to resource_list
-    for item in resources:
-        for k, v in item.items():
-            if k == 'type':
-                if v in resource_names:
-                    item['interaction'] = [{"code": "read"}, {"code": "search-type"}]
-                    resource_list.append(item)
-
-    return resource_list
+    response = get_conditional_response(request, etag=statement.etag)
+    if response is None:
+        response = HttpResponse(statement.content, content_type='application/json')
+    response['ETag'] = statement.etag
+    return response
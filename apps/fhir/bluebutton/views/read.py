@@ -3,6 +3,7 @@ from rest_framework import permissions
 from apps.authorization.permissions import DataAccessGrantPermission
 from apps.capabilities.permissions import TokenHasProtectedCapability
 from ..permissions import (ReadCrosswalkPermission, ResourcePermission, ApplicationActivePermission)
+from ..projection import READ_SCHEMA as PROJECTION_SCHEMA
 from apps.fhir.bluebutton.views.generic import FhirDataView
 
 
@@ -23,6 +24,8 @@ class ReadView(FhirDataView):
         TokenHasProtectedCapability,
     ]
 
+    QUERY_SCHEMA = PROJECTION_SCHEMA
+
     def __init__(self, version=1):
         self.resource_type = None
         super().__init__(version)
@@ -12,6 +12,7 @@ from apps.fhir.bluebutton.views.generic import FhirDataView
 from apps.authorization.permissions import DataAccessGrantPermission
 from apps.capabilities.permissions import TokenHasProtectedCapability
 from ..permissions import (SearchCrosswalkPermission, ResourcePermission, ApplicationActivePermission)
+from ..projection import SEARCH_SCHEMA as PROJECTION_SCHEMA
 
 
 class SearchView(FhirDataView):
@@ -27,6 +28,8 @@ class SearchView(FhirDataView):
         TokenHasProtectedCapability,
     ]
 
+    search = True
+
     # Regex to match a valid _lastUpdated value that can begin with lt, le, gt and ge operators
     REGEX_LASTUPDATED_VALUE = r'^((lt)|(le)|(gt)|(ge)).+'
 
@@ -37,7 +40,8 @@ class SearchView(FhirDataView):
     QUERY_SCHEMA = {
         Required('startIndex', default=0): Coerce(int),
         Required('_count', default=DEFAULT_PAGE_SIZE): All(Coerce(int), Range(min=0, max=MAX_PAGE_SIZE)),
-        '_lastUpdated': [Match(REGEX_LASTUPDATED_VALUE, msg="the _lastUpdated operator is not valid")]
+        '_lastUpdated': [Match(REGEX_LASTUPDATED_VALUE, msg="the _lastUpdated operator is not valid")],
+        **PROJECTION_SCHEMA,
     }
 
     def __init__(self, version=1):
@@ -112,6 +116,9 @@ class SearchViewExplanationOfBenefit(SearchView):
     # Regex to match a list of comma separated type values with IGNORECASE
     REGEX_TYPE_VALUES_LIST = r'(?i)^((' + REGEX_TYPE_VALUE + r')\s*,*\s*)+$'
 
+    # Apps walk the EOB history page by page
+    prefetch_next_page = True
+
     # Add type parameter to schema only for EOB
     QUERY_SCHEMA = {**SearchView.QUERY_SCHEMA,
                     'type': Match(REGEX_TYPE_VALUES_LIST, msg="the type parameter value is not valid")}
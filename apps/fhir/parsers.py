@@ -1,4 +1,29 @@
-from rest_framework.parsers import JSONParser
+import codecs
+
+from django.conf import settings
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils.json import strict_constant
+
+from hhs_oauth_server import json_codec
+
+
+class JSONParser(parsers.JSONParser):
+    """
+    DRF's JSONParser, decoding with the JSON_CODEC of hhs_oauth_server.json_codec.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        if not json_codec.is_fast() or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return json_codec.loads(stream.read(), parse_constant=strict_constant if self.strict else None)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
 
 
 class FHIRParser(JSONParser):
@@ -14,6 +14,7 @@ from apps.fhir.bluebutton.signals import (
 from ..bluebutton.exceptions import UpstreamServerException
 from ..bluebutton.utils import (FhirServerAuth,
                                 get_resourcerouter)
+from . import connection as backend_connection
 from .loggers import log_match_fhir_id
 
 
@@ -49,10 +50,6 @@ def search_fhir_id_by_identifier(search_identifier, request=None):
         Raises exception:
             UpstreamServerException: For backend response issues.
     """
-    # Get certs from FHIR server settings
-    auth_settings = FhirServerAuth(None)
-    certs = (auth_settings['cert_file'], auth_settings['key_file'])
-
     # Add headers for FHIR backend logging, including auth_flow_dict
     if request:
         # Get auth flow session values.
@@ -73,12 +70,10 @@ def search_fhir_id_by_identifier(search_identifier, request=None):
         + "/{}/fhir/Patient/?identifier=".format(ver) + search_identifier \
         + "&_format=" + settings.FHIR_PARAM_FORMAT
 
-    s = requests.Session()
-
     req = requests.Request('GET', url, headers=headers)
-    prepped = req.prepare()
+    prepped = backend_connection.prepare_request(req)
     pre_fetch.send_robust(FhirServerAuth, request=req, auth_request=request, api_ver=ver)
-    response = s.send(prepped, cert=certs, verify=False)
+    response = backend_connection.send(prepped)
     post_fetch.send_robust(FhirServerAuth, request=req, auth_request=request, response=response, api_ver=ver)
     response.raise_for_status()
     backend_data = response.json()
@@ -0,0 +1,134 @@
+import logging
+import re
+import threading
+import time
+
+from collections import deque
+
+import apps.logging.request_logger as bb2logging
+
+from apps.fhir.bluebutton.exceptions import UpstreamServerException
+from apps.fhir.bluebutton.utils import get_resourcerouter
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
+
+# /v1/fhir/ExplanationOfBenefit/..., /v2/fhir/metadata
+BACKEND_PATH = re.compile(r'/(v\d)/fhir/(\w+)')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker for one resource type and API version of the backend.
+
+    Outcomes of the calls in the last window seconds are kept. Once there
+    are at least min_calls of them and either the share of errors or the
+    share of calls slower than slow_call_time reaches its rate, the circuit
+    opens and calls fail fast for open_time seconds. After that a single
+    probe call is let through (half-open), it closes the circuit again on
+    success or reopens it.
+    """
+
+    def __init__(self, name, window=60, min_calls=20, error_rate=0.5,
+                 slow_call_time=10, slow_call_rate=0.5, open_time=30):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_time = slow_call_time
+        self.slow_call_rate = slow_call_rate
+        self.open_time = open_time
+
+        self.state = CLOSED
+        self.opened_at = None
+        self._calls = deque()
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Raise UpstreamServerException if the call must not go to the backend.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_time:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+        raise UpstreamServerException('The upstream server is unavailable, try again later')
+
+    def record(self, success, elapsed):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN and self._probing:
+                self._probing = False
+                if success and elapsed < self.slow_call_time:
+                    logger.info("Circuit %s closed" % (self.name,))
+                    self.state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open(now)
+                return
+
+            self._calls.append((now, success, elapsed))
+            while self._calls and now - self._calls[0][0] > self.window:
+                self._calls.popleft()
+
+            if self.state == CLOSED and len(self._calls) >= self.min_calls:
+                errors = sum(1 for t, ok, e in self._calls if not ok) / len(self._calls)
+                slow = sum(1 for t, ok, e in self._calls if e >= self.slow_call_time) / len(self._calls)
+                if errors >= self.error_rate or slow >= self.slow_call_rate:
+                    self._open(now)
+
+    def _open(self, now):
+        logger.warning("Circuit %s opened" % (self.name,))
+        self.state = OPEN
+        self.opened_at = now
+        self._calls.clear()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_key(url):
+    match = BACKEND_PATH.search(url)
+    if match is None:
+        return (None, None)
+    return (match.group(2), match.group(1))
+
+
+def get_breaker(url):
+    """
+    Return the breaker for the resource type and API version of a backend
+    URL, or None when the FHIR_SERVER CIRCUIT_BREAKER setting is off.
+    """
+    resource_router = get_resourcerouter()
+    if not resource_router.circuit_breaker:
+        return None
+
+    key = breaker_key(url)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(key)
+            if breaker is None:
+                breaker = _breakers[key] = CircuitBreaker(
+                    "%s %s" % key,
+                    window=resource_router.breaker_window,
+                    min_calls=resource_router.breaker_min_calls,
+                    error_rate=resource_router.breaker_error_rate,
+                    slow_call_time=resource_router.breaker_slow_call_time,
+                    slow_call_rate=resource_router.breaker_slow_call_rate,
+                    open_time=resource_router.breaker_open_time)
+    return breaker
+
+
+def reset():
+    with _breakers_lock:
+        _breakers.clear()
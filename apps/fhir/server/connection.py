@@ -1,9 +1,49 @@
+import copy
+import logging
+import os
+import ssl
+import threading
+import time
+
+import requests
+import urllib3
+
 from apps.fhir.bluebutton.utils import (
     FhirServerAuth,
+    FhirServerVerify,
     generate_info_headers,
+    get_resourcerouter,
     set_default_header,
 )
 
+from . import breaker, hedging
+from .transport import BackendHTTPAdapter, build_ssl_context
+
+import apps.logging.request_logger as bb2logging
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
+
+# Content codings urllib3 decodes while the body is read: gzip, deflate
+# and br when brotli is installed
+ACCEPT_ENCODING = ', '.join(coding.strip() for coding in urllib3.util.request.ACCEPT_ENCODING.split(','))
+
+# Per-process session shared by every call to the backend FHIR server (BFD)
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+# Backend GETs in flight in this process, see send()
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class InflightCall(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.exception = None
+
 
 # return certs
 def certs(crosswalk=None):
@@ -20,3 +60,168 @@ def headers(request, url=None):
     header_info['BlueButton-OriginalQuery'] = request.META['QUERY_STRING']
     header_info['BlueButton-BackendCall'] = url
     return header_info
+
+
+def build_session():
+    """
+    Build a requests Session for the backend FHIR server.
+
+    The mounted adapter keeps a pool of keep-alive connections sized from
+    the FHIR_SERVER settings. Connections are opened with one SSLContext
+    per process that holds the client cert from FHIR_CLIENT_CERTSTORE and
+    resumes TLS sessions, see apps.fhir.server.transport.
+    """
+    resource_router = get_resourcerouter()
+    auth_state = FhirServerAuth(None)
+    verify = FhirServerVerify(None)
+
+    session = requests.Session()
+    session.verify = verify
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+
+    ssl_context = None
+    if auth_state['client_auth']:
+        try:
+            ssl_context = build_ssl_context(cert_file=auth_state['cert_file'],
+                                            key_file=auth_state['key_file'],
+                                            verify=verify)
+        except (OSError, ssl.SSLError):
+            # Leave the cert to requests, which reports it again on every call
+            logger.exception("Could not load the backend client cert, TLS sessions will not be reused")
+            session.cert = (auth_state['cert_file'], auth_state['key_file'])
+
+    adapter = BackendHTTPAdapter(ssl_context=ssl_context,
+                                 pool_connections=resource_router.pool_connections,
+                                 pool_maxsize=resource_router.pool_maxsize,
+                                 pool_block=resource_router.pool_block)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    logger.debug("Built backend session with pool_maxsize=%s" % resource_router.pool_maxsize)
+    return session
+
+
+def handshake_stats():
+    """
+    Return the count of full and resumed TLS handshakes to the backend in this process.
+    """
+    adapter = get_session().get_adapter('https://')
+    if adapter.ssl_context is None:
+        return {"full": 0, "resumed": 0}
+    return adapter.ssl_context.handshake_stats()
+
+
+def get_session():
+    """
+    Return the backend session for this process.
+
+    Sessions (and their sockets) must not be shared across a fork, so a
+    worker forked from a process that already built one gets its own.
+    """
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = build_session()
+                _session_pid = pid
+    return _session
+
+
+def reset_session():
+    """
+    Close the pooled connections and drop the session, the next call builds a new one.
+    """
+    global _session, _session_pid
+
+    with _session_lock:
+        if _session is not None and _session_pid == os.getpid():
+            _session.close()
+        _session = None
+        _session_pid = None
+
+
+def prepare_request(req):
+    # Merge the session defaults (headers, cert, verify) into the request
+    return get_session().prepare_request(req)
+
+
+def send(prepped, timeout=None, **kwargs):
+    """
+    Send a prepared request to the backend FHIR server over the pooled session.
+
+    timeout defaults to the FHIR_SERVER WAIT_TIME setting.
+
+    A GET for the same URL and beneficiary as one already in flight in this
+    process is not sent again, the caller waits for the first call and gets
+    a copy of its response (or its exception).
+    """
+    if timeout is None:
+        timeout = get_resourcerouter().wait_time
+
+    if prepped.method != 'GET' or kwargs.get('stream'):
+        return guarded_send(prepped, timeout=timeout, **kwargs)
+
+    key = (prepped.url, prepped.headers.get('BlueButton-BeneficiaryId'))
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = InflightCall()
+
+    if leader:
+        try:
+            call.response = idempotent_send(prepped, timeout=timeout, **kwargs)
+            return call.response
+        except Exception as e:
+            call.exception = e
+            raise
+        finally:
+            with _inflight_lock:
+                del _inflight[key]
+            call.done.set()
+
+    if not call.done.wait(sum(timeout) if isinstance(timeout, tuple) else timeout):
+        logger.debug("Timed out waiting for a backend call in flight, sending %s" % prepped.url)
+        return idempotent_send(prepped, timeout=timeout, **kwargs)
+
+    if call.exception is not None:
+        raise call.exception
+
+    # The body is already read, the copy only gets the caller's own request
+    response = copy.copy(call.response)
+    response.request = prepped
+    return response
+
+
+def idempotent_send(prepped, timeout=None, **kwargs):
+    """
+    Send a GET, hedged when the FHIR_SERVER HEDGE setting is on, see apps.fhir.server.hedging.
+    """
+    if get_resourcerouter().hedge:
+        return hedging.hedged_send(guarded_send, prepped, timeout=timeout, **kwargs)
+    return guarded_send(prepped, timeout=timeout, **kwargs)
+
+
+def guarded_send(prepped, timeout=None, **kwargs):
+    """
+    Send through the circuit breaker of the resource type and API version.
+
+    Raises UpstreamServerException without calling the backend while the
+    circuit is open. Any exception and 5xx responses count as errors, every
+    call is recorded so a half-open probe is always released.
+    """
+    circuit = breaker.get_breaker(prepped.url)
+    if circuit is None:
+        return get_session().send(prepped, timeout=timeout, **kwargs)
+
+    circuit.before_call()
+    start = time.monotonic()
+    success = False
+    try:
+        response = get_session().send(prepped, timeout=timeout, **kwargs)
+        success = response.status_code < 500
+        return response
+    finally:
+        circuit.record(success, time.monotonic() - start)
@@ -0,0 +1,146 @@
+import logging
+import math
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import apps.logging.request_logger as bb2logging
+
+from apps.fhir.bluebutton.utils import get_resourcerouter
+
+from .breaker import breaker_key
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
+
+
+class LatencyTracker(object):
+    """
+    Latencies of the last successful backend calls, for one resource type and API version.
+    """
+
+    def __init__(self, size):
+        self._latencies = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, elapsed):
+        with self._lock:
+            self._latencies.append(elapsed)
+
+    def percentile(self, percent, min_samples):
+        """
+        Return the percentile of the recorded latencies, or None with fewer
+        than min_samples of them.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies or len(latencies) < min_samples:
+            return None
+        index = min(len(latencies) - 1, int(math.ceil(percent / 100.0 * len(latencies))) - 1)
+        return latencies[max(index, 0)]
+
+
+_trackers = {}
+_executor = None
+# Free workers of the executor, calls never wait in its queue
+_workers = None
+_lock = threading.Lock()
+
+
+def get_tracker(url):
+    key = breaker_key(url)
+    tracker = _trackers.get(key)
+    if tracker is None:
+        with _lock:
+            tracker = _trackers.get(key)
+            if tracker is None:
+                tracker = _trackers[key] = LatencyTracker(get_resourcerouter().hedge_samples)
+    return tracker
+
+
+def get_executor():
+    global _executor, _workers
+
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _workers = threading.BoundedSemaphore(get_resourcerouter().hedge_workers)
+                _executor = ThreadPoolExecutor(max_workers=get_resourcerouter().hedge_workers,
+                                               thread_name_prefix='bfd-hedge')
+    return _executor
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Run fn on a free worker, or return None when they are all busy.
+    """
+    executor = get_executor()
+    if not _workers.acquire(blocking=False):
+        return None
+    try:
+        future = executor.submit(fn, *args, **kwargs)
+    except Exception:
+        _workers.release()
+        raise
+    future.add_done_callback(lambda f: _workers.release())
+    return future
+
+
+def reset():
+    with _lock:
+        _trackers.clear()
+
+
+def timed(send, tracker, prepped, **kwargs):
+    start = time.monotonic()
+    response = send(prepped, **kwargs)
+    if response.status_code < 500:
+        tracker.record(time.monotonic() - start)
+    return response
+
+
+def succeeded(future):
+    return future.exception() is None and future.result().status_code < 500
+
+
+def hedged_send(send, prepped, **kwargs):
+    """
+    Call send(prepped, **kwargs), and if it has not returned after the
+    HEDGE_PERCENTILE of the recent latencies of the same resource type
+    and API version, send a copy of the request as well. The first
+    successful response wins, the other one is dropped when it arrives.
+    An error or a 5xx response only wins when both calls fail.
+
+    The calls run on the HEDGE_WORKERS threads, but never wait for one:
+    when they are all busy the call is sent on the calling thread, and
+    not hedged.
+
+    Only use for idempotent requests.
+    """
+    resource_router = get_resourcerouter()
+    tracker = get_tracker(prepped.url)
+    delay = tracker.percentile(resource_router.hedge_percentile, resource_router.hedge_min_samples)
+    if delay is None:
+        return timed(send, tracker, prepped, **kwargs)
+
+    first = submit(timed, send, tracker, prepped, **kwargs)
+    if first is None:
+        return timed(send, tracker, prepped, **kwargs)
+    done, pending = wait([first], timeout=delay)
+    if done:
+        return first.result()
+
+    logger.debug("Hedging backend call after %.3fs: %s" % (delay, prepped.url))
+    second = submit(timed, send, tracker, prepped.copy(), **kwargs)
+    if second is None:
+        return first.result()
+
+    pending = {first, second}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if succeeded(future):
+                return future.result()
+    # Both failed
+    return future.result()
@@ -22,6 +22,54 @@ DEFAULTS = {
     "SERVER_VERIFY": False,
     "WAIT_TIME": 30,
     "VERIFY_SERVER": False,
+    # Connection pool of the per-process backend session
+    "POOL_CONNECTIONS": 4,
+    "POOL_MAXSIZE": 10,
+    "POOL_BLOCK": False,
+    # Fail fast while the backend is degraded, see apps.fhir.server.breaker
+    "CIRCUIT_BREAKER": True,
+    "BREAKER_WINDOW": 60,
+    "BREAKER_MIN_CALLS": 20,
+    "BREAKER_ERROR_RATE": 0.5,
+    "BREAKER_SLOW_CALL_TIME": 10,
+    "BREAKER_SLOW_CALL_RATE": 0.5,
+    "BREAKER_OPEN_TIME": 30,
+    # Send a second copy of a slow GET, see apps.fhir.server.hedging
+    "HEDGE": False,
+    "HEDGE_PERCENTILE": 95,
+    "HEDGE_MIN_SAMPLES": 50,
+    "HEDGE_SAMPLES": 500,
+    "HEDGE_WORKERS": 10,
+    # Forward backend response bodies without decoding and rendering them again
+    "STREAM_RESPONSES": False,
+    # Run $export jobs in a thread of the web process, see apps.fhir.bluebutton.export
+    "EXPORT_IN_PROCESS": True,
+    "EXPORT_WORKERS": 2,
+    # Seconds before a job not completed is failed, and before a job and
+    # its files are deleted
+    "EXPORT_TIMEOUT": 3600,
+    "EXPORT_TTL": 24 * 3600,
+    # Background fetch of the next EOB search page, see apps.fhir.bluebutton.prefetch
+    "PREFETCH": False,
+    "PREFETCH_TTL": 30,
+    "PREFETCH_MAX_BYTES": 16 * 1024 * 1024,
+    "PREFETCH_WORKERS": 2,
+    # Per-process cache of backend responses, see apps.fhir.bluebutton.cache
+    "RESPONSE_CACHE": False,
+    "RESPONSE_CACHE_MAX_BYTES": 32 * 1024 * 1024,
+    # Seconds per resource type, resource types not listed are not cached
+    "RESPONSE_CACHE_TTL": {
+        "Patient": 300,
+        "Coverage": 300,
+        "ExplanationOfBenefit": 300,
+    },
+    # Batch Bundles, see apps.fhir.bluebutton.views.batch
+    "BATCH_MAX_ENTRIES": 10,
+    "BATCH_WORKERS": 10,
+    # Seconds between background refreshes of the cached CapabilityStatement
+    # served at /fhir/metadata, 0 fetches it on every request.
+    # See apps.fhir.bluebutton.capability
+    "CAPABILITY_STATEMENT_REFRESH": 300,
 }
 
 # List of settings that cannot be empty
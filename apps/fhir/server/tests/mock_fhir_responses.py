@@ -164,6 +164,9 @@ mock_fhir_responses = {
                   "meta": {
                     "lastUpdated": "2020-01-01T00:00:00.000+00:00"
                   },
+                  "patient": {
+                    "reference": "Patient/" + settings.DEFAULT_SAMPLE_FHIR_ID
+                  },
               }
             }
             ]
@@ -205,6 +208,9 @@ mock_fhir_responses = {
                   "meta": {
                     "lastUpdated": "2020-01-01T00:00:00.000+00:00"
                   },
+                  "beneficiary": {
+                    "reference": "Patient/" + settings.DEFAULT_SAMPLE_FHIR_ID
+                  },
               }
             }
             ]
@@ -0,0 +1,119 @@
+from django.test import TestCase
+from httmock import HTTMock, all_requests
+from requests import Request
+from unittest.mock import patch
+
+from apps.fhir.bluebutton.exceptions import UpstreamServerException
+from apps.fhir.server.settings import fhir_settings
+
+from .. import breaker
+from .. import connection as backend_connection
+from ..breaker import CircuitBreaker, CLOSED, HALF_OPEN, OPEN
+
+EOB_URL = 'https://fhir.backend.bluebutton.hhsdevcloud.us/v1/fhir/ExplanationOfBenefit/'
+
+
+class TestCircuitBreaker(TestCase):
+
+    def test_opens_on_error_rate(self):
+        circuit = CircuitBreaker('test', min_calls=4, error_rate=0.5)
+        for success in (True, False, True):
+            circuit.before_call()
+            circuit.record(success, 0.1)
+        self.assertEqual(circuit.state, CLOSED)
+
+        circuit.record(False, 0.1)
+        self.assertEqual(circuit.state, OPEN)
+        with self.assertRaises(UpstreamServerException):
+            circuit.before_call()
+
+    def test_opens_on_slow_calls(self):
+        circuit = CircuitBreaker('test', min_calls=2, slow_call_time=5, slow_call_rate=1)
+        circuit.record(True, 6)
+        circuit.record(True, 7)
+        self.assertEqual(circuit.state, OPEN)
+
+    def test_half_open_probe(self):
+        circuit = CircuitBreaker('test', min_calls=1, open_time=30)
+        circuit.record(False, 0.1)
+        self.assertEqual(circuit.state, OPEN)
+
+        with patch('apps.fhir.server.breaker.time.monotonic', return_value=circuit.opened_at + 31):
+            # One probe only
+            circuit.before_call()
+            self.assertEqual(circuit.state, HALF_OPEN)
+            with self.assertRaises(UpstreamServerException):
+                circuit.before_call()
+
+            circuit.record(False, 0.1)
+            self.assertEqual(circuit.state, OPEN)
+
+        with patch('apps.fhir.server.breaker.time.monotonic', return_value=circuit.opened_at + 31):
+            circuit.before_call()
+            circuit.record(True, 0.1)
+            self.assertEqual(circuit.state, CLOSED)
+            circuit.before_call()
+
+    def test_breaker_key(self):
+        self.assertEqual(breaker.breaker_key(EOB_URL + '?patient=-1'), ('ExplanationOfBenefit', 'v1'))
+        self.assertEqual(breaker.breaker_key('https://bfd/v2/fhir/metadata?_format=json'), ('metadata', 'v2'))
+
+
+class TestGuardedSend(TestCase):
+
+    def setUp(self):
+        breaker.reset()
+        self.addCleanup(breaker.reset)
+        for patcher in (patch.object(fhir_settings, 'circuit_breaker', True),
+                        patch.object(fhir_settings, 'breaker_min_calls', 2)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_fail_fast_while_open(self):
+        calls = []
+
+        @all_requests
+        def catchall(url, req):
+            calls.append(req.url)
+            return {'status_code': 500, 'content': {}}
+
+        with HTTMock(catchall):
+            for _ in range(2):
+                req = Request('GET', EOB_URL, params={'patient': '-20140000008325'})
+                backend_connection.send(backend_connection.prepare_request(req))
+
+            with self.assertRaises(UpstreamServerException):
+                req = Request('GET', EOB_URL, params={'patient': '-20140000008325'})
+                backend_connection.send(backend_connection.prepare_request(req))
+
+            # Other resource types are not affected
+            req = Request('GET', EOB_URL.replace('ExplanationOfBenefit', 'Coverage'))
+            backend_connection.send(backend_connection.prepare_request(req))
+
+        self.assertEqual(len(calls), 3)
+
+    def test_probe_released_on_unexpected_exception(self):
+        circuit = breaker.get_breaker(EOB_URL)
+        circuit.record(False, 0.1)
+        circuit.record(False, 0.1)
+        self.assertEqual(circuit.state, OPEN)
+
+        def prepped():
+            return backend_connection.prepare_request(Request('GET', EOB_URL))
+
+        with patch('apps.fhir.server.breaker.time.monotonic', return_value=circuit.opened_at + 31):
+            with patch.object(backend_connection.get_session(), 'send', side_effect=ValueError('bad URL')):
+                with self.assertRaises(ValueError):
+                    backend_connection.guarded_send(prepped())
+            # Counted as a failure, and the probe released
+            self.assertEqual(circuit.state, OPEN)
+            self.assertFalse(circuit._probing)
+
+        with patch('apps.fhir.server.breaker.time.monotonic', return_value=circuit.opened_at + 31):
+            @all_requests
+            def catchall(url, req):
+                return {'status_code': 200, 'content': {}}
+
+            with HTTMock(catchall):
+                self.assertEqual(backend_connection.guarded_send(prepped()).status_code, 200)
+            self.assertEqual(circuit.state, CLOSED)
@@ -0,0 +1,135 @@
+import gzip
+import ssl
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from django.test import TestCase
+from httmock import HTTMock, all_requests
+from requests import Request
+
+from .. import connection as backend_connection
+from ..transport import BackendHTTPAdapter, BackendSSLContext, build_ssl_context
+
+
+class TestBackendConnection(TestCase):
+
+    def setUp(self):
+        backend_connection.reset_session()
+
+    def tearDown(self):
+        backend_connection.reset_session()
+
+    def test_session_is_shared(self):
+        session = backend_connection.get_session()
+        self.assertIs(session, backend_connection.get_session())
+
+        backend_connection.reset_session()
+        self.assertIsNot(session, backend_connection.get_session())
+
+    def test_session_pool_and_cert(self):
+        session = backend_connection.get_session()
+        adapter = session.get_adapter('https://fhir.backend.bluebutton.hhsdevcloud.us/')
+        self.assertEqual(adapter._pool_maxsize, 10)
+        self.assertIsInstance(adapter, BackendHTTPAdapter)
+        # The test cert files do not exist, requests is left to report it
+        self.assertIsNone(adapter.ssl_context)
+        self.assertEqual(session.cert, backend_connection.certs())
+        self.assertFalse(session.verify)
+
+    def test_handshake_stats(self):
+        self.assertEqual(backend_connection.handshake_stats(), {"full": 0, "resumed": 0})
+
+    def test_ssl_context(self):
+        context = build_ssl_context()
+        self.assertIsInstance(context, BackendSSLContext)
+        self.assertEqual(context.verify_mode, ssl.CERT_NONE)
+        self.assertEqual(context.handshake_stats(), {"full": 0, "resumed": 0})
+
+        with self.assertRaises(OSError):
+            build_ssl_context(cert_file='/does/not/exist.pem', key_file='/does/not/exist.key')
+
+    def test_send_uses_session(self):
+        calls = []
+
+        @all_requests
+        def catchall(url, req):
+            calls.append(req.url)
+            return {'status_code': 200, 'content': {'resourceType': 'Bundle'}}
+
+        with HTTMock(catchall):
+            for _ in range(2):
+                req = Request('GET', 'https://fhir.backend.bluebutton.hhsdevcloud.us/v1/fhir/metadata',
+                              params={'_format': 'json'})
+                response = backend_connection.send(backend_connection.prepare_request(req))
+                self.assertEqual(response.json(), {'resourceType': 'Bundle'})
+
+        self.assertEqual(len(calls), 2)
+        self.assertIn('_format=json', calls[0])
+
+    def test_compressed_response(self):
+        accept_encoding = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                accept_encoding.append(self.headers['Accept-Encoding'])
+                body = gzip.compress(b'{"resourceType": "Bundle"}')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        server.timeout = 5
+        self.addCleanup(server.server_close)
+        thread = threading.Thread(target=server.handle_request, daemon=True)
+        thread.start()
+
+        # The local server doesn't ask for the (missing) test client cert
+        backend_connection.get_session().cert = None
+
+        req = Request('GET', 'http://127.0.0.1:%s/v1/fhir/metadata' % server.server_port)
+        response = backend_connection.send(backend_connection.prepare_request(req), timeout=5)
+        thread.join()
+
+        self.assertEqual(accept_encoding, [backend_connection.ACCEPT_ENCODING])
+        self.assertIn('gzip', backend_connection.ACCEPT_ENCODING)
+        self.assertEqual(response.json(), {'resourceType': 'Bundle'})
+
+    def test_concurrent_calls_are_coalesced(self):
+        calls = []
+
+        @all_requests
+        def catchall(url, req):
+            calls.append(req.url)
+            # keep the first call in flight while the others arrive
+            time.sleep(0.5)
+            return {'status_code': 200, 'content': {'resourceType': 'Bundle'}}
+
+        def fetch(results):
+            req = Request('GET', 'https://fhir.backend.bluebutton.hhsdevcloud.us/v1/fhir/ExplanationOfBenefit/',
+                          params={'patient': '-20140000008325'},
+                          headers={'BlueButton-BeneficiaryId': 'patientId:-20140000008325'})
+            prepped = backend_connection.prepare_request(req)
+            response = backend_connection.send(prepped)
+            results.append((prepped, response))
+
+        results = []
+        with HTTMock(catchall):
+            threads = [threading.Thread(target=fetch, args=(results,)) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 4)
+        for prepped, response in results:
+            self.assertIs(response.request, prepped)
+            self.assertEqual(response.json(), {'resourceType': 'Bundle'})
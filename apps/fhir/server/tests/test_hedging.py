@@ -0,0 +1,122 @@
+import threading
+import time
+
+from django.test import TestCase
+from requests import Request, Response
+from unittest.mock import patch
+
+from apps.fhir.server.settings import fhir_settings
+
+from .. import hedging
+from ..hedging import LatencyTracker
+
+COVERAGE_URL = 'https://fhir.backend.bluebutton.hhsdevcloud.us/v1/fhir/Coverage/part-a-1'
+
+
+def response(status_code=200, content=b'{}'):
+    r = Response()
+    r.status_code = status_code
+    r._content = content
+    return r
+
+
+class TestLatencyTracker(TestCase):
+
+    def test_percentile(self):
+        tracker = LatencyTracker(100)
+        for ms in range(1, 101):
+            tracker.record(ms / 1000.0)
+        self.assertEqual(tracker.percentile(95, 50), 0.095)
+        self.assertEqual(tracker.percentile(100, 50), 0.1)
+        self.assertIsNone(tracker.percentile(95, 101))
+
+
+class TestHedgedSend(TestCase):
+
+    def setUp(self):
+        hedging.reset()
+        self.addCleanup(hedging.reset)
+        patcher = patch.object(fhir_settings, 'hedge_min_samples', 5)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.prepped = Request('GET', COVERAGE_URL).prepare()
+
+    def seed(self, latency):
+        tracker = hedging.get_tracker(COVERAGE_URL)
+        for _ in range(5):
+            tracker.record(latency)
+
+    def test_no_hedge_without_samples(self):
+        calls = []
+
+        def send(prepped, **kwargs):
+            calls.append(prepped)
+            return response()
+
+        hedging.hedged_send(send, self.prepped, timeout=5)
+        self.assertEqual(calls, [self.prepped])
+
+    def test_slow_call_is_hedged(self):
+        self.seed(0.01)
+        calls = []
+
+        def send(prepped, **kwargs):
+            calls.append(prepped)
+            if prepped is self.prepped:
+                time.sleep(0.5)
+                return response(content=b'slow')
+            return response(content=b'fast')
+
+        r = hedging.hedged_send(send, self.prepped, timeout=5)
+        self.assertEqual(r.content, b'fast')
+        self.assertEqual(len(calls), 2)
+
+    def test_failed_hedge_waits_for_first(self):
+        self.seed(0.01)
+
+        def send(prepped, **kwargs):
+            if prepped is self.prepped:
+                time.sleep(0.2)
+                return response(content=b'first')
+            raise ConnectionError()
+
+        r = hedging.hedged_send(send, self.prepped, timeout=5)
+        self.assertEqual(r.content, b'first')
+
+    def test_failed_first_waits_for_hedge(self):
+        self.seed(0.01)
+
+        def send(prepped, **kwargs):
+            if prepped is self.prepped:
+                time.sleep(0.05)
+                return response(503, b'first')
+            time.sleep(0.2)
+            return response(content=b'hedge')
+
+        r = hedging.hedged_send(send, self.prepped, timeout=5)
+        self.assertEqual(r.content, b'hedge')
+
+        def send_both_failing(prepped, **kwargs):
+            time.sleep(0.05)
+            return response(503)
+
+        self.assertEqual(hedging.hedged_send(send_both_failing, self.prepped, timeout=5).status_code, 503)
+
+    def test_busy_workers_send_on_calling_thread(self):
+        self.seed(0.01)
+        hedging.get_executor()
+        busy = 0
+        while hedging._workers.acquire(blocking=False):
+            busy += 1
+        self.addCleanup(lambda: [hedging._workers.release() for _ in range(busy)])
+
+        threads = []
+
+        def send(prepped, **kwargs):
+            threads.append(threading.current_thread())
+            time.sleep(0.05)
+            return response()
+
+        hedging.hedged_send(send, self.prepped, timeout=5)
+        self.assertEqual(threads, [threading.current_thread()])
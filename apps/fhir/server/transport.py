@@ -0,0 +1,149 @@
+import os
+import ssl
+import threading
+
+import requests
+
+from requests.adapters import DEFAULT_POOLBLOCK, HTTPAdapter
+
+
+class BackendSSLSocket(ssl.SSLSocket):
+    """
+    SSLSocket that hands its TLS session back to the context when closed.
+    """
+    backend_host = None
+
+    def close(self):
+        if isinstance(self.context, BackendSSLContext):
+            self.context.save_session(self.backend_host, self)
+        super().close()
+
+
+class BackendSSLContext(ssl.SSLContext):
+    """
+    SSLContext for the backend FHIR server (BFD).
+
+    The client cert chain is loaded once when the context is built, and the
+    last TLS session (or session ticket) per host is offered again on new
+    connections so reconnects after an idle timeout can be resumed instead
+    of doing a full mutual-TLS handshake.
+    """
+    sslsocket_class = BackendSSLSocket
+
+    def init_session_cache(self):
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+        self._stats = {"full": 0, "resumed": 0}
+
+    def wrap_socket(self, sock, server_hostname=None, **kwargs):
+        # urllib3 leaves server_hostname unset when connecting to an IP address
+        host = server_hostname or _peer_address(sock)
+        session = self._sessions.get(host)
+        if session is not None and 'session' not in kwargs:
+            kwargs['session'] = session
+
+        ssl_sock = super().wrap_socket(sock, server_hostname=server_hostname, **kwargs)
+
+        with self._sessions_lock:
+            if ssl_sock.session_reused:
+                self._stats["resumed"] += 1
+            else:
+                self._stats["full"] += 1
+        ssl_sock.backend_host = host
+        self.save_session(host, ssl_sock)
+        return ssl_sock
+
+    def save_session(self, host, ssl_sock):
+        # With TLS 1.3 the ticket only arrives after the handshake, so this is
+        # called again once a response has been read and when the socket closes.
+        try:
+            session = ssl_sock.session
+        except (OSError, ValueError):
+            session = None
+        if host and session is not None:
+            with self._sessions_lock:
+                self._sessions[host] = session
+
+    def clear_sessions(self):
+        with self._sessions_lock:
+            self._sessions.clear()
+
+    def handshake_stats(self):
+        with self._sessions_lock:
+            return dict(self._stats)
+
+
+def _peer_address(sock):
+    try:
+        return sock.getpeername()[0]
+    except (OSError, IndexError, TypeError):
+        return None
+
+
+def build_ssl_context(cert_file=None, key_file=None, verify=False):
+    """
+    Build the BackendSSLContext for this worker.
+
+    verify follows the requests convention: False, True (default CA bundle)
+    or the path of a CA bundle. Raises OSError or ssl.SSLError when the
+    client cert can not be loaded.
+    """
+    context = BackendSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.init_session_cache()
+
+    # urllib3 sets verify_mode per connection and matches the hostname itself
+    context.check_hostname = False
+    if verify:
+        ca_bundle = verify if isinstance(verify, str) else requests.certs.where()
+        if os.path.isdir(ca_bundle):
+            context.load_verify_locations(capath=ca_bundle)
+        else:
+            context.load_verify_locations(cafile=ca_bundle)
+        context.verify_mode = ssl.CERT_REQUIRED
+    else:
+        context.verify_mode = ssl.CERT_NONE
+
+    if cert_file:
+        context.load_cert_chain(cert_file, key_file or None)
+
+    return context
+
+
+class BackendHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that opens every pooled connection with a shared BackendSSLContext.
+    """
+
+    def __init__(self, ssl_context=None, **kwargs):
+        self.ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=DEFAULT_POOLBLOCK, **pool_kwargs):
+        if self.ssl_context is not None:
+            pool_kwargs['ssl_context'] = self.ssl_context
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+
+    def cert_verify(self, conn, url, verify, cert):
+        if self.ssl_context is None:
+            return super().cert_verify(conn, url, verify, cert)
+
+        # The CA bundle and client cert are already loaded in the context,
+        # leave the file paths unset so urllib3 does not read them again.
+        # verify is not used here: requests replaces a session verify=False
+        # with REQUESTS_CA_BUNDLE when that is set in the environment.
+        verify_mode = self.ssl_context.verify_mode
+        conn.cert_reqs = 'CERT_REQUIRED' if verify_mode == ssl.CERT_REQUIRED else 'CERT_NONE'
+        conn.ca_certs = None
+        conn.ca_cert_dir = None
+        conn.cert_file = None
+        conn.key_file = None
+
+    def build_response(self, req, resp):
+        response = super().build_response(req, resp)
+
+        connection = getattr(resp, '_connection', None)
+        ssl_sock = getattr(connection, 'sock', None)
+        if self.ssl_context is not None and isinstance(ssl_sock, ssl.SSLSocket):
+            self.ssl_context.save_session(getattr(connection, 'host', None), ssl_sock)
+
+        return response
@@ -20,11 +20,8 @@ def django_rds_database(v2=False):
 def bfd_fhir_dataserver(v2=False):
     resource_router = get_resourcerouter()
     target_url = "{}{}".format(resource_router.fhir_url, "/v2/fhir/metadata" if v2 else "/v1/fhir/metadata")
-    r = requests.get(target_url,
-                     params={"_format": "json"},
-                     cert=backend_connection.certs(),
-                     verify=False,
-                     timeout=5)
+    req = requests.Request('GET', target_url, params={"_format": "json"})
+    r = backend_connection.send(backend_connection.prepare_request(req), timeout=5)
     try:
         r.raise_for_status()
     except Exception:
@@ -0,0 +1,122 @@
+import gzip
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# An encoding in Accept-Encoding, with its optional q value
+ACCEPT_ENCODING_ITEM = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+STRONG_ETAG = re.compile(r'^"[^"]*"$')
+
+
+def available_encodings():
+    """
+    Return the content codings this process can produce, preferred first.
+    """
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encoding):
+    """
+    Return the available content coding the Accept-Encoding header value
+    prefers, or None if there is no acceptable one.
+    """
+    accepted = {}
+    for item in accept_encoding.split(','):
+        match = ACCEPT_ENCODING_ITEM.match(item)
+        if match is None:
+            continue
+        try:
+            accepted[match.group(1).lower()] = float(match.group(2) or 1)
+        except ValueError:
+            continue
+
+    best, best_q = None, 0
+    for encoding in available_encodings():
+        q = accepted.get(encoding, accepted.get('*', 0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(encoding, content):
+    if encoding == 'br':
+        return brotli.compress(content, quality=settings.RESPONSE_COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=settings.RESPONSE_COMPRESSION_LEVEL)
+
+
+def compress_sequence(encoding, sequence):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=settings.RESPONSE_COMPRESSION_BROTLI_QUALITY)
+        for item in sequence:
+            data = compressor.process(item)
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    # wbits 16 + MAX_WBITS writes the gzip header and trailer
+    compressor = zlib.compressobj(settings.RESPONSE_COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for item in sequence:
+        data = compressor.compress(item)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress the responses of the paths in RESPONSE_COMPRESSION_PATHS with
+    brotli (when installed) or gzip, as negotiated with Accept-Encoding.
+
+    Responses smaller than RESPONSE_COMPRESSION_MIN_SIZE are sent as is.
+    Like django.middleware.gzip.GZipMiddleware, it must run before any
+    middleware that reads the response body, see MIDDLEWARE.
+    """
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.paths = [re.compile(path) for path in settings.RESPONSE_COMPRESSION_PATHS]
+
+    def process_response(self, request, response):
+        if not settings.RESPONSE_COMPRESSION:
+            return response
+        if not any(path.match(request.path) for path in self.paths):
+            return response
+        if response.has_header('Content-Encoding') or response.status_code in (204, 304):
+            return response
+        if not response.streaming and len(response.content) < settings.RESPONSE_COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_sequence(encoding, response.streaming_content)
+            # The length isn't known until the last chunk is compressed
+            del response['Content-Length']
+        else:
+            compressed_content = compress(encoding, response.content)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response['Content-Length'] = str(len(response.content))
+
+        # The compressed body is a different representation, its ETag is only weak
+        etag = response.get('ETag')
+        if etag and STRONG_ETAG.match(etag):
+            response['ETag'] = 'W/' + etag
+
+        response['Content-Encoding'] = encoding
+        return response
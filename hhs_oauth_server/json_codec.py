@@ -0,0 +1,63 @@
+import json
+
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+COMPACT_SEPARATORS = (',', ':')
+INDENT_SEPARATORS = (',', ': ')
+
+
+def is_fast():
+    """
+    True when JSON_CODEC is "orjson" and the orjson package is installed,
+    otherwise the stdlib json module is used.
+    """
+    return orjson is not None and settings.JSON_CODEC == "orjson"
+
+
+def loads(content, parse_constant=None):
+    """
+    Decode a JSON document from bytes or str, like json.loads.
+    """
+    if is_fast():
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # json may still take NaN and Infinity, or raises its own error
+            pass
+    return json.loads(content, parse_constant=parse_constant)
+
+
+def dumps(data, cls=None, sort_keys=False, indent=None, separators=None, ensure_ascii=True, allow_nan=True):
+    """
+    Encode data to a JSON str, like json.dumps with the same arguments.
+
+    orjson only writes UTF-8 documents, compact or indented by 2 spaces.
+    It is used when the arguments ask for one of these, other layouts, and
+    data orjson can't encode (like integers over 64 bits or non-str keys),
+    go through json.dumps. Members are written in the same order either way.
+    orjson writes NaN and Infinity as null, whatever allow_nan is.
+    """
+    if is_fast() and not ensure_ascii and _orjson_layout(indent, separators):
+        option = orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            # Dates and times go to the encoder class, as with json.dumps
+            return orjson.dumps(data, default=(cls or json.JSONEncoder)().default, option=option).decode()
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(data, cls=cls, sort_keys=sort_keys, indent=indent,
+                      separators=separators, ensure_ascii=ensure_ascii, allow_nan=allow_nan)
+
+
+def _orjson_layout(indent, separators):
+    if indent is None:
+        return tuple(separators or ()) == COMPACT_SEPARATORS
+    return indent == 2 and tuple(separators or INDENT_SEPARATORS) == INDENT_SEPARATORS
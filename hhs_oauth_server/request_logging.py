@@ -15,6 +15,7 @@ from apps.dot_ext.loggers import (
     get_session_auth_flow_trace,
     is_path_part_of_auth_flow_trace,
 )
+from apps.fhir.bluebutton.auth_context import AuthContext, get_auth_context
 from apps.fhir.bluebutton.utils import (
     get_ip_from_request,
     get_user_from_request,
@@ -363,32 +364,37 @@ class RequestResponseLog(object):
         access_token = getattr(
             self.request, "auth", get_access_token_from_request(self.request)
         )
-        if AccessToken.objects.filter(token=access_token).exists():
+        # Loaded once per request after authentication, see AuthContext
+        context = get_auth_context(self.request)
+        if context is None:
+            at = AccessToken.objects.select_related(
+                "application__user", "user"
+            ).filter(token=access_token).first()
+            context = AuthContext(at, at.user) if at is not None else None
+        if context is not None:
             try:
-                at = AccessToken.objects.get(token=access_token)
-
                 self.log_msg["access_token_hash"] = hashlib.sha256(
                     str(access_token).encode("utf-8")
                 ).hexdigest()
-                self.log_msg["access_token_scopes"] = " ".join([s for s in at.scopes])
+                self.log_msg["access_token_scopes"] = " ".join([s for s in context.scopes])
                 self._log_msg_update_from_object(
-                    at.application, "access_token_id", "id"
+                    context.application, "access_token_id", "id"
                 )
 
-                self._log_msg_update_from_object(at.application, "app_name", "name")
-                self._log_msg_update_from_object(at.application, "app_id", "id")
+                self._log_msg_update_from_object(context.application, "app_name", "name")
+                self._log_msg_update_from_object(context.application, "app_id", "id")
                 self._log_msg_update_from_object(
-                    at.application,
+                    context.application,
                     "app_require_demographic_scopes",
                     "require_demographic_scopes",
                 )
-                self._log_msg_update_from_object(at.application.user, "dev_id", "id")
+                self._log_msg_update_from_object(context.developer, "dev_id", "id")
                 self._log_msg_update_from_object(
-                    at.application.user, "dev_name", "username"
+                    context.developer, "dev_name", "username"
                 )
 
-                self._log_msg_update_from_object(at.user, "user_id", "id")
-                self._log_msg_update_from_object(at.user, "user_username", "username")
+                self._log_msg_update_from_object(context.user, "user_id", "id")
+                self._log_msg_update_from_object(context.user, "user_username", "username")
             except ObjectDoesNotExist:
                 pass
 
@@ -416,6 +422,15 @@ class RequestResponseLog(object):
             else:
                 self.log_msg["fhir_entry_count"] = None
             self.log_msg["fhir_total"] = self.response.data.get("total", None)
+        elif getattr(self.request, "fhir_summary", None) is not None:
+            # Forwarded as is, summarized by the FHIR view
+            self.log_msg.update(self.request.fhir_summary)
+
+        """
+        --- Logging items from the ownership verification of a FHIR response ---
+        """
+        if getattr(self.request, "ownership_report", None) is not None:
+            self.log_msg["fhir_ownership"] = self.request.ownership_report.as_dict()
 
         """
         --- Logging items from response content (refresh_token)
@@ -39,3 +39,16 @@ class MediaStorage(S3Boto3Storage):
     def _normalize_name(self, name):
         name = self.location + name
         return name
+
+
+# bulk $export output: beneficiary data, private objects only downloaded
+# through the authenticated export file view, never through MEDIA_URL
+class ExportStorage(S3Boto3Storage):
+
+    location = settings.EXPORTFILES_LOCATION
+    bucket_name = settings.EXPORT_STORAGE_BUCKET_NAME
+    default_acl = 'private'
+    bucket_acl = 'private'
+    custom_domain = None
+    querystring_auth = True
+    file_overwrite = False
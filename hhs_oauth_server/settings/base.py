@@ -193,6 +193,9 @@ REST_FRAMEWORK = {
         "token": env("TOKEN_THROTTLE_RATE", "100000/s"),
     },
 }
+# Cache holding the token throttle counters, shared by the processes. Left
+# empty each process counts on its own, see apps.dot_ext.throttling
+TOKEN_THROTTLE_CACHE = env("DJANGO_TOKEN_THROTTLE_CACHE", "default")
 
 # Failed Login Attempt Module: AXES
 # Either integer or timedelta.
@@ -216,6 +219,8 @@ if env("OPTIONAL_INSTALLED_APPS", False):
 MIDDLEWARE = [
     # Middleware that adds headers to the resposne
     "django.middleware.security.SecurityMiddleware",
+    # Compresses the response body, must stay above middleware that reads it
+    "hhs_oauth_server.compression.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "hhs_oauth_server.request_logging.RequestTimeLoggingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -263,6 +268,44 @@ CACHES = {
     },
 }
 
+# Values of the default cache are also kept in each process for up to
+# CACHE_LOCAL_TIMEOUT seconds (0 disables it), in front of the cache above
+# as "shared", see hhs_oauth_server.two_tier_cache
+CACHE_LOCAL_TIMEOUT = int_env(env("DJANGO_CACHE_LOCAL_TIMEOUT", 5))
+if CACHE_LOCAL_TIMEOUT:
+    CACHES = {
+        "default": {
+            "BACKEND": "hhs_oauth_server.two_tier_cache.TwoTierCache",
+            "LOCATION": "shared",
+            "OPTIONS": {
+                "LOCAL_TIMEOUT": CACHE_LOCAL_TIMEOUT,
+                "LOCAL_MAX_ENTRIES": int_env(env("DJANGO_CACHE_LOCAL_MAX_ENTRIES", 10000)),
+            },
+        },
+        "shared": CACHES["default"],
+    }
+
+# Cache of the data that may differ between hosts for a while: never tokens,
+# grants or throttle counters, whose changes must be seen by every host.
+# With DJANGO_HOST_CACHE_LOCATION, the path of a file e.g. under /dev/shm,
+# the workers of a host share it in memory, see
+# hhs_oauth_server.shared_memory_cache. Otherwise each process has its own.
+# Holds the CapabilityStatements and the protected resources of the scopes.
+HOST_CACHE_LOCATION = env("DJANGO_HOST_CACHE_LOCATION", "")
+if HOST_CACHE_LOCATION:
+    CACHES["host"] = {
+        "BACKEND": "hhs_oauth_server.shared_memory_cache.SharedMemoryCache",
+        "LOCATION": HOST_CACHE_LOCATION,
+        "OPTIONS": {
+            "SIZE": int_env(env("DJANGO_HOST_CACHE_MB", 64)) * 1024 * 1024,
+        },
+    }
+else:
+    CACHES["host"] = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "host",
+    }
+
 DATABASES = {
     "default": dj_database_url.config(
         default=env("DATABASES_CUSTOM", "sqlite:///{}/db.sqlite3".format(BASE_DIR))
@@ -291,6 +334,11 @@ ASSETS_ROOT = env("DJANGO_ASSETS_ROOT", BASE_DIR)
 MEDIA_ROOT = os.path.join(ASSETS_ROOT, "media")
 
 MEDIA_URL = "/media/"
+
+# Bulk $export output holds beneficiary data: a private storage, outside of
+# MEDIA_ROOT, only served by the authenticated export file view
+EXPORT_FILE_STORAGE = "django.core.files.storage.FileSystemStorage"
+EXPORT_FILE_STORAGE_OPTIONS = {"location": os.path.join(ASSETS_ROOT, "exports")}
 STATIC_URL = "/static/"
 STATIC_ROOT = "collectedstatic"
 
@@ -413,6 +461,26 @@ OAUTH2_PROVIDER = {
     "ALLOWED_REDIRECT_URI_SCHEMES": ["https", "http"],
 }
 
+# Validated access tokens are kept in this cache for up to
+# ACCESS_TOKEN_CACHE_TTL seconds (0 disables it), see apps.dot_ext.token_cache
+ACCESS_TOKEN_CACHE_TTL = int_env(env("DJANGO_ACCESS_TOKEN_CACHE_TTL", 300))
+ACCESS_TOKEN_CACHE_ALIAS = env("DJANGO_ACCESS_TOKEN_CACHE_ALIAS", "default")
+
+# Whether a data access grant exists, or not, is kept in the default cache
+# for DATA_ACCESS_GRANT_CACHE_TTL seconds (0 disables it), see
+# apps.authorization.grant_cache
+DATA_ACCESS_GRANT_CACHE_TTL = int_env(env("DJANGO_DATA_ACCESS_GRANT_CACHE_TTL", 60))
+
+# The protected resources of the scopes are compiled once per process, and
+# compiled again every PROTECTED_CAPABILITY_INDEX_TTL seconds to pick up
+# changes made by other processes, from the "host" cache where they are kept
+# as long, see apps.capabilities.index
+PROTECTED_CAPABILITY_INDEX_TTL = int_env(env("DJANGO_PROTECTED_CAPABILITY_INDEX_TTL", 300))
+
+# Application last_active is written every APPLICATION_ACTIVITY_FLUSH_INTERVAL
+# seconds (0 writes it on each API call), see apps.dot_ext.activity
+APPLICATION_ACTIVITY_FLUSH_INTERVAL = int_env(env("DJANGO_APPLICATION_ACTIVITY_FLUSH_INTERVAL", 30))
+
 # These choices will be available in the expires_in field
 # of the oauth2 authorization page.
 DOT_EXPIRES_IN = (
@@ -488,6 +556,11 @@ HOSTNAME_URL = env("HOSTNAME_URL", "http://localhost:8000")
 # Set the default Encoding standard. typically 'utf-8'
 ENCODING = "utf-8"
 
+# JSON codec of the FHIR renderers and parsers and of the backend responses,
+# see hhs_oauth_server.json_codec: "orjson" (used when installed) or "json".
+# The log lines are always written by json.dumps.
+JSON_CODEC = env("DJANGO_JSON_CODEC", "orjson")
+
 # include settings values in SETTING_EXPORT to use values in Templates.
 # eg. {{ settings.APPLICATION_TITLE }}
 SETTINGS_EXPORT = [
@@ -541,6 +614,18 @@ FHIR_SERVER = {
         FHIR_CLIENT_CERTSTORE, env("FHIR_KEY_FILE", "ca.key.nocrypt.pem")
     ),
     "CLIENT_AUTH": True,
+    # Keep-alive connections per worker process to the backend FHIR server
+    "POOL_MAXSIZE": int(env("FHIR_POOL_MAXSIZE", "10")),
+    "CIRCUIT_BREAKER": bool_env(env("FHIR_CIRCUIT_BREAKER", "True")),
+    "HEDGE": bool_env(env("FHIR_HEDGE", "False")),
+    "HEDGE_PERCENTILE": int(env("FHIR_HEDGE_PERCENTILE", "95")),
+    "STREAM_RESPONSES": bool_env(env("FHIR_STREAM_RESPONSES", "False")),
+    "EXPORT_IN_PROCESS": bool_env(env("FHIR_EXPORT_IN_PROCESS", "True")),
+    "EXPORT_TTL": int_env(env("FHIR_EXPORT_TTL", 24 * 3600)),
+    "PREFETCH": bool_env(env("FHIR_PREFETCH", "False")),
+    "RESPONSE_CACHE": bool_env(env("FHIR_RESPONSE_CACHE", "False")),
+    "RESPONSE_CACHE_MAX_BYTES": int_env(env("FHIR_RESPONSE_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+    "CAPABILITY_STATEMENT_REFRESH": int_env(env("FHIR_CAPABILITY_STATEMENT_REFRESH", 300)),
 }
 
 """
@@ -572,6 +657,20 @@ LOGOUT_REDIRECT_URL = "/"
 # Move Admin to a variable url location
 ADMIN_PREPEND_URL = env("DJANGO_ADMIN_PREPEND_URL", "")
 
+# Response compression (brotli when installed, or gzip) of the FHIR,
+# metrics and public application list responses, see hhs_oauth_server.compression
+RESPONSE_COMPRESSION = bool_env(env("DJANGO_RESPONSE_COMPRESSION", "True"))
+RESPONSE_COMPRESSION_MIN_SIZE = int_env(env("DJANGO_RESPONSE_COMPRESSION_MIN_SIZE", 1024))
+# gzip compresslevel, 1-9
+RESPONSE_COMPRESSION_LEVEL = int_env(env("DJANGO_RESPONSE_COMPRESSION_LEVEL", 6))
+# brotli quality, 0-11
+RESPONSE_COMPRESSION_BROTLI_QUALITY = int_env(env("DJANGO_RESPONSE_COMPRESSION_BROTLI_QUALITY", 5))
+RESPONSE_COMPRESSION_PATHS = [
+    r"^/v[12]/fhir/",
+    r"^/" + ADMIN_PREPEND_URL + r"admin/metrics/",
+    r"^/\.well-known/public-applications",
+]
+
 ALLOW_END_USER_EXTERNAL_AUTH = "B"
 EXTERNAL_AUTH_NAME = "MyMedicare.gov"
 
@@ -640,6 +739,10 @@ if env("TARGET_ENV", "") in ["dev", "test", "impl", "prod"]:
     MEDIAFILES_LOCATION = "media/"
     DEFAULT_FILE_STORAGE = "hhs_oauth_server.s3_storage.MediaStorage"
     MEDIA_URL = "https://%s/%s" % (AWS_S3_CUSTOM_DOMAIN, MEDIAFILES_LOCATION)
+    EXPORTFILES_LOCATION = "bulk_export/"
+    EXPORT_STORAGE_BUCKET_NAME = env("AWS_EXPORT_STORAGE_BUCKET_NAME", AWS_STORAGE_BUCKET_NAME)
+    EXPORT_FILE_STORAGE = "hhs_oauth_server.s3_storage.ExportStorage"
+    EXPORT_FILE_STORAGE_OPTIONS = {}
     # Email config
     SEND_EMAIL = True
 else:
@@ -655,6 +758,10 @@ else:
         STATICFILES_LOCATION = "static/"
         DEFAULT_FILE_STORAGE = "hhs_oauth_server.s3_storage.MediaStorage"
         MEDIA_URL = "https://%s/%s" % (AWS_S3_CUSTOM_DOMAIN, MEDIAFILES_LOCATION)
+        EXPORTFILES_LOCATION = "bulk_export/"
+        EXPORT_STORAGE_BUCKET_NAME = env("AWS_EXPORT_STORAGE_BUCKET_NAME", AWS_STORAGE_BUCKET_NAME)
+        EXPORT_FILE_STORAGE = "hhs_oauth_server.s3_storage.ExportStorage"
+        EXPORT_FILE_STORAGE_OPTIONS = {}
     else:
         # This sets up a media path in urls.py when set for local storage.
         IS_MEDIA_URL_LOCAL = True
@@ -10,8 +10,18 @@ LOGIN_RATE = '100/m'
 
 REQUEST_CALL_TIMEOUT = (5, 120)
 
+# The mocked backend errors of one test would open the circuit for the next ones
+FHIR_SERVER = {**FHIR_SERVER, "CIRCUIT_BREAKER": False}
+
 OFFLINE = True
 
+# Tests read the application activity right after an API call
+APPLICATION_ACTIVITY_FLUSH_INTERVAL = 0
+
+# Primary keys are reused from one test to the next, the cached grants of
+# one test would be seen by the next ones
+DATA_ACCESS_GRANT_CACHE_TTL = 0
+
 # Should be set to True in production and False in all other dev and test environments
 # Replace with BLOCK_HTTP_REDIRECT_URIS per CBBP-845 to support mobile apps
 # REQUIRE_HTTPS_REDIRECT_URIS = True
@@ -34,6 +44,10 @@ CACHES = {
     'axes_cache': {
         'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
     },
+    'host': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'host',
+    },
 }
 AXES_CACHE = 'axes_cache'
 
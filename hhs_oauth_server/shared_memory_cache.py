@@ -0,0 +1,437 @@
+import bisect
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+import apps.logging.request_logger as bb2logging
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(bb2logging.HHS_SERVER_LOGNAME_FMT.format(__name__))
+
+MAGIC = b'BB2SHMC2'
+
+# magic, size, bucket count, class count, layout id
+HEADER = struct.Struct('<8sQIIQ')
+# odd while an operation is changing the region
+SEQUENCE = struct.Struct('<Q')
+# per slab class: free list head, LRU head (most recent), LRU tail
+CLASS = struct.Struct('<iii')
+BUCKET = struct.Struct('<i')
+# state, key hash, expires (0 never), next in bucket, LRU prev, LRU next,
+# key length, value length, CRC32 of the key and value
+SLOT = struct.Struct('<BQdiiiHII')
+
+NONE = -1
+FREE = 0
+USED = 1
+
+DEFAULT_SIZE = 64 * 1024 * 1024
+DEFAULT_SLAB_SIZES = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# The regions this process has open, by path. A forked worker opens its own,
+# file locks are not held between processes sharing an open file.
+_regions = {}
+_regions_lock = threading.Lock()
+
+
+class SlabClass(object):
+    __slots__ = ('index', 'first', 'slot_size', 'count', 'offset')
+
+    def __init__(self, index, first, slot_size, count, offset):
+        self.index = index
+        self.first = first
+        self.slot_size = slot_size
+        self.count = count
+        self.offset = offset
+
+
+def key_hash(key):
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+class Region(object):
+    """
+    A hash table of cache entries in a file mapped in memory, shared by the
+    processes of the host that map the same file.
+
+    The memory is split evenly between slab classes of fixed size slots.
+    An entry takes a slot of the smallest class it fits in, when that class
+    is full its least recently used entry is evicted. A lock on the file,
+    and a thread lock, serialize the accesses.
+
+    An operation makes the sequence in the header odd while it runs. One
+    that did not complete, e.g. its worker was killed, leaves it odd and
+    the next operation clears the region. Each entry also has a checksum,
+    an entry that does not match it is a miss.
+    """
+
+    def __init__(self, path, size, slab_sizes, bucket_count):
+        self.path = path
+        self.size = size
+        self.bucket_count = bucket_count
+        self.classes_offset = HEADER.size + SEQUENCE.size
+        self.buckets_offset = self.classes_offset + CLASS.size * len(slab_sizes)
+
+        offset = self.buckets_offset + BUCKET.size * bucket_count
+        per_class = (size - offset) // len(slab_sizes)
+        if per_class <= 0:
+            raise ImproperlyConfigured("The shared memory cache SIZE is too small")
+        self.classes = []
+        first = 0
+        for index, slot_size in enumerate(sorted(slab_sizes)):
+            count = per_class // slot_size
+            self.classes.append(SlabClass(index, first, slot_size, count, offset))
+            first += count
+            offset += count * slot_size
+        self._firsts = [slab.first for slab in self.classes]
+        layout = repr((size, bucket_count, sorted(slab_sizes))).encode()
+        self.layout_id = key_hash(layout)
+
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._file_lock():
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+            self.map = mmap.mmap(self._fd, size)
+            if HEADER.unpack_from(self.map, 0) != (MAGIC, size, bucket_count, len(self.classes), self.layout_id):
+                # New, or made by processes with other options
+                self.format()
+
+    @contextmanager
+    def _file_lock(self):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def locked(self):
+        with self._thread_lock, self._file_lock():
+            sequence = SEQUENCE.unpack_from(self.map, HEADER.size)[0]
+            if sequence % 2:
+                logger.warning("The shared memory cache %s was left half written, clearing it" % self.path)
+                self.format()
+                sequence = 0
+            SEQUENCE.pack_into(self.map, HEADER.size, sequence + 1)
+            try:
+                yield
+            finally:
+                # The operations raise before changing the region, e.g.
+                # incr of a missing key
+                SEQUENCE.pack_into(self.map, HEADER.size, sequence + 2)
+
+    def format(self):
+        HEADER.pack_into(self.map, 0, b'\0' * 8, self.size, self.bucket_count, len(self.classes), self.layout_id)
+        SEQUENCE.pack_into(self.map, HEADER.size, 0)
+        self.map[self.buckets_offset:self.buckets_offset + BUCKET.size * self.bucket_count] = \
+            b'\xff' * (BUCKET.size * self.bucket_count)
+        for slab in self.classes:
+            for i in range(slab.count):
+                following = slab.first + i + 1 if i + 1 < slab.count else NONE
+                SLOT.pack_into(self.map, slab.offset + i * slab.slot_size, FREE, 0, 0, NONE, NONE, following, 0, 0, 0)
+            self._set_class(slab, slab.first if slab.count else NONE, NONE, NONE)
+        HEADER.pack_into(self.map, 0, MAGIC, self.size, self.bucket_count, len(self.classes), self.layout_id)
+
+    # Layout
+
+    def _class_of(self, slot):
+        return self.classes[bisect.bisect_right(self._firsts, slot) - 1]
+
+    def _position(self, slot):
+        slab = self._class_of(slot)
+        return slab.offset + (slot - slab.first) * slab.slot_size
+
+    def _get_class(self, slab):
+        return CLASS.unpack_from(self.map, self.classes_offset + CLASS.size * slab.index)
+
+    def _set_class(self, slab, free, head, tail):
+        CLASS.pack_into(self.map, self.classes_offset + CLASS.size * slab.index, free, head, tail)
+
+    def _get_bucket(self, bucket):
+        return BUCKET.unpack_from(self.map, self.buckets_offset + BUCKET.size * bucket)[0]
+
+    def _set_bucket(self, bucket, slot):
+        BUCKET.pack_into(self.map, self.buckets_offset + BUCKET.size * bucket, slot)
+
+    def _get_slot(self, slot):
+        return list(SLOT.unpack_from(self.map, self._position(slot)))
+
+    def _set_slot(self, slot, fields):
+        SLOT.pack_into(self.map, self._position(slot), *fields)
+
+    # LRU lists, one per slab class
+
+    def _lru_unlink(self, slot, fields):
+        slab = self._class_of(slot)
+        free, head, tail = self._get_class(slab)
+        prev, following = fields[4], fields[5]
+        if prev == NONE:
+            head = following
+        else:
+            prev_fields = self._get_slot(prev)
+            prev_fields[5] = following
+            self._set_slot(prev, prev_fields)
+        if following == NONE:
+            tail = prev
+        else:
+            following_fields = self._get_slot(following)
+            following_fields[4] = prev
+            self._set_slot(following, following_fields)
+        self._set_class(slab, free, head, tail)
+        fields[4] = fields[5] = NONE
+
+    def _lru_push(self, slot, fields):
+        slab = self._class_of(slot)
+        free, head, tail = self._get_class(slab)
+        fields[4] = NONE
+        fields[5] = head
+        if head != NONE:
+            head_fields = self._get_slot(head)
+            head_fields[4] = slot
+            self._set_slot(head, head_fields)
+        else:
+            tail = slot
+        self._set_class(slab, free, slot, tail)
+
+    # Entries
+
+    def find(self, key, hashed):
+        """
+        Return the slot and slot fields of key, or None.
+        """
+        slot = self._get_bucket(hashed % self.bucket_count)
+        while slot != NONE:
+            fields = self._get_slot(slot)
+            if fields[1] == hashed:
+                start = self._position(slot) + SLOT.size
+                if self.map[start:start + fields[6]] == key:
+                    return slot, fields
+            slot = fields[3]
+        return None
+
+    def is_alive(self, fields):
+        return not fields[2] or fields[2] > time.time()
+
+    def is_intact(self, slot, fields):
+        start = self._position(slot) + SLOT.size
+        return zlib.crc32(self.map[start:start + fields[6] + fields[7]]) == fields[8]
+
+    def read(self, slot, fields):
+        self._lru_unlink(slot, fields)
+        self._lru_push(slot, fields)
+        self._set_slot(slot, fields)
+        start = self._position(slot) + SLOT.size + fields[6]
+        return self.map[start:start + fields[7]]
+
+    def remove(self, slot, fields):
+        bucket = fields[1] % self.bucket_count
+        current = self._get_bucket(bucket)
+        if current == slot:
+            self._set_bucket(bucket, fields[3])
+        else:
+            while current != NONE:
+                current_fields = self._get_slot(current)
+                if current_fields[3] == slot:
+                    current_fields[3] = fields[3]
+                    self._set_slot(current, current_fields)
+                    break
+                current = current_fields[3]
+
+        self._lru_unlink(slot, fields)
+        slab = self._class_of(slot)
+        free, head, tail = self._get_class(slab)
+        self._set_slot(slot, [FREE, 0, 0, NONE, NONE, free, 0, 0, 0])
+        self._set_class(slab, slot, head, tail)
+
+    def _allocate(self, slab):
+        free, head, tail = self._get_class(slab)
+        if free == NONE:
+            # Evict the least recently used entry of the class
+            self.remove(tail, self._get_slot(tail))
+            free, head, tail = self._get_class(slab)
+        self._set_class(slab, self._get_slot(free)[5], head, tail)
+        return free
+
+    def store(self, key, hashed, value, expires):
+        """
+        Store value for key, return False when it's larger than the slots.
+        """
+        found = self.find(key, hashed)
+        if found is not None:
+            self.remove(*found)
+
+        needed = SLOT.size + len(key) + len(value)
+        for slab in self.classes:
+            if slab.slot_size >= needed and slab.count:
+                break
+        else:
+            return False
+
+        slot = self._allocate(slab)
+        bucket = hashed % self.bucket_count
+        fields = [USED, hashed, expires or 0, self._get_bucket(bucket), NONE, NONE, len(key), len(value),
+                  zlib.crc32(value, zlib.crc32(key))]
+        self._lru_push(slot, fields)
+        self._set_slot(slot, fields)
+        start = self._position(slot) + SLOT.size
+        self.map[start:start + len(key)] = key
+        self.map[start + len(key):start + len(key) + len(value)] = value
+        self._set_bucket(bucket, slot)
+        return True
+
+    def clear(self):
+        self.format()
+
+
+def get_region(path, size, slab_sizes, bucket_count):
+    pid = os.getpid()
+    with _regions_lock:
+        region = _regions.get(path)
+        if region is None or region[0] != pid:
+            region = _regions[path] = (pid, Region(path, size, slab_sizes, bucket_count))
+        return region[1]
+
+
+class SharedMemoryCache(BaseCache):
+    """
+    A cache in shared memory, LOCATION being the path of the file mapped,
+    e.g. under /dev/shm. The worker processes of a host that use the same
+    path and OPTIONS share its entries, other hosts don't see them: only
+    for data that may differ between hosts, the "host" cache alias.
+
+    OPTIONS: SIZE in bytes (64MB), SLAB_SIZES, the slot sizes, and
+    BUCKET_COUNT, the hash table size (SIZE / 1024). Entries larger than
+    the largest slot are not kept.
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        if fcntl is None:
+            raise ImproperlyConfigured("The shared memory cache requires fcntl file locks")
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.region_size = options.get('SIZE', DEFAULT_SIZE)
+        self.slab_sizes = tuple(options.get('SLAB_SIZES', DEFAULT_SLAB_SIZES))
+        self.bucket_count = options.get('BUCKET_COUNT', self.region_size // 1024)
+
+    @property
+    def region(self):
+        return get_region(self.path, self.region_size, self.slab_sizes, self.bucket_count)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key.encode('utf-8')
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _set(self, region, key, value, timeout):
+        expires = self._expires(timeout)
+        hashed = key_hash(key)
+        if expires is not None and expires <= time.time():
+            found = region.find(key, hashed)
+            if found is not None:
+                region.remove(*found)
+            return False
+        return region.store(key, hashed, value, expires)
+
+    def _find_alive(self, region, key):
+        found = region.find(key, key_hash(key))
+        if found is None:
+            return None
+        if not region.is_intact(*found):
+            logger.warning("Dropping a corrupted entry of the shared memory cache %s" % self.path)
+            region.remove(*found)
+            return None
+        if not region.is_alive(found[1]):
+            region.remove(*found)
+            return None
+        return found
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        region = self.region
+        with region.locked():
+            if self._find_alive(region, key) is not None:
+                return False
+            return self._set(region, key, pickled, timeout)
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        region = self.region
+        with region.locked():
+            found = self._find_alive(region, key)
+            if found is None:
+                return default
+            pickled = region.read(*found)
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        region = self.region
+        with region.locked():
+            self._set(region, key, pickled, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        region = self.region
+        with region.locked():
+            found = self._find_alive(region, key)
+            if found is None:
+                return False
+            slot, fields = found
+            fields[2] = self._expires(timeout) or 0
+            region._set_slot(slot, fields)
+            return True
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        region = self.region
+        with region.locked():
+            found = region.find(key, key_hash(key))
+            if found is not None:
+                region.remove(*found)
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        region = self.region
+        with region.locked():
+            return self._find_alive(region, key) is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        region = self.region
+        with region.locked():
+            found = self._find_alive(region, key)
+            if found is None:
+                raise ValueError("Key '%s' not found" % key.decode('utf-8'))
+            slot, fields = found
+            expires = fields[2] or None
+            value = pickle.loads(region.read(slot, fields)) + delta
+            region.store(key, fields[1], pickle.dumps(value, self.pickle_protocol), expires)
+        return value
+
+    def clear(self):
+        region = self.region
+        with region.locked():
+            region.clear()
@@ -6,7 +6,27 @@ Created: 10/20/16 11:24 PM
 File created by: 'Mark Scrimshire: @ekivemark'
 """
 
-from django.test import TestCase
+import datetime
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from unittest import skipIf
+
+from apps.fhir.parsers import FHIRParser
+from apps.fhir.renderers import FHIRRenderer
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+
+from . import compression, json_codec, shared_memory_cache, two_tier_cache
+from .compression import CompressionMiddleware, choose_encoding
 from .utils import bool_env, TRUE_LIST, FALSE_LIST, int_env
 
 
@@ -45,3 +65,377 @@ class Check_IntFromText_Test(TestCase):
         for x, y in int_list:
             result = int_env(x)
             self.assertEqual(result, y)
+
+
+BODY = json.dumps({"resourceType": "Bundle", "entry": [{"resource": {"id": str(i)}} for i in range(100)]}).encode()
+
+
+class CompressionMiddlewareTest(TestCase):
+    """ Check responses are compressed as negotiated """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def _response(self, path='/v1/fhir/Patient/', content=BODY, **headers):
+        request = self.factory.get(path, **headers)
+        middleware = CompressionMiddleware(lambda request: HttpResponse(content, content_type='application/json'))
+        return middleware(request)
+
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding('gzip, deflate'), 'gzip')
+        self.assertEqual(choose_encoding('deflate'), None)
+        self.assertEqual(choose_encoding('gzip;q=0'), None)
+        self.assertEqual(choose_encoding(''), None)
+        self.assertEqual(choose_encoding('*'), compression.available_encodings()[0])
+
+    def test_gzip(self):
+        with self.settings(RESPONSE_COMPRESSION_LEVEL=9):
+            response = self._response(HTTP_ACCEPT_ENCODING='gzip, deflate;q=0.5')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(response.content), BODY)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+
+    @skipIf(compression.brotli is None, "brotli is not installed")
+    def test_brotli(self):
+        response = self._response(HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(response.content), BODY)
+
+        # brotli is not acceptable to this client
+        response = self._response(HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_not_compressed(self):
+        # No Accept-Encoding
+        response = self._response()
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.content, BODY)
+
+        # Below the minimum size
+        response = self._response(content=BODY[:100], HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+        # Not one of the RESPONSE_COMPRESSION_PATHS
+        response = self._response(path='/v1/o/authorize/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+        with override_settings(RESPONSE_COMPRESSION=False):
+            response = self._response(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_paths(self):
+        for path in ['/v2/fhir/ExplanationOfBenefit/', '/admin/metrics/applications/',
+                     '/.well-known/public-applications']:
+            response = self._response(path=path, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip', path)
+
+    def test_etag_is_weakened(self):
+        request = self.factory.get('/v1/fhir/Patient/', HTTP_ACCEPT_ENCODING='gzip')
+        response = HttpResponse(BODY)
+        response['ETag'] = '"abc"'
+        response = CompressionMiddleware(lambda request: response)(request)
+        self.assertEqual(response['ETag'], 'W/"abc"')
+
+    def test_streaming(self):
+        request = self.factory.get('/admin/metrics/raw/developers', HTTP_ACCEPT_ENCODING='gzip')
+        middleware = CompressionMiddleware(lambda request: StreamingHttpResponse([BODY[:500], BODY[500:]]))
+        response = middleware(request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), BODY)
+
+
+RESOURCE = {
+    "resourceType": "ExplanationOfBenefit",
+    "id": "carrier-1",
+    "type": {"coding": [{"code": "71", "display": "Règlement \u2028"}]},
+    "total": [{"amount": {"value": 12.5}}, {"amount": {"value": 1e-07}}],
+    "big": 2 ** 70,
+    "patient": {"reference": "Patient/-20140000008325"},
+}
+
+
+class JsonCodecTest(TestCase):
+    """ Check the JSON_CODEC output is the same as json """
+
+    def _both_codecs(self, fn):
+        results = []
+        for codec in ['json', 'orjson']:
+            with override_settings(JSON_CODEC=codec):
+                results.append(fn())
+        self.assertEqual(results[0], results[1])
+        return results[0]
+
+    @skipIf(json_codec.orjson is None, "orjson is not installed")
+    def test_fast(self):
+        self.assertTrue(json_codec.is_fast())
+        with override_settings(JSON_CODEC='json'):
+            self.assertFalse(json_codec.is_fast())
+
+    def test_dumps(self):
+        data = {"b": 1, "a": [1.5, None, True, "é"]}
+        self.assertEqual(self._both_codecs(
+            lambda: json_codec.dumps(data, separators=(',', ':'), ensure_ascii=False)),
+            '{"b":1,"a":[1.5,null,true,"é"]}')
+        self.assertEqual(self._both_codecs(
+            lambda: json_codec.dumps(data, sort_keys=True, indent=2, ensure_ascii=False)),
+            json.dumps(data, sort_keys=True, indent=2, ensure_ascii=False))
+        # Layouts only json writes
+        self.assertEqual(self._both_codecs(lambda: json_codec.dumps(data)), json.dumps(data))
+        self.assertEqual(self._both_codecs(lambda: json_codec.dumps({1: 2 ** 70}, separators=(',', ':'))),
+                         '{"1":1180591620717411303424}')
+
+    def test_dumps_encoder_class(self):
+        data = {"at": datetime.datetime(2020, 6, 1, 10, 30, 0, 123456, tzinfo=datetime.timezone.utc)}
+        self.assertEqual(self._both_codecs(
+            lambda: json_codec.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'), ensure_ascii=False)),
+            '{"at":"2020-06-01T10:30:00.123Z"}')
+        with self.assertRaises(TypeError):
+            json_codec.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+    def test_loads(self):
+        content = json.dumps(RESOURCE).encode()
+        self.assertEqual(self._both_codecs(lambda: json_codec.loads(content)), RESOURCE)
+        self.assertEqual(json_codec.loads('[Infinity]'), [float('inf')])
+        with self.assertRaises(ValueError):
+            json_codec.loads(b'{"a": ')
+
+    def test_renderer(self):
+        renderer = FHIRRenderer()
+        content = self._both_codecs(lambda: renderer.render(RESOURCE, 'application/fhir+json'))
+        self.assertEqual(content, renderers.JSONRenderer().render(RESOURCE))
+        self.assertIn(b'\\u2028', content)
+
+        # Indented, as DRF does it
+        self._both_codecs(lambda: renderer.render(RESOURCE, 'application/fhir+json; indent=4'))
+        self._both_codecs(lambda: renderer.render(RESOURCE, 'application/fhir+json; indent=2'))
+
+        # NaN is written as null by orjson
+        with override_settings(JSON_CODEC='json'):
+            with self.assertRaises(ValueError):
+                renderer.render({"value": float('nan')})
+
+    def test_parser(self):
+        parser = FHIRParser()
+        content = json.dumps(RESOURCE).encode()
+        self.assertEqual(self._both_codecs(lambda: parser.parse(io.BytesIO(content))), RESOURCE)
+
+        for invalid in [b'{"a": ', b'[NaN]']:
+            for codec in ['json', 'orjson']:
+                with override_settings(JSON_CODEC=codec):
+                    with self.assertRaises(ParseError):
+                        parser.parse(io.BytesIO(invalid))
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'two-tier-test'},
+})
+class TwoTierCacheTest(TestCase):
+
+    def setUp(self):
+        self.cache = self._two_tier_cache()
+        self.cache.clear()
+        # The same cache in another process
+        self.other = self._two_tier_cache()
+        self.other._store = two_tier_cache.LocalStore(100)
+        self.addCleanup(self.cache.clear)
+
+    def _two_tier_cache(self):
+        return two_tier_cache.TwoTierCache('shared', {'OPTIONS': {'GENERATION_INTERVAL': 0}})
+
+    def test_key_prefix(self):
+        self.assertEqual(two_tier_cache.key_prefix('access_token:0123abcd'), 'access_token')
+        self.assertEqual(two_tier_cache.key_prefix('waffle:switch:bfd_v2'), 'waffle')
+        self.assertEqual(two_tier_cache.key_prefix('django.contrib.sessions.cache' + 'a1' * 16),
+                         'django.contrib.sessions.')
+
+    def test_local_tier(self):
+        self.cache.set('grant:1:2', True)
+        self.assertTrue(self.cache.get('grant:1:2'))
+        self.assertTrue(self.other.get('grant:1:2'))
+
+        # Served locally, while in the shared cache
+        caches['shared'].set('grant:1:2', False)
+        self.assertTrue(self.other.get('grant:1:2'))
+        self.assertEqual(self.cache.get('missing:1'), None)
+        self.assertEqual(self.cache.get_stats(), {
+            'grant': {'local': 1, 'shared': 0, 'miss': 0},
+            'missing': {'local': 0, 'shared': 0, 'miss': 1},
+        })
+        self.assertEqual(self.other.get_many(['grant:1:2', 'missing:1']), {'grant:1:2': True})
+
+    def test_invalidated_across_processes(self):
+        self.cache.set('grant:1:2', True)
+        self.assertTrue(self.other.get('grant:1:2'))
+
+        self.cache.set('grant:1:2', False)
+        self.assertFalse(self.other.get('grant:1:2'))
+
+        self.cache.delete('grant:1:2')
+        self.assertIsNone(self.other.get('grant:1:2'))
+        self.assertFalse(self.other.has_key('grant:1:2'))
+
+        self.cache.set('grant:1:2', 1)
+        self.assertEqual(self.other.get('grant:1:2'), 1)
+        self.assertEqual(self.cache.incr('grant:1:2'), 2)
+        self.assertEqual(self.other.get('grant:1:2'), 2)
+
+    def test_add_changes_no_generation(self):
+        self.cache.set('access_token:a', 'a')
+        self.assertEqual(self.other.get('access_token:a'), 'a')
+
+        self.assertTrue(self.cache.add('access_token:b', 'b'))
+        self.assertFalse(self.cache.add('access_token:b', 'c'))
+        self.assertEqual(self.other.get('access_token:a'), 'a')
+        self.assertEqual(self.other.get('access_token:b'), 'b')
+        self.assertEqual(self.other.get_stats()['access_token'], {'local': 1, 'shared': 2, 'miss': 0})
+
+    def test_invalidates_the_group_of_the_key(self):
+        # Keys of different generation buckets
+        self.assertNotEqual(self.cache._group('grant:1:2'), self.cache._group('grant:1:3'))
+        self.cache.set('grant:1:2', True)
+        self.cache.set('grant:1:3', True)
+        self.assertTrue(self.other.get('grant:1:2'))
+        self.assertTrue(self.other.get('grant:1:3'))
+
+        self.cache.set('grant:1:2', False)
+        self.assertFalse(self.other.get('grant:1:2'))
+        self.assertTrue(self.other.get('grant:1:3'))
+        self.assertEqual(self.other.get_stats()['grant'], {'local': 1, 'shared': 3, 'miss': 0})
+
+    def test_generations_expire(self):
+        self.cache.delete('grant:1:2')
+        shared = caches['shared']
+        key = shared.make_key(two_tier_cache.GENERATION_KEY % self.cache._group('grant:1:2'))
+        self.assertIsNotNone(shared._expire_info[key])
+
+    def test_local_timeout(self):
+        cache = two_tier_cache.TwoTierCache('shared', {'OPTIONS': {'LOCAL_TIMEOUT': 0}})
+        cache.set('grant:1:2', True)
+        caches['shared'].set('grant:1:2', False)
+        self.assertFalse(cache.get('grant:1:2'))
+
+    def test_bypass(self):
+        self.cache.add('throttle_token_abc', 1)
+        self.assertEqual(self.cache.incr('throttle_token_abc'), 2)
+        self.assertEqual(self.cache.get('throttle_token_abc'), 2)
+        self.assertEqual(self.cache.get_stats(), {})
+
+
+class SharedMemoryCacheTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache')
+        self.cache = self._shared_memory_cache()
+        self.addCleanup(shared_memory_cache._regions.clear)
+
+    def _shared_memory_cache(self, **options):
+        options.setdefault('SIZE', 1024 * 1024)
+        return shared_memory_cache.SharedMemoryCache(self.path, {'OPTIONS': options})
+
+    def test_cache(self):
+        self.assertTrue(self.cache.add('flag:1', {'on': True}))
+        self.assertFalse(self.cache.add('flag:1', None))
+        self.assertEqual(self.cache.get('flag:1'), {'on': True})
+        self.assertTrue(self.cache.has_key('flag:1'))
+
+        self.cache.set('flag:1', 'off')
+        self.assertEqual(self.cache.get('flag:1'), 'off')
+        self.assertEqual(self.cache.get_many(['flag:1', 'flag:2']), {'flag:1': 'off'})
+
+        self.cache.set('count', 1)
+        self.assertEqual(self.cache.incr('count'), 2)
+        self.assertEqual(self.cache.decr('count', 3), -1)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+        self.cache.delete('flag:1')
+        self.assertIsNone(self.cache.get('flag:1'))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('count'))
+
+    def test_expiry(self):
+        self.cache.set('token:1', 'a', 0.1)
+        self.cache.set('token:2', 'b', 0)
+        self.assertEqual(self.cache.get('token:1'), 'a')
+        self.assertIsNone(self.cache.get('token:2'))
+        self.assertTrue(self.cache.touch('token:1', None))
+        time.sleep(0.2)
+        self.assertEqual(self.cache.get('token:1'), 'a')
+
+        self.cache.set('token:1', 'a', 0.1)
+        time.sleep(0.2)
+        self.assertFalse(self.cache.has_key('token:1'))
+        self.assertTrue(self.cache.add('token:1', 'c'))
+
+    def test_lru_eviction(self):
+        cache = self._shared_memory_cache(SIZE=16 * 1024, SLAB_SIZES=[256, 4096], BUCKET_COUNT=16)
+        for i in range(40):
+            cache.set('key:%d' % i, i)
+            # Keep the first key in use
+            self.assertEqual(cache.get('key:0'), 0)
+        self.assertEqual(cache.get('key:0'), 0)
+        self.assertEqual(cache.get('key:39'), 39)
+        self.assertIsNone(cache.get('key:1'))
+
+        # Larger values take the larger slots
+        cache.set('document', 'x' * 2000)
+        self.assertEqual(cache.get('document'), 'x' * 2000)
+        self.assertEqual(cache.get('key:0'), 0)
+        # And are not kept when larger than all of them
+        cache.set('document', 'x' * 5000)
+        self.assertIsNone(cache.get('document'))
+
+    def test_shared_across_processes(self):
+        self.cache.set('flag:1', 'parent')
+        pid = os.fork()
+        if pid == 0:
+            try:
+                shared_memory_cache._regions.clear()
+                cache = self._shared_memory_cache()
+                cache.set('flag:2', cache.get('flag:1') + ' and child')
+                cache.set('count', 10)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual(self.cache.get('flag:2'), 'parent and child')
+        self.assertEqual(self.cache.get('count'), 10)
+
+    def test_half_written(self):
+        self.cache.set('flag:1', True)
+        region = self.cache.region
+        # A worker killed while changing the region
+        shared_memory_cache.SEQUENCE.pack_into(region.map, shared_memory_cache.HEADER.size, 7)
+
+        self.assertIsNone(self.cache.get('flag:1'))
+        self.cache.set('flag:1', False)
+        self.assertFalse(self.cache.get('flag:1'))
+
+        # Not cleared by an operation that raises
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.assertFalse(self.cache.get('flag:1'))
+
+    def test_checksum(self):
+        self.cache.set('flag:1', 'on')
+        self.cache.set('flag:2', 'off')
+        region = self.cache.region
+        slot, fields = region.find(b':1:flag:1', shared_memory_cache.key_hash(b':1:flag:1'))
+        end = region._position(slot) + shared_memory_cache.SLOT.size + fields[6] + fields[7]
+        region.map[end - 1] ^= 0xff
+
+        self.assertIsNone(self.cache.get('flag:1'))
+        self.assertFalse(self.cache.has_key('flag:1'))
+        self.assertEqual(self.cache.get('flag:2'), 'off')
+
+    def test_reformatted_for_other_options(self):
+        self.cache.set('flag:1', True)
+        shared_memory_cache._regions.clear()
+        cache = self._shared_memory_cache(SLAB_SIZES=[512, 8192])
+        self.assertIsNone(cache.get('flag:1'))
+        cache.set('flag:1', False)
+        self.assertFalse(cache.get('flag:1'))
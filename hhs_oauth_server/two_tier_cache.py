@@ -0,0 +1,300 @@
+import pickle
+import re
+import threading
+import time
+import uuid
+import zlib
+
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# The group of a key in the stats and for invalidation: what comes before
+# its first ':', or before a token or session key in it
+KEY_PREFIX = re.compile(r'^(.*?)(?::|[A-Za-z0-9]{20,}|$)')
+
+GENERATION_KEY = 'two_tier_generation:%s:%d'
+
+_MISSING = object()
+
+# The local tier of each shared cache, shared by the threads of the process
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def key_prefix(key):
+    return KEY_PREFIX.match(key).group(1)
+
+
+class LocalStore(object):
+    """
+    The bounded LRU of a TwoTierCache in this process, the generation it
+    last saw of each group of keys, and the hit and miss counts per prefix.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        # key -> (group, pickled value, expires)
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.next_check = 0
+        self.stats = {}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[2] <= time.monotonic():
+                del self.entries[key]
+                return _MISSING
+            self.entries.move_to_end(key)
+        return pickle.loads(entry[1])
+
+    def set(self, key, group, value, timeout):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.entries[key] = (group, pickled, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def drop_groups(self, groups):
+        with self.lock:
+            for key in [k for k, entry in self.entries.items() if entry[0] in groups]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generations.clear()
+            self.stats.clear()
+
+    def count(self, prefix, outcome):
+        with self.lock:
+            counts = self.stats.get(prefix)
+            if counts is None:
+                counts = self.stats[prefix] = {'local': 0, 'shared': 0, 'miss': 0}
+            counts[outcome] += 1
+
+
+class TwoTierCache(BaseCache):
+    """
+    A bounded per-process LRU in front of a shared cache, LOCATION being the
+    alias of the shared cache.
+
+    Values read from or written to the shared cache are kept in this
+    process for up to LOCAL_TIMEOUT seconds. The keys of a prefix are
+    hashed into GENERATION_BUCKETS groups. Changing a key (set, delete,
+    incr) gives its group a new generation in the shared cache, each
+    process checks the generations every GENERATION_INTERVAL seconds and
+    drops its entries of the groups changed since. add() only fills a
+    missing key, it changes no generation: use it to fill write-once keys.
+    Keys starting with one of BYPASS_PREFIXES, the throttle counters by
+    default, are not kept locally.
+
+    OPTIONS: LOCAL_TIMEOUT (5), LOCAL_MAX_ENTRIES (10000),
+    GENERATION_INTERVAL (1), GENERATION_BUCKETS (64), GENERATION_TIMEOUT
+    (86400), BYPASS_PREFIXES (['throttle_']).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = location
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.generation_interval = options.get('GENERATION_INTERVAL', 1)
+        self.generation_buckets = options.get('GENERATION_BUCKETS', 64)
+        # Longer than LOCAL_TIMEOUT, a generation that expired reads as changed
+        self.generation_timeout = max(options.get('GENERATION_TIMEOUT', 86400), self.local_timeout + 1)
+        self.bypass_prefixes = tuple(options.get('BYPASS_PREFIXES', ['throttle_']))
+        with _stores_lock:
+            self._store = _stores.get(location)
+            if self._store is None:
+                self._store = _stores[location] = LocalStore(options.get('LOCAL_MAX_ENTRIES', 10000))
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def get_stats(self):
+        """
+        Return the local hits, shared hits and misses per key prefix.
+        """
+        with self._store.lock:
+            return {prefix: dict(counts) for prefix, counts in self._store.stats.items()}
+
+    def _local_key(self, key, version):
+        return self.make_key(key, version=version)
+
+    def _is_local(self, key):
+        return self.local_timeout > 0 and not key.startswith(self.bypass_prefixes)
+
+    def _local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self.local_timeout
+        return min(self.local_timeout, timeout)
+
+    def _group(self, key):
+        """
+        The prefix of key, and the bucket of its generation.
+        """
+        return key_prefix(key), zlib.crc32(key.encode('utf-8')) % self.generation_buckets
+
+    def _check_generations(self):
+        store = self._store
+        now = time.monotonic()
+        if now < store.next_check:
+            return
+        store.next_check = now + self.generation_interval
+
+        groups = list(store.generations)
+        if not groups:
+            return
+        current = self.shared.get_many([GENERATION_KEY % group for group in groups])
+        changed = set()
+        for group in groups:
+            generation = current.get(GENERATION_KEY % group)
+            if store.generations.get(group) != generation:
+                store.generations[group] = generation
+                changed.add(group)
+        if changed:
+            store.drop_groups(changed)
+
+    def _watch(self, group):
+        # Read before the value it covers, a write in between is seen on
+        # the next check
+        if group not in self._store.generations:
+            self._store.generations[group] = self.shared.get(GENERATION_KEY % group)
+
+    def _written(self, groups):
+        # A new unique generation, one write whatever the one before
+        self.shared.set_many({GENERATION_KEY % group: uuid.uuid4().hex for group in groups},
+                             self.generation_timeout)
+
+    def _keep(self, key, version, value, timeout=DEFAULT_TIMEOUT):
+        timeout = self._local_timeout(timeout)
+        if timeout > 0:
+            self._store.set(self._local_key(key, version), self._group(key), value, timeout)
+
+    def get(self, key, default=None, version=None):
+        if not self._is_local(key):
+            return self.shared.get(key, default, version)
+
+        self._check_generations()
+        prefix = key_prefix(key)
+        value = self._store.get(self._local_key(key, version))
+        if value is not _MISSING:
+            self._store.count(prefix, 'local')
+            return value
+
+        self._watch(self._group(key))
+        value = self.shared.get(key, _MISSING, version)
+        if value is _MISSING:
+            self._store.count(prefix, 'miss')
+            return default
+        self._store.count(prefix, 'shared')
+        self._keep(key, version, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._check_generations()
+        found = {}
+        remote = []
+        for key in keys:
+            value = self._store.get(self._local_key(key, version)) if self._is_local(key) else _MISSING
+            if value is _MISSING:
+                remote.append(key)
+            else:
+                self._store.count(key_prefix(key), 'local')
+                found[key] = value
+        if not remote:
+            return found
+
+        for key in remote:
+            if self._is_local(key):
+                self._watch(self._group(key))
+        shared = self.shared.get_many(remote, version)
+        for key in remote:
+            if not self._is_local(key):
+                continue
+            if key in shared:
+                self._store.count(key_prefix(key), 'shared')
+                self._keep(key, version, shared[key])
+            else:
+                self._store.count(key_prefix(key), 'miss')
+        found.update(shared)
+        return found
+
+    def has_key(self, key, version=None):
+        if self._is_local(key):
+            self._check_generations()
+            if self._store.get(self._local_key(key, version)) is not _MISSING:
+                return True
+        return self.shared.has_key(key, version)
+
+    def _changed(self, keys):
+        groups = {self._group(key) for key in keys if self._is_local(key)}
+        if groups:
+            self._written(groups)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        if self._is_local(key):
+            self._changed([key])
+            self._keep(key, version, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # The key was missing: deleting it changed its generation, and the
+        # local copies of an expired value expire first
+        added = self.shared.add(key, value, timeout, version)
+        if added and self._is_local(key):
+            self._keep(key, version, value, timeout)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version)
+        self._changed(data)
+        for key, value in data.items():
+            if self._is_local(key) and key not in failed:
+                self._keep(key, version, value, timeout)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self._store.delete(self._local_key(key, version))
+        self.shared.delete(key, version)
+        self._changed([key])
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self._store.delete(self._local_key(key, version))
+        self.shared.delete_many(keys, version)
+        self._changed(keys)
+
+    def incr(self, key, delta=1, version=None):
+        self._store.delete(self._local_key(key, version))
+        value = self.shared.incr(key, delta, version)
+        self._changed([key])
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version)
+
+    def clear(self):
+        self._store.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)